@@ -3,15 +3,24 @@ import json
 import logging
 import sys
 import click
-from rich.console import Console
-from rich.panel import Panel
-from rich.syntax import Syntax
-from src.core.reasoning_engine import ReasoningEngine
-from src.core.action_planner import ActionPlanner
-from src.evaluation.benchmark import BenchmarkRunner
 from src.utils.helpers import Config
 
-console = Console()
+
+# Robot-side scripts call the CLI many times a minute, so heavy imports
+# (OpenAI SDK, OpenCV, rich, flask) wait for the subcommand that needs them.
+class _Console:
+    def __init__(self, stderr=False):
+        self.stderr = stderr
+        self._console = None
+
+    def print(self, *args, **kwargs):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(stderr=self.stderr)
+        self._console.print(*args, **kwargs)
+
+
+console = _Console()
 
 
 def _setup_logging(verbose):
@@ -34,10 +43,27 @@ def main(verbose):
 @click.option("--image-url", type=str)
 @click.option("--mode", type=click.Choice(["social","handover","spatial","trajectory","safety","thrown_object","planning","full"], case_sensitive=False), default="social")
 @click.option("--task", type=str, default=None)
+@click.option("--fused/--no-fused", default=None)
+@click.option("--no-cache", is_flag=True)
+@click.option("--stream", is_flag=True)
+@click.option("--stop-on-answer", is_flag=True)
+@click.option("--sampling", type=click.Choice(["uniform", "keyframe"]), default=None)
+@click.option("--long-video", is_flag=True)
+@click.option("--window-sec", type=float, default=None)
+@click.option("--overlap-sec", type=float, default=None)
+@click.option("--motion", is_flag=True)
+@click.option("--reasoning", type=click.Choice(["off", "on", "cascade"]), default=None)
 @click.option("--output", "-o", type=click.Path(), default=None)
-def analyze(image, video, image_url, mode, task, output):
+def analyze(image, video, image_url, mode, task, fused, no_cache, stream, stop_on_answer, sampling, long_video, window_sec, overlap_sec, motion, reasoning, output):
     """Analyze an image or video using Cosmos Reason 2."""
+    from rich.panel import Panel
+    from rich.syntax import Syntax
+    from src.core.action_planner import ActionPlanner
+    from src.core.reasoning_engine import ReasoningEngine
+
     config = Config()
+    if reasoning:
+        config.reasoning_policy = reasoning
     engine = ReasoningEngine(config)
 
     if not image and not video and not image_url:
@@ -48,15 +74,23 @@ def analyze(image, video, image_url, mode, task, output):
 
     try:
         if mode == "full":
-            result = engine.full_analysis(image or video)
+            result = engine.full_analysis(image or video, fused=fused, bypass_cache=no_cache)
         elif task and image:
-            result = ActionPlanner(config).plan_multi_step(image, task)
+            result = ActionPlanner(config).plan_multi_step(image, task, bypass_cache=no_cache)
+        elif video and long_video:
+            result = engine.analyze_long_video(
+                video, mode=mode, window_sec=window_sec, overlap_sec=overlap_sec, bypass_cache=no_cache,
+            )
+        elif video and motion:
+            result = engine.analyze_motion(video, mode=mode, bypass_cache=no_cache)
         elif video:
-            result = engine.analyze_video(video, mode=mode)
+            result = engine.analyze_video(video, mode=mode, sampling=sampling, bypass_cache=no_cache)
         elif image_url:
-            result = engine.analyze_image_url(image_url, mode=mode)
+            result = engine.analyze_image_url(image_url, mode=mode, bypass_cache=no_cache)
+        elif stream:
+            result = _stream_analysis(engine, image, mode, stop_on_answer, no_cache)
         else:
-            result = engine.analyze_image(image, mode=mode)
+            result = engine.analyze_image(image, mode=mode, bypass_cache=no_cache)
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
         sys.exit(1)
@@ -70,6 +104,10 @@ def analyze(image, video, image_url, mode, task, output):
         console.print(Panel(Syntax(json.dumps(parsed, indent=2), "json", theme="monokai"), title="Output", border_style="green"))
     else:
         console.print(Panel(result.get("answer", "")[:3000], title="Answer", border_style="yellow"))
+    if result.get("reasoning_tier"):
+        escalation = result.get("escalation")
+        suffix = f" (escalated: {escalation['reason']})" if escalation and "fast_usage" in escalation else ""
+        console.print(f"Reasoning tier: {result['reasoning_tier']}{suffix}")
 
     if result.get("type") == "full_analysis":
         for name, sub in result.get("results", {}).items():
@@ -77,69 +115,251 @@ def analyze(image, video, image_url, mode, task, output):
             if sub.get("parsed"):
                 console.print(json.dumps(sub["parsed"], indent=2))
 
+    if result.get("type") == "long_video_analysis":
+        for window in result.get("windows", []):
+            status = window.get("error") or f"{window.get('latency_sec')}s"
+            console.print(f"window {window['index']} [{window['start_sec']}-{window['end_sec']}s]: {status}")
+        console.print(Panel(Syntax(json.dumps(result.get("timeline", []), indent=2), "json", theme="monokai"), title="Timeline", border_style="green"))
+
+    if result.get("type") == "motion_analysis":
+        if not result["events"]:
+            console.print("[dim]No motion detected; the model was not called.[/dim]")
+        for event in result["events"]:
+            motion_info = event["motion"]
+            approaching = " approaching" if motion_info["approaching"] else ""
+            console.print(f"motion at {motion_info['peak_sec']}s (score {motion_info['score']}{approaching}, region {motion_info['region']})")
+            if event.get("parsed"):
+                console.print(json.dumps(event["parsed"], indent=2))
+
     if output:
         with open(output, "w") as f:
             json.dump(result, f, indent=2)
         console.print(f"\nSaved to [bold]{output}[/bold]")
 
 
+def _stream_analysis(engine, image, mode, stop_on_answer, bypass_cache):
+    result = {}
+    for event in engine.stream_image(image, mode=mode, stop_on_answer=stop_on_answer, bypass_cache=bypass_cache):
+        if event["type"] == "reasoning":
+            console.print(event["delta"], end="", style="blue", highlight=False)
+        elif event["type"] == "answer":
+            console.print(f"\n[green]Answer ready after {event.get('time_to_answer_sec')}s[/green]")
+        elif event["type"] == "done":
+            result = event["result"]
+    usage = result.get("usage", {})
+    console.print(f"TTFT: {usage.get('ttft_sec')}s | Time to answer: {usage.get('time_to_answer_sec')}s")
+    return result
+
+
 @main.command()
 @click.option("--port", type=int, default=8080)
 @click.option("--host", type=str, default="0.0.0.0")
-def serve(port, host):
+@click.option("--workers", type=int, default=None)
+@click.option("--queue-size", type=int, default=None)
+def serve(port, host, workers, queue_size):
     """Launch the HTML dashboard."""
-    from flask import Flask, request, jsonify, send_from_directory
-    from flask_cors import CORS
-    from pathlib import Path
-    import tempfile
+    from src.server import create_app, run_server
 
-    app = Flask(__name__, static_folder=str(Path(__file__).parent.parent / "web"))
-    CORS(app)
     config = Config()
-    engine = ReasoningEngine(config)
-
-    @app.route("/")
-    def index():
-        return send_from_directory(app.static_folder, "index.html")
-
-    @app.route("/api/modes")
-    def modes():
-        return jsonify({"modes": engine.available_modes()})
-
-    @app.route("/api/analyze", methods=["POST"])
-    def api_analyze():
-        mode = request.form.get("mode", "social")
-        file = request.files.get("image")
-        if not file:
-            return jsonify({"error": "No image provided"}), 400
-        tmp = tempfile.NamedTemporaryFile(suffix=".jpg", delete=False)
-        file.save(tmp.name)
-        tmp.close()
-        try:
-            result = engine.full_analysis(tmp.name) if mode == "full" else engine.analyze_image(tmp.name, mode=mode)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+    if workers:
+        config.serve_workers = workers
+    if queue_size is not None:
+        config.serve_queue_size = queue_size
+    app = create_app(config)
 
     console.print(f"Dashboard at [bold]http://{host}:{port}[/bold]")
-    app.run(host=host, port=port, debug=False)
+    run_server(app, host, port, threads=config.serve_workers + config.serve_queue_size + 4)
+
+
+@main.command()
+@click.argument("source")
+@click.option("--mode", type=click.Choice(["social","handover","spatial","trajectory","safety","thrown_object","planning","full"], case_sensitive=False), default="social")
+@click.option("--task", type=str, default=None)
+@click.option("--workers", "-w", type=int, default=None)
+@click.option("--output", "-o", type=click.Path(), default=None)
+@click.option("--resume/--no-resume", default=True)
+@click.option("--no-cache", is_flag=True)
+def batch(source, mode, task, workers, output, resume, no_cache):
+    """Analyze a directory, glob or JSONL manifest, one JSON line per result."""
+    from rich.panel import Panel
+    from src.core.batch import BatchRunner, load_entries, open_sink
+
+    try:
+        entries = load_entries(source, mode=mode, task=task)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    runner = BatchRunner(Config())
+    completed = runner.load_completed(output) if output and resume else set()
+    # With results on stdout, keep the summary on stderr so the stream stays pure JSONL.
+    report = console if output else _Console(stderr=True)
+    sink = open_sink(output, resume) if output else sys.stdout
+    try:
+        summary = runner.run(entries, sink, workers=workers, bypass_cache=no_cache, completed=completed)
+    finally:
+        if output:
+            sink.close()
+    report.print(Panel(
+        f"Executed: {summary['executed']} | Skipped: {summary['skipped']} | "
+        f"OK: {summary['ok']} | Errors: {summary['errors']}\n"
+        f"Wall time: {summary['wall_time_sec']}s | Throughput: {summary['throughput_per_sec']}/s | "
+        f"p50/p95: {summary['p50_latency_sec']}s / {summary['p95_latency_sec']}s",
+        title="Batch",
+    ))
+
+
+@main.command()
+@click.argument("source")
+@click.option("--mode", type=click.Choice(["social","handover","spatial","trajectory","safety","thrown_object","planning"], case_sensitive=False), default="safety")
+@click.option("--sample-fps", type=float, default=None)
+@click.option("--threshold", type=int, default=None)
+@click.option("--max-staleness", type=float, default=None)
+@click.option("--max-results", type=int, default=None)
+def live(source, mode, sample_fps, threshold, max_staleness, max_results):
+    """Watch a camera index, RTSP URL or video file and emit a JSON line whenever the scene changes."""
+    from src.core.live import LiveRunner
+
+    try:
+        runner = LiveRunner(Config(), mode=mode, sample_fps=sample_fps, change_threshold=threshold,
+                            max_staleness_sec=max_staleness)
+        runner.run(source, lambda result: print(json.dumps(result), flush=True), max_results=max_results)
+    except FileNotFoundError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+    _Console(stderr=True).print(f"[dim]{json.dumps(runner.stats())}[/dim]")
 
 
 @main.command()
 @click.option("--dataset", type=click.Path(exists=True), required=True)
 @click.option("--output", "-o", type=str, default="results")
-def benchmark(dataset, output):
+@click.option("--no-cache", is_flag=True)
+@click.option("--concurrency", "-c", type=int, default=None)
+@click.option("--rps", type=float, default=None)
+@click.option("--resume", is_flag=True)
+@click.option("--packing", type=str, default=None, help="Compare frame-packing grids, e.g. off,2x2,3x3")
+def benchmark(dataset, output, no_cache, concurrency, rps, resume, packing):
     """Run the evaluation benchmark."""
+    from rich.panel import Panel
+    from src.evaluation.benchmark import BenchmarkRunner, compare_frame_packing
+
     config = Config()
     runner = BenchmarkRunner(config)
     cases = runner.load_test_cases(dataset)
-    summary = runner.run(cases, output_dir=output)
+    if packing:
+        report = compare_frame_packing(
+            cases, grids=[g.strip() for g in packing.split(",") if g.strip()], config=config, output_dir=output,
+            bypass_cache=no_cache, concurrency=concurrency, rps=rps, resume=resume,
+        )
+        for grid, stats in report.items():
+            console.print(
+                f"  {grid}: accuracy {stats['accuracy']:.1%} | prompt tokens {stats['avg_prompt_tokens']} | "
+                f"images {stats['avg_images_sent']} | avg {stats['avg_latency_sec']}s | p95 {stats['p95_latency_sec']}s"
+            )
+        return
+    summary = runner.run(
+        cases, output_dir=output, bypass_cache=no_cache, concurrency=concurrency, rps=rps, resume=resume,
+    )
     console.print(Panel(
         f"Total: {summary['total']} | Passed: {summary['passed']} | "
         f"Failed: {summary['failed']} | Errors: {summary['errors']}\n"
-        f"Accuracy: {summary['accuracy']:.1%} | Avg Latency: {summary['avg_latency_sec']}s",
+        f"Accuracy: {summary['accuracy']:.1%} | Avg Latency: {summary['avg_latency_sec']}s\n"
+        f"p50/p95/p99: {summary['p50_latency_sec']}s / {summary['p95_latency_sec']}s / {summary['p99_latency_sec']}s | "
+        f"Tokens/s: {summary['tokens_per_sec']} | Cases/s: {summary.get('throughput_cases_per_sec', '-')}",
         title="Benchmark Results",
     ))
+    for mode, stats in summary["per_mode"].items():
+        console.print(f"  {mode}: {stats['passed']}/{stats['total']} passed, p95 {stats['p95_latency_sec']}s")
+
+
+@main.command()
+@click.option("--port", type=int, default=8000)
+@click.option("--host", type=str, default="127.0.0.1")
+@click.option("--latency-ms", type=float, default=400.0)
+@click.option("--latency-dist", type=click.Choice(["fixed", "uniform", "lognormal"]), default="lognormal")
+@click.option("--jitter", type=float, default=0.3)
+@click.option("--error-rate", type=float, default=0.0)
+@click.option("--error-status", type=int, default=503)
+@click.option("--completion-tokens", type=int, default=180)
+@click.option("--seed", type=int, default=None)
+def standin(port, host, latency_ms, latency_dist, jitter, error_rate, error_status, completion_tokens, seed):
+    """Run a local OpenAI-compatible Cosmos stand-in for load testing."""
+    from src.evaluation.standin_server import StandinSettings, create_standin_server
+
+    settings = StandinSettings(
+        latency_dist=latency_dist, latency_ms=latency_ms, latency_jitter=jitter,
+        error_rate=error_rate, error_status=error_status, completion_tokens=completion_tokens, seed=seed,
+    )
+    server = create_standin_server(host, port, settings)
+    console.print(f"Cosmos stand-in at [bold]http://{host}:{port}/v1[/bold] (set COSMOS_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        console.print(f"Served {settings.stats['requests']} requests ({settings.stats['errors']} injected errors)")
+
+
+@main.command()
+@click.option("--image", type=click.Path(exists=True), required=True)
+@click.option("--mode", type=click.Choice(["social","handover","spatial","trajectory","safety","thrown_object","planning"]), default="safety")
+@click.option("--target", type=click.Choice(["engine", "http"]), default="engine")
+@click.option("--url", type=str, default="http://127.0.0.1:8080/api/analyze")
+@click.option("--base-url", type=str, default=None)
+@click.option("--concurrency", "-c", type=int, default=8)
+@click.option("--rate", type=float, default=None)
+@click.option("--requests", "-n", "total_requests", type=int, default=None)
+@click.option("--duration", type=float, default=None)
+@click.option("--output", "-o", type=click.Path(), default=None)
+def loadtest(image, mode, target, url, base_url, concurrency, rate, total_requests, duration, output):
+    """Drive the engine or the HTTP server at a target concurrency or rate."""
+    from rich.panel import Panel
+    from src.core.reasoning_engine import ReasoningEngine
+    from src.evaluation.loadtest import LoadTester, engine_request_fn, http_request_fn
+
+    if not total_requests and not duration:
+        total_requests = 100
+    if target == "engine":
+        config = Config()
+        if base_url:
+            config.cosmos_base_url = base_url
+        # Every request reuses one image, so coalescing would hide the upstream load being measured.
+        config.single_flight = False
+        request_fn = engine_request_fn(ReasoningEngine(config), image, mode)
+    else:
+        request_fn = http_request_fn(url, image, mode)
+
+    summary = LoadTester(
+        request_fn, concurrency=concurrency, rate=rate, total_requests=total_requests, duration_sec=duration,
+    ).run()
+    console.print(Panel(
+        f"Requests: {summary['requests']} | OK: {summary['ok']} | Errors: {summary['errors']} {summary['errors_by_type'] or ''}\n"
+        f"Throughput: {summary['throughput_rps']} req/s | Mean: {summary['mean_latency_sec']}s\n"
+        f"p50/p95/p99: {summary['p50_latency_sec']}s / {summary['p95_latency_sec']}s / {summary['p99_latency_sec']}s",
+        title=f"Load Test ({target}, concurrency {concurrency})",
+    ))
+    if output:
+        with open(output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+@main.command()
+@click.option("--runs", "-n", type=int, default=5)
+@click.option("--budget-ms", type=float, default=None)
+def startup(runs, budget_ms):
+    """Measure CLI cold start; exits non-zero on a regression."""
+    from src.evaluation.startup import PROBES, run_startup_benchmark
+
+    report = run_startup_benchmark(runs=runs, budget_sec=budget_ms / 1000 if budget_ms else None)
+    for name in PROBES:
+        stats = report[name]
+        console.print(f"{name}: median {stats['median_sec'] * 1000:.0f}ms (min {stats['min_sec'] * 1000:.0f}ms, max {stats['max_sec'] * 1000:.0f}ms)")
+    for failure in report["failures"]:
+        console.print(f"[red]{failure}[/red]")
+    if report["failures"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,3 @@
-cat > src/core/action_planner.py << 'EOF'
-from src.core.cosmos_client import CosmosClient
 from src.core.reasoning_engine import ReasoningEngine
 from src.prompts import action_planning
 from src.utils.helpers import Config
@@ -8,22 +6,19 @@ from src.utils.helpers import Config
 class ActionPlanner:
     def __init__(self, config=None):
         self.config = config or Config()
-        self.client = CosmosClient(self.config)
         self.engine = ReasoningEngine(self.config)
+        self.client = self.engine.client
 
-    def plan_gripper_trajectory(self, image_path, task):
+    def plan_gripper_trajectory(self, image_path, task, bypass_cache=False):
         prompt = action_planning.GRIPPER_TRAJECTORY_PROMPT.format(task=task)
-        result = self.client.reason_about_image(
-            image_path=image_path, prompt=prompt,
-            system_prompt=action_planning.SYSTEM_PROMPT, enable_reasoning=True,
-        )
-        return self.engine._format_result("gripper_trajectory", result)
+        return self.engine.run_tiered("gripper_trajectory", lambda enable_reasoning, timeout, **options: self.client.reason_about_image(
+            image_path=image_path, prompt=prompt, system_prompt=action_planning.SYSTEM_PROMPT,
+            enable_reasoning=enable_reasoning, bypass_cache=bypass_cache, timeout=timeout, **options,
+        ))
 
-    def plan_multi_step(self, image_path, task):
+    def plan_multi_step(self, image_path, task, bypass_cache=False):
         prompt = action_planning.MULTI_STEP_PLAN_PROMPT.format(task=task)
-        result = self.client.reason_about_image(
-            image_path=image_path, prompt=prompt,
-            system_prompt=action_planning.SYSTEM_PROMPT, enable_reasoning=True,
-        )
-        return self.engine._format_result("multi_step_plan", result)
-EOF
\ No newline at end of file
+        return self.engine.run_tiered("multi_step_plan", lambda enable_reasoning, timeout, **options: self.client.reason_about_image(
+            image_path=image_path, prompt=prompt, system_prompt=action_planning.SYSTEM_PROMPT,
+            enable_reasoning=enable_reasoning, bypass_cache=bypass_cache, timeout=timeout, **options,
+        ))
@@ -0,0 +1,152 @@
+import glob
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from src.core.action_planner import ActionPlanner
+from src.core.reasoning_engine import ReasoningEngine
+from src.utils.helpers import Config, percentile
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+def load_entries(source, mode="social", task=None):
+    path = Path(source)
+    if path.is_file() and path.suffix == ".jsonl":
+        return _read_manifest(path, mode, task)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)
+    elif path.is_file():
+        files = [path]
+    else:
+        files = sorted(Path(p) for p in glob.glob(source, recursive=True))
+        files = [p for p in files if p.suffix.lower() in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS]
+    if not files:
+        raise FileNotFoundError(f"No images or videos found for '{source}'")
+    return [_entry(str(p), mode, task) for p in files]
+
+
+def _read_manifest(path, mode, task):
+    entries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            media = item.get("media") or item.get("image") or item.get("video") or item.get("image_url")
+            if not media:
+                raise ValueError(f"{path}:{line_number}: entry has no media")
+            entries.append(_entry(media, item.get("mode", mode), item.get("task", task), item.get("id")))
+    return entries
+
+
+def open_sink(path, resume=True):
+    path = Path(path)
+    if not resume or not path.exists() or not path.stat().st_size:
+        return open(path, "a" if resume else "w")
+    with open(path, "rb") as f:
+        f.seek(-1, 2)
+        torn = f.read(1) != b"\n"
+    sink = open(path, "a")
+    if torn:
+        # A run killed mid-write leaves a partial line; start appending on a fresh one.
+        sink.write("\n")
+    return sink
+
+
+def _entry(media, mode, task, entry_id=None):
+    if entry_id is None:
+        entry_id = f"{media}#{mode}" + (f"#{task}" if task else "")
+    return {"id": str(entry_id), "media": media, "mode": mode, "task": task}
+
+
+class BatchRunner:
+    def __init__(self, config=None, engine=None):
+        self.config = config or Config()
+        self.engine = engine or ReasoningEngine(self.config)
+        self._planner = None
+
+    def run(self, entries, sink, workers=None, bypass_cache=False, completed=()):
+        completed = set(completed)
+        pending = [e for e in entries if e["id"] not in completed]
+        if len(pending) < len(entries):
+            logger.info("Skipping %d completed entries, %d to run", len(entries) - len(pending), len(pending))
+        write_lock = threading.Lock()
+        records = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers or self.config.max_concurrency)) as pool:
+            futures = [pool.submit(self._run_entry, entry, bypass_cache) for entry in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                # One line per result as it lands, so a killed run keeps everything finished so far.
+                with write_lock:
+                    sink.write(json.dumps(record) + "\n")
+                    sink.flush()
+        return self._summarize(records, len(entries) - len(pending), time.perf_counter() - start)
+
+    def _run_entry(self, entry, bypass_cache):
+        record = {"id": entry["id"], "media": entry["media"], "mode": entry["mode"]}
+        if entry["task"]:
+            record["task"] = entry["task"]
+        start = time.perf_counter()
+        try:
+            record["result"] = self._analyze(entry, bypass_cache)
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+        record["elapsed_sec"] = round(time.perf_counter() - start, 3)
+        return record
+
+    def _analyze(self, entry, bypass_cache):
+        media, mode = entry["media"], entry["mode"]
+        if media.startswith(("http://", "https://", "data:")):
+            return self.engine.analyze_image_url(media, mode=mode, bypass_cache=bypass_cache)
+        if entry["task"]:
+            return self.planner.plan_multi_step(media, entry["task"], bypass_cache=bypass_cache)
+        if mode == "full":
+            return self.engine.full_analysis(media, bypass_cache=bypass_cache)
+        if Path(media).suffix.lower() in VIDEO_EXTENSIONS:
+            return self.engine.analyze_video(media, mode=mode, bypass_cache=bypass_cache)
+        return self.engine.analyze_image(media, mode=mode, bypass_cache=bypass_cache)
+
+    @property
+    def planner(self):
+        if self._planner is None:
+            self._planner = ActionPlanner(self.config)
+        return self._planner
+
+    @staticmethod
+    def load_completed(jsonl_path):
+        done = set()
+        if not Path(jsonl_path).exists():
+            return done
+        with open(jsonl_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from an interrupted run
+                # Errored entries are retried on rerun.
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+        return done
+
+    @staticmethod
+    def _summarize(records, skipped, wall_time_sec):
+        elapsed = [r["elapsed_sec"] for r in records]
+        return {
+            "executed": len(records), "skipped": skipped,
+            "ok": sum(1 for r in records if r["status"] == "ok"),
+            "errors": sum(1 for r in records if r["status"] == "error"),
+            "wall_time_sec": round(wall_time_sec, 2),
+            "throughput_per_sec": round(len(records) / wall_time_sec, 3) if records and wall_time_sec else 0,
+            "p50_latency_sec": round(percentile(elapsed, 50), 3),
+            "p95_latency_sec": round(percentile(elapsed, 95), 3),
+        }
@@ -1,69 +1,189 @@
-
+import asyncio
+import base64
+import hashlib
 import logging
-from openai import OpenAI
-from src.utils.helpers import Config, encode_image_to_base64, get_media_type
+import time
+from src.core.response_cache import get_response_cache
+from src.core.stream_parser import StreamParser
+from src.core.structured_output import GUIDED_DECODING_MODES, guided_decoding_params
+from src.core.endpoint_pool import get_endpoint_pool
+from src.prompts.video_timeline import PACKED_FRAMES_PROMPT
+from src.utils.helpers import Config, parse_frame_grid
+from src.utils.image_preprocessing import pack_frames, preprocess_image
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SYSTEM_PROMPT = "You are a helpful robot reasoning assistant."
+STREAM_TIMING_KEYS = ("ttft_sec", "time_to_answer_sec", "total_sec", "cancelled")
+
+
+class _StreamTracker:
+    def __init__(self):
+        self.parser = StreamParser()
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.answer_at = None
+        self.usage = None
+        self.cancelled = False
+        self.raw = ""
+
+    def on_chunk(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return []
+        delta = chunk.choices[0].delta.content or ""
+        if not delta:
+            return []
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.raw += delta
+        return self._stamp(self.parser.feed(delta))
+
+    def finish(self):
+        return self._stamp(self.parser.close())
+
+    def result(self, payload):
+        usage = {
+            "prompt_tokens": self.usage.prompt_tokens if self.usage else 0,
+            "completion_tokens": self.usage.completion_tokens if self.usage else 0,
+            "total_tokens": self.usage.total_tokens if self.usage else 0,
+            "ttft_sec": self._since_start(self.first_token_at),
+            "time_to_answer_sec": self._since_start(self.answer_at),
+            "total_sec": self._since_start(time.perf_counter()),
+            "cancelled": self.cancelled,
+            **payload,
+        }
+        reasoning, answer = self.parser.reasoning.strip(), self.parser.answer.strip()
+        return {"reasoning": reasoning, "answer": answer, "raw": self.raw, "usage": usage}
+
+    def _stamp(self, events):
+        for event in events:
+            if event["type"] == "answer" and self.answer_at is None:
+                self.answer_at = time.perf_counter()
+                event["time_to_answer_sec"] = self._since_start(self.answer_at)
+        return events
+
+    def _since_start(self, moment):
+        return round(moment - self.started, 4) if moment is not None else None
+
 
-class CosmosClient:
+class _BaseCosmosClient:
     def __init__(self, config=None):
         self.config = config or Config()
         self.config.validate()
-        self.client = OpenAI(
-            base_url=self.config.cosmos_base_url,
-            api_key=self.config.nvidia_api_key,
-        )
+        if self.config.guided_decoding not in GUIDED_DECODING_MODES:
+            raise ValueError(
+                f"Unknown GUIDED_DECODING '{self.config.guided_decoding}'. Available: {', '.join(GUIDED_DECODING_MODES)}"
+            )
+        self.cache = get_response_cache(self.config)
+        self.endpoints = get_endpoint_pool(self.config)
+        self._client = None
 
-    def reason_about_image(self, image_path, prompt, system_prompt="You are a helpful robot reasoning assistant.", enable_reasoning=True):
-        b64 = encode_image_to_base64(image_path)
-        media_type = get_media_type(image_path)
-        data_uri = f"data:{media_type};base64,{b64}"
-        full_prompt = self._maybe_add_reasoning_tag(prompt, enable_reasoning)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": [
-                {"type": "image_url", "image_url": {"url": data_uri}},
-                {"type": "text", "text": full_prompt},
-            ]},
-        ]
-        return self._call(messages)
+    @property
+    def client(self):
+        return self._client or self._openai(self.endpoints.primary)
 
-    def reason_about_image_url(self, image_url, prompt, system_prompt="You are a helpful robot reasoning assistant.", enable_reasoning=True):
-        full_prompt = self._maybe_add_reasoning_tag(prompt, enable_reasoning)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": [
-                {"type": "image_url", "image_url": {"url": image_url}},
-                {"type": "text", "text": full_prompt},
-            ]},
-        ]
-        return self._call(messages)
+    @client.setter
+    def client(self, value):
+        self._client = value
 
-    def reason_about_frames(self, frame_paths, prompt, system_prompt="You are a helpful robot reasoning assistant.", enable_reasoning=True):
+    def _affinity_key(self, messages):
+        if not self.endpoints.affinity or len(self.endpoints.endpoints) < 2:
+            return None
+        digest = hashlib.sha1()
+        for part in messages[-1]["content"]:
+            if part.get("type") == "image_url":
+                digest.update(part["image_url"]["url"].encode("utf-8"))
+        return digest.hexdigest()
+
+    def _frame_messages(self, frame_paths, prompt, system_prompt, enable_reasoning, timestamps=None):
+        urls = []
+        payload = {"images": 0, "image_bytes_raw": 0, "image_bytes_sent": 0}
+        grid = parse_frame_grid(self.config.frame_packing)
+        if grid and len(frame_paths) > 1:
+            labels = [f"{t:.1f}s" for t in timestamps] if timestamps else None
+            packed = pack_frames(frame_paths, grid, self.config.frame_pack_tile_side, labels)
+            prompt = PACKED_FRAMES_PROMPT.format(
+                prompt=prompt, frame_count=len(frame_paths), mosaic_count=len(packed), cols=grid[0], rows=grid[1],
+                labels=", ".join(labels or [f"#{i + 1}" for i in range(len(frame_paths))]),
+            )
+            payload["frames_packed"] = len(frame_paths)
+            frame_paths = packed
+        for frame in frame_paths:
+            data, media_type, stats = preprocess_image(frame, self.config)
+            b64 = base64.b64encode(data).decode("utf-8")
+            urls.append(f"data:{media_type};base64,{b64}")
+            payload["images"] += 1
+            payload["image_bytes_raw"] += stats["image_bytes_raw"]
+            payload["image_bytes_sent"] += stats["image_bytes_sent"]
+        return self._build_messages(urls, prompt, system_prompt, enable_reasoning), payload
+
+    def _build_messages(self, image_urls, prompt, system_prompt, enable_reasoning):
         full_prompt = self._maybe_add_reasoning_tag(prompt, enable_reasoning)
-        content = []
-        for path in frame_paths:
-            b64 = encode_image_to_base64(path)
-            media_type = get_media_type(path)
-            data_uri = f"data:{media_type};base64,{b64}"
-            content.append({"type": "image_url", "image_url": {"url": data_uri}})
+        content = [{"type": "image_url", "image_url": {"url": url}} for url in image_urls]
         content.append({"type": "text", "text": full_prompt})
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": content},
         ]
-        return self._call(messages)
-
-    def _call(self, messages):
-        response = self.client.chat.completions.create(
-            model=self.config.cosmos_model,
-            messages=messages,
-            max_tokens=self.config.max_tokens,
-            temperature=self.config.temperature,
-            top_p=self.config.top_p,
-            stream=False,
-        )
+
+    def _request_params(self, messages, response_schema=None, max_tokens=None):
+        params = {
+            "model": self.config.cosmos_model,
+            "messages": messages,
+            "max_tokens": min(max_tokens, self.config.max_tokens) if max_tokens else self.config.max_tokens,
+            "temperature": self.config.temperature,
+            "top_p": self.config.top_p,
+            "stream": False,
+        }
+        params.update(guided_decoding_params(self.config.guided_decoding, response_schema))
+        return params
+
+    def _stream_params(self, messages, response_schema=None, max_tokens=None):
+        params = self._request_params(messages, response_schema, max_tokens)
+        params["stream"] = True
+        params["stream_options"] = {"include_usage": True}
+        return params
+
+    @staticmethod
+    def _replay_events(result):
+        parser = StreamParser()
+        events = parser.feed(result.get("raw") or result.get("answer", "")) + parser.close()
+        for event in events:
+            if event["type"] == "answer":
+                event["time_to_answer_sec"] = 0.0
+        result["usage"].update({"ttft_sec": 0.0, "time_to_answer_sec": 0.0, "total_sec": 0.0, "cancelled": False})
+        return events + [{"type": "done", "result": result}]
+
+    def _stamp(self, result, **timings):
+        # Per-call facts that never go into the response cache.
+        result["model"] = self.config.cosmos_model
+        result.setdefault("timings", {}).update({k: round(v, 4) for k, v in timings.items() if v is not None})
+        return result
+
+    def _cache_lookup(self, params, bypass_cache):
+        if self.cache is None or bypass_cache:
+            return None, None
+        key = self.cache.make_key(params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cached["cache"] = {"hit": True, **self._cache_counters()}
+        return key, cached
+
+    def _cache_store(self, key, result):
+        if key is not None:
+            # Streaming timings describe this one call, not the cached answer.
+            usage = {k: v for k, v in result["usage"].items() if k not in STREAM_TIMING_KEYS}
+            self.cache.put(key, {**result, "usage": usage})
+            result["cache"] = {"hit": False, **self._cache_counters()}
+        return result
+
+    def _cache_counters(self):
+        stats = self.cache.stats()
+        return {"hits": stats["hits"], "misses": stats["misses"]}
+
+    def _build_result(self, response):
         raw_text = response.choices[0].message.content or ""
         usage = {
             "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
@@ -93,3 +213,171 @@ class CosmosClient:
             answer = text[end + len("</think>"):].strip()
             return reasoning, answer
         return "", text.strip()
+
+
+class CosmosClient(_BaseCosmosClient):
+    def _openai(self, transport):
+        return self._client or transport.client
+
+    def reason_about_image(self, image_path, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                           bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        return self.reason_about_frames(
+            [image_path], prompt, system_prompt, enable_reasoning, bypass_cache, timeout, response_schema, max_tokens,
+        )
+
+    def reason_about_image_url(self, image_url, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                               bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        messages = self._build_messages([image_url], prompt, system_prompt, enable_reasoning)
+        return self._call(messages, bypass_cache, timeout, response_schema, max_tokens)
+
+    def reason_about_frames(self, frame_paths, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                            bypass_cache=False, timeout=None, response_schema=None, max_tokens=None, timestamps=None):
+        started = time.perf_counter()
+        messages, payload = self._frame_messages(frame_paths, prompt, system_prompt, enable_reasoning, timestamps)
+        encode_sec = time.perf_counter() - started
+        result = self._call(messages, bypass_cache, timeout, response_schema, max_tokens)
+        result["usage"].update(payload)
+        return self._stamp(result, encode_sec=encode_sec)
+
+    def stream_image(self, image_path, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                     stop_on_answer=False, bypass_cache=False, response_schema=None, max_tokens=None, timeout=None):
+        yield from self.stream_frames(
+            [image_path], prompt, system_prompt, enable_reasoning, stop_on_answer, bypass_cache, response_schema, max_tokens,
+            timeout,
+        )
+
+    def stream_frames(self, frame_paths, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                      stop_on_answer=False, bypass_cache=False, response_schema=None, max_tokens=None, timeout=None):
+        started = time.perf_counter()
+        messages, payload = self._frame_messages(frame_paths, prompt, system_prompt, enable_reasoning)
+        encode_sec = time.perf_counter() - started
+        key, cached = self._cache_lookup(self._request_params(messages, response_schema, max_tokens), bypass_cache)
+        if cached is not None:
+            cached["usage"].update(payload)
+            yield from self._replay_events(self._stamp(cached, encode_sec=encode_sec))
+            return
+
+        tracker = _StreamTracker()
+        params = self._stream_params(messages, response_schema, max_tokens)
+        with self.endpoints.lease(self._affinity_key(messages)) as transport:
+            client = self._openai(transport)
+            stream, meta = transport.call(lambda **options: client.chat.completions.create(**params, **options), timeout)
+            try:
+                for chunk in stream:
+                    yield from tracker.on_chunk(chunk)
+                    if stop_on_answer and tracker.parser.answer_ready:
+                        tracker.cancelled = True
+                        break
+            finally:
+                stream.close()
+        yield from tracker.finish()
+        result = tracker.result(payload)
+        if not tracker.cancelled:
+            self._cache_store(key, result)
+        result["transport"] = meta
+        self._stamp(result, encode_sec=encode_sec, upstream_sec=result["usage"]["total_sec"], ttft_sec=result["usage"]["ttft_sec"])
+        yield {"type": "done", "result": result}
+
+    def _call(self, messages, bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        params = self._request_params(messages, response_schema, max_tokens)
+        key, cached = self._cache_lookup(params, bypass_cache)
+        if cached is not None:
+            return self._stamp(cached)
+        started = time.perf_counter()
+        with self.endpoints.lease(self._affinity_key(messages)) as transport:
+            client = self._openai(transport)
+            response, meta = transport.call(
+                lambda **options: client.chat.completions.create(**params, **options), timeout,
+            )
+        result = self._cache_store(key, self._build_result(response))
+        result["transport"] = meta
+        return self._stamp(result, upstream_sec=time.perf_counter() - started)
+
+
+class AsyncCosmosClient(_BaseCosmosClient):
+    def _openai(self, transport):
+        return self._client or transport.async_client()
+
+    async def reason_about_image(self, image_path, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                                 bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        return await self.reason_about_frames(
+            [image_path], prompt, system_prompt, enable_reasoning, bypass_cache, timeout, response_schema, max_tokens,
+        )
+
+    async def reason_about_image_url(self, image_url, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                                     bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        messages = self._build_messages([image_url], prompt, system_prompt, enable_reasoning)
+        return await self._call(messages, bypass_cache, timeout, response_schema, max_tokens)
+
+    async def reason_about_frames(self, frame_paths, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                                  bypass_cache=False, timeout=None, response_schema=None, max_tokens=None,
+                                  timestamps=None):
+        started = time.perf_counter()
+        messages, payload = await asyncio.to_thread(
+            self._frame_messages, frame_paths, prompt, system_prompt, enable_reasoning, timestamps,
+        )
+        encode_sec = time.perf_counter() - started
+        result = await self._call(messages, bypass_cache, timeout, response_schema, max_tokens)
+        result["usage"].update(payload)
+        return self._stamp(result, encode_sec=encode_sec)
+
+    async def stream_image(self, image_path, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                           stop_on_answer=False, bypass_cache=False, response_schema=None, max_tokens=None):
+        async for event in self.stream_frames([image_path], prompt, system_prompt, enable_reasoning,
+                                              stop_on_answer, bypass_cache, response_schema, max_tokens):
+            yield event
+
+    async def stream_frames(self, frame_paths, prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, enable_reasoning=True,
+                            stop_on_answer=False, bypass_cache=False, response_schema=None, max_tokens=None):
+        started = time.perf_counter()
+        messages, payload = await asyncio.to_thread(
+            self._frame_messages, frame_paths, prompt, system_prompt, enable_reasoning,
+        )
+        encode_sec = time.perf_counter() - started
+        params = self._request_params(messages, response_schema, max_tokens)
+        key, cached = await asyncio.to_thread(self._cache_lookup, params, bypass_cache)
+        if cached is not None:
+            cached["usage"].update(payload)
+            for event in self._replay_events(self._stamp(cached, encode_sec=encode_sec)):
+                yield event
+            return
+
+        tracker = _StreamTracker()
+        params = self._stream_params(messages, response_schema, max_tokens)
+        with self.endpoints.lease(self._affinity_key(messages)) as transport:
+            client = self._openai(transport)
+            stream, meta = await transport.call_async(
+                lambda **options: client.chat.completions.create(**params, **options),
+            )
+            try:
+                async for chunk in stream:
+                    for event in tracker.on_chunk(chunk):
+                        yield event
+                    if stop_on_answer and tracker.parser.answer_ready:
+                        tracker.cancelled = True
+                        break
+            finally:
+                await stream.close()
+        for event in tracker.finish():
+            yield event
+        result = tracker.result(payload)
+        if not tracker.cancelled:
+            await asyncio.to_thread(self._cache_store, key, result)
+        result["transport"] = meta
+        self._stamp(result, encode_sec=encode_sec, upstream_sec=result["usage"]["total_sec"], ttft_sec=result["usage"]["ttft_sec"])
+        yield {"type": "done", "result": result}
+
+    async def _call(self, messages, bypass_cache=False, timeout=None, response_schema=None, max_tokens=None):
+        params = self._request_params(messages, response_schema, max_tokens)
+        key, cached = await asyncio.to_thread(self._cache_lookup, params, bypass_cache)
+        if cached is not None:
+            return self._stamp(cached)
+        started = time.perf_counter()
+        with self.endpoints.lease(self._affinity_key(messages)) as transport:
+            client = self._openai(transport)
+            response, meta = await transport.call_async(
+                lambda **options: client.chat.completions.create(**params, **options), timeout,
+            )
+        result = await asyncio.to_thread(self._cache_store, key, self._build_result(response))
+        result["transport"] = meta
+        return self._stamp(result, upstream_sec=time.perf_counter() - started)
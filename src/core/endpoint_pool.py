@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+import openai
+from src.core.transport import get_transport
+
+logger = logging.getLogger(__name__)
+
+ROUTING_STRATEGIES = ("least_outstanding", "latency")
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def parse_base_urls(value):
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class Endpoint:
+    def __init__(self, transport):
+        self.transport = transport
+        self.url = transport.base_url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ewma_latency = None
+        self.ejected_until = 0.0
+
+    def available(self, now):
+        return self.ejected_until <= now and self.transport.breaker.state != "open"
+
+    def load(self, strategy):
+        if strategy == "latency":
+            # Unmeasured replicas look fast so they get probed early.
+            return (self.ewma_latency or 0.0) * (self.outstanding + 1)
+        return self.outstanding
+
+    def snapshot(self, now):
+        return {
+            "url": self.url, "healthy": self.ejected_until <= now, "outstanding": self.outstanding,
+            "requests": self.requests, "consecutive_failures": self.failures,
+            "ewma_latency_sec": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "breaker": self.transport.breaker.state,
+        }
+
+
+class EndpointPool:
+    def __init__(self, config):
+        urls = parse_base_urls(config.cosmos_base_url)
+        if not urls:
+            raise ValueError("COSMOS_BASE_URL must name at least one endpoint")
+        if config.routing_strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown ROUTING_STRATEGY '{config.routing_strategy}'. Available: {', '.join(ROUTING_STRATEGIES)}")
+        self.endpoints = [Endpoint(get_transport(config, url)) for url in urls]
+        self.strategy = config.routing_strategy
+        self.affinity = config.endpoint_affinity
+        self.eject_after = config.endpoint_eject_after
+        self.eject_sec = config.endpoint_eject_sec
+        self.health_interval_sec = config.health_check_interval_sec
+        self._api_key = config.nvidia_api_key
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    @property
+    def primary(self):
+        return self.endpoints[0].transport
+
+    def pick(self, affinity_key=None):
+        self._ensure_health_checks()
+        now = time.monotonic()
+        with self._lock:
+            # With every replica ejected, keep trying them rather than refusing all traffic.
+            candidates = [e for e in self.endpoints if e.available(now)] or self.endpoints
+            if affinity_key is not None and self.affinity and len(candidates) > 1:
+                chosen = max(candidates, key=lambda e: _rendezvous_score(affinity_key, e.url))
+            else:
+                chosen = min(candidates, key=lambda e: (e.load(self.strategy), e.requests))
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    @contextmanager
+    def lease(self, affinity_key=None):
+        endpoint = self.pick(affinity_key)
+        start = time.perf_counter()
+        latency, failed = None, False
+        try:
+            yield endpoint.transport
+            latency = time.perf_counter() - start
+        except Exception as e:
+            failed = self._is_endpoint_failure(e)
+            raise
+        finally:
+            # Cancellation and early-closed streams still give the slot back, without counting as failures.
+            self._finish(endpoint, latency, failed)
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            healthy = self._probe(endpoint.url)
+            with self._lock:
+                if healthy and endpoint.ejected_until:
+                    logger.info("Re-admitting endpoint %s", endpoint.url)
+                    endpoint.ejected_until = 0.0
+                    endpoint.failures = 0
+                elif not healthy and endpoint.ejected_until <= time.monotonic():
+                    logger.warning("Ejecting endpoint %s after a failed health check", endpoint.url)
+                    endpoint.ejected_until = time.monotonic() + self.eject_sec
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            endpoints = [e.snapshot(now) for e in self.endpoints]
+        return {"strategy": self.strategy, "affinity": self.affinity, "endpoints": endpoints}
+
+    def _finish(self, endpoint, latency, failed):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if latency is not None:
+                endpoint.failures = 0
+                endpoint.ewma_latency = latency if endpoint.ewma_latency is None else 0.8 * endpoint.ewma_latency + 0.2 * latency
+            elif failed:
+                endpoint.failures += 1
+                if self.eject_after and endpoint.failures >= self.eject_after and len(self.endpoints) > 1:
+                    logger.warning("Ejecting endpoint %s after %d failures", endpoint.url, endpoint.failures)
+                    endpoint.ejected_until = time.monotonic() + self.eject_sec
+
+    @staticmethod
+    def _is_endpoint_failure(error):
+        status = getattr(error, "status_code", None)
+        return isinstance(error, openai.APIConnectionError) or (status is not None and status >= 500)
+
+    def _probe(self, url):
+        request = urllib.request.Request(f"{url}/models", headers={"Authorization": f"Bearer {self._api_key}"})
+        try:
+            with urllib.request.urlopen(request, timeout=min(5.0, self.health_interval_sec or 5.0)) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def _ensure_health_checks(self):
+        if self._health_thread is not None or len(self.endpoints) < 2 or self.health_interval_sec <= 0:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="egobot-health", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval_sec)
+            self.check_health()
+
+
+def _rendezvous_score(key, url):
+    return hashlib.blake2b(f"{key}|{url}".encode("utf-8"), digest_size=8).digest()
+
+
+def get_endpoint_pool(config):
+    key = (config.cosmos_base_url, config.nvidia_api_key)
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = EndpointPool(config)
+        return _registry[key]
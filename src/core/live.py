@@ -0,0 +1,143 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from src.core.reasoning_engine import MOTION_MODES, ReasoningEngine
+from src.core.video_processor import MotionGate
+from src.utils.helpers import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LiveRunner:
+    def __init__(self, config=None, engine=None, mode="safety", sample_fps=None, window_frames=None,
+                 change_threshold=None, max_staleness_sec=None, max_inflight=None):
+        self.config = config or Config()
+        self.engine = engine or ReasoningEngine(self.config)
+        self.engine._get_prompts(mode)
+        self.mode = mode
+        self.sample_fps = sample_fps or self.config.live_sample_fps
+        self.window_frames = max(1, window_frames or self.config.live_window_frames)
+        self.change_threshold = self.config.live_change_threshold if change_threshold is None else change_threshold
+        self.max_staleness_sec = self.config.live_max_staleness_sec if max_staleness_sec is None else max_staleness_sec
+        self.max_inflight = max(1, max_inflight or self.config.live_max_inflight)
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.calls = 0
+        self.skipped_busy = 0
+
+    def stream(self, source, max_results=None, stop_event=None):
+        processor = self.engine.video_processor
+        cap = processor.open_stream(source)
+        # Cameras that don't report a rate are treated as 30fps.
+        fps = processor._read_info(cap)["fps"] or 30.0
+        stride = max(1, round(fps / self.sample_fps)) if self.sample_fps else 1
+        window = deque(maxlen=self.window_frames)
+        inflight = set()
+        last_hash, last_call_at = None, None
+        # Motion modes are only worth a call while something moves, so they skip the scene-change gate.
+        motion_gate = MotionGate.from_config(self.config) if self.mode in MOTION_MODES else None
+        moving = False
+        produced = 0
+        frame_idx = -1
+        pool = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="egobot-live")
+        try:
+            while not (stop_event is not None and stop_event.is_set()):
+                frame_idx += 1
+                if frame_idx % stride:
+                    if not cap.grab():
+                        break
+                    self.frames_read += 1
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.frames_read += 1
+                self.frames_sampled += 1
+                timestamp = round(frame_idx / fps, 3)
+                window.append((timestamp, frame))
+                if motion_gate is not None:
+                    motion = motion_gate.update(frame)
+                    moving = moving and motion["region"] is not None
+                    trigger, distance, frame_hash = self._motion_trigger(motion, moving, timestamp, last_call_at), None, None
+                else:
+                    motion = None
+                    frame_hash = processor.dhash(frame)
+                    trigger, distance = self._trigger(processor, frame_hash, last_hash, timestamp, last_call_at)
+                if trigger is not None:
+                    if len(inflight) >= self.max_inflight:
+                        # Busy: the next sampled frame is compared against the same baseline and retried.
+                        self.skipped_busy += 1
+                    else:
+                        frames = list(window)
+                        info = {
+                            "frame_index": frame_idx, "timestamp_sec": timestamp, "trigger": trigger,
+                            "hash_distance": distance, "frame_timestamps_sec": [t for t, _ in frames],
+                        }
+                        if motion is not None:
+                            info["motion"] = motion
+                        inflight.add(pool.submit(self._analyze, processor, frames, info))
+                        last_hash, last_call_at = frame_hash, timestamp
+                        moving = motion is not None
+                        self.calls += 1
+
+                for result in self._drain(inflight, block=False):
+                    yield result
+                    produced += 1
+                    if max_results and produced >= max_results:
+                        return
+            for result in self._drain(inflight, block=True):
+                yield result
+                produced += 1
+                if max_results and produced >= max_results:
+                    return
+        finally:
+            cap.release()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, source, callback, max_results=None, stop_event=None):
+        for result in self.stream(source, max_results=max_results, stop_event=stop_event):
+            callback(result)
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_read, "frames_sampled": self.frames_sampled,
+            "calls": self.calls, "skipped_busy": self.skipped_busy,
+        }
+
+    def _trigger(self, processor, frame_hash, last_hash, timestamp, last_call_at):
+        if last_hash is None:
+            return "first", None
+        distance = processor.hash_distance(frame_hash, last_hash)
+        if distance >= self.change_threshold:
+            return "change", distance
+        if self.max_staleness_sec and timestamp - last_call_at >= self.max_staleness_sec:
+            return "staleness", distance
+        return None, distance
+
+    def _motion_trigger(self, motion, moving, timestamp, last_call_at):
+        if motion["region"] is None:
+            return None
+        # Sustained motion is re-checked at the staleness interval rather than on every frame.
+        if not moving or (self.max_staleness_sec and timestamp - last_call_at >= self.max_staleness_sec):
+            return "motion"
+        return None
+
+    def _analyze(self, processor, frames, info):
+        start = time.perf_counter()
+        try:
+            encoded = [processor.encode_frame(frame) for _, frame in frames]
+            result = self.engine.analyze_frames(encoded, mode=self.mode, timestamps=info["frame_timestamps_sec"])
+        except Exception as e:
+            logger.warning("Live analysis at %.1fs failed: %s", info["timestamp_sec"], e)
+            result = {"mode": self.mode, "error": str(e)}
+        result["live"] = {**info, "latency_sec": round(time.perf_counter() - start, 3)}
+        return result
+
+    @staticmethod
+    def _drain(inflight, block):
+        if block and inflight:
+            wait(inflight)
+        done = sorted((f for f in inflight if f.done()), key=lambda f: f.result()["live"]["frame_index"])
+        inflight.difference_update(done)
+        return [future.result() for future in done]
@@ -1,9 +1,20 @@
 
+import asyncio
 import json
 import logging
-from src.core.cosmos_client import CosmosClient
-from src.core.video_processor import VideoProcessor
-from src.prompts import social_reasoning, spatial_reasoning, safety_assessment, action_planning
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext
+from src.core.cosmos_client import CosmosClient, AsyncCosmosClient
+from src.core.scheduler import PriorityScheduler, priority_of
+from src.core.singleflight import SingleFlight, content_digest
+from src.core.structured_output import extract_json, validate
+from src.core.transport import run_coroutine
+from src.prompts import social_reasoning, spatial_reasoning, safety_assessment, action_planning, fused_analysis, video_timeline
+from src.prompts.schemas import MODE_SCHEMAS, MODE_MAX_TOKENS, TIMELINE_EXTRA_TOKENS, fast_max_tokens, with_events, fused_schema
+from src.utils import metrics
 from src.utils.helpers import Config
 
 logger = logging.getLogger(__name__)
@@ -18,52 +29,532 @@ REASONING_MODES = {
     "planning": (action_planning.SYSTEM_PROMPT, action_planning.NEXT_ACTION_PROMPT),
 }
 
+FULL_ANALYSIS_MODES = ["social", "spatial", "safety", "planning"]
+
+# Modes whose prompts assume something is moving; gated on local motion detection.
+MOTION_MODES = ("trajectory", "thrown_object")
+
+RESULT_METADATA_KEYS = ("cache", "transport", "model", "timings")
+
+SEVERITY_ORDER = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+REASONING_POLICIES = ("off", "on", "cascade")
+DEFAULT_REASONING_POLICY = {"handover": "cascade", "trajectory": "cascade", "thrown_object": "cascade"}
+
+# Answer fields whose alarming values are worth a second, reasoned look.
+ESCALATION_VALUES = {
+    "severity": ("high", "critical"),
+    "collision_risk": ("high", "imminent"),
+    "hit_risk": ("high",),
+    "priority": ("urgent",),
+}
+
+
+def parse_reasoning_policy(value):
+    policy = dict(DEFAULT_REASONING_POLICY)
+    default = "on"
+    for entry in (value or "").split(","):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        mode, _, choice = entry.rpartition("=")
+        if choice not in REASONING_POLICIES:
+            raise ValueError(f"Unknown reasoning policy '{choice}'. Available: {', '.join(REASONING_POLICIES)}")
+        if not mode:
+            # A bare policy replaces the built-in per-mode defaults.
+            default = choice
+            policy = {m: c for m, c in policy.items() if m not in DEFAULT_REASONING_POLICY}
+        elif mode in MODE_SCHEMAS:
+            policy[mode] = choice
+        else:
+            raise ValueError(f"Unknown mode '{mode}' in REASONING_POLICY")
+    return default, policy
+
+
+def parse_similarity_modes(spec):
+    modes = {m.strip() for m in (spec or "").split(",") if m.strip()}
+    if not modes:
+        # A small object entering the frame barely moves the hash, so modes that must react to it always run.
+        return {m for m in MODE_SCHEMAS if priority_of(m) != "critical" and m not in MOTION_MODES}
+    unknown = modes - set(MODE_SCHEMAS)
+    if unknown:
+        raise ValueError(f"Unknown mode(s) in SIMILARITY_CACHE_MODES: {', '.join(sorted(unknown))}")
+    return modes
+
 
 class ReasoningEngine:
     def __init__(self, config=None):
         self.config = config or Config()
         self.client = CosmosClient(self.config)
-        self.video_processor = VideoProcessor(self.config)
+        self._video_processor = None
+        self.single_flight = SingleFlight() if self.config.single_flight else None
+        self.scheduler = PriorityScheduler.from_config(self.config) if self.config.scheduler_slots > 0 else None
+        self.default_policy, self.reasoning_policy = parse_reasoning_policy(self.config.reasoning_policy)
+        self.similarity_cache = None
+        if self.config.similarity_cache:
+            from src.core.similarity_cache import SimilarityCache
 
-    def analyze_image(self, image_path, mode="social"):
-        system_prompt, user_prompt = self._get_prompts(mode)
-        result = self.client.reason_about_image(
-            image_path=image_path, prompt=user_prompt,
-            system_prompt=system_prompt, enable_reasoning=True,
+            self.similarity_cache = SimilarityCache.from_config(self.config)
+            self.similarity_modes = parse_similarity_modes(self.config.similarity_cache_modes)
+        self._async_client = None
+
+    @property
+    def video_processor(self):
+        # OpenCV is only needed once a video shows up.
+        if self._video_processor is None:
+            from src.core.video_processor import VideoProcessor
+            self._video_processor = VideoProcessor(self.config)
+        return self._video_processor
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = AsyncCosmosClient(self.config)
+        return self._async_client
+
+    def analyze_image(self, image_path, mode="social", bypass_cache=False, timeout=None):
+        self._get_prompts(mode)
+        image_hash = None
+        if self.similarity_cache is not None and mode in self.similarity_modes:
+            from src.core.similarity_cache import image_dhash
+
+            start = time.perf_counter()
+            image_hash = image_dhash(image_path)
+            if not bypass_cache:
+                cached, distance = self.similarity_cache.get(mode, image_hash)
+                metrics.SIMILARITY_CACHE_LOOKUPS.inc(outcome="miss" if cached is None else "hit", mode=mode)
+                if cached is not None:
+                    cached["cache"] = {"hit": True, "kind": "similarity", "distance": distance}
+                    cached["timings"] = {"lookup_sec": round(time.perf_counter() - start, 4)}
+                    return cached
+        result = self._coalesce(
+            ("image", content_digest(image_path), mode), timeout,
+            self._analyze_image, image_path, mode, bypass_cache, timeout,
         )
-        return self._format_result(mode, result)
+        # Only answers that parsed cleanly are worth handing to near-duplicate frames.
+        if image_hash is not None and result.get("parsed") is not None and not result.get("validation_errors"):
+            self.similarity_cache.put(mode, image_hash, result)
+        return result
 
-    def analyze_image_url(self, image_url, mode="social"):
+    def _analyze_image(self, image_path, mode, bypass_cache, timeout):
         system_prompt, user_prompt = self._get_prompts(mode)
-        result = self.client.reason_about_image_url(
-            image_url=image_url, prompt=user_prompt,
-            system_prompt=system_prompt, enable_reasoning=True,
+        return self.run_tiered(mode, lambda enable_reasoning, timeout, **options: self.client.reason_about_image(
+            image_path=image_path, prompt=user_prompt, system_prompt=system_prompt,
+            enable_reasoning=enable_reasoning, bypass_cache=bypass_cache, timeout=timeout, **options,
+        ), timeout)
+
+    async def analyze_image_async(self, image_path, mode="social", client=None, bypass_cache=False):
+        client = client or self.async_client
+        system_prompt, user_prompt = self._get_prompts(mode)
+        return await self.run_tiered_async(mode, lambda enable_reasoning, **options: client.reason_about_image(
+            image_path=image_path, prompt=user_prompt, system_prompt=system_prompt,
+            enable_reasoning=enable_reasoning, bypass_cache=bypass_cache, **options,
+        ))
+
+    def stream_image(self, image_path, mode="safety", stop_on_answer=False, bypass_cache=False, timeout=None):
+        system_prompt, user_prompt = self._get_prompts(mode)
+        with self.scheduler.slot(mode, timeout) if self.scheduler is not None else nullcontext() as ticket:
+            remaining = ticket.remaining(timeout) if ticket is not None else timeout
+            stream = self.client.stream_image(
+                image_path=image_path, prompt=user_prompt, system_prompt=system_prompt,
+                enable_reasoning=self.policy_for(mode) != "off", stop_on_answer=stop_on_answer, bypass_cache=bypass_cache,
+                timeout=remaining, **self._output_options(mode),
+            )
+            # Closing the client stream is what hands its endpoint lease back when a caller stops reading early.
+            with closing(stream):
+                for event in stream:
+                    if event["type"] == "done":
+                        event = {"type": "done", "result": self._format_result(mode, event["result"])}
+                    yield {**event, "mode": mode}
+
+    def analyze_image_url(self, image_url, mode="social", bypass_cache=False):
+        system_prompt, user_prompt = self._get_prompts(mode)
+        return self.run_tiered(mode, lambda enable_reasoning, timeout, **options: self.client.reason_about_image_url(
+            image_url=image_url, prompt=user_prompt, system_prompt=system_prompt,
+            enable_reasoning=enable_reasoning, bypass_cache=bypass_cache, timeout=timeout, **options,
+        ))
+
+    def analyze_frames(self, frames, mode="safety", bypass_cache=False, timeout=None, timestamps=None):
+        system_prompt, user_prompt = self._get_prompts(mode)
+        return self.run_tiered(mode, lambda enable_reasoning, timeout, **options: self.client.reason_about_frames(
+            frame_paths=frames, prompt=user_prompt, system_prompt=system_prompt, enable_reasoning=enable_reasoning,
+            bypass_cache=bypass_cache, timeout=timeout, timestamps=timestamps, **options,
+        ), timeout)
+
+    def analyze_video(self, video_path, mode="social", max_frames=16, sampling=None, bypass_cache=False):
+        sampling = sampling or self.config.video_sampling
+        self._get_prompts(mode)
+        return self._coalesce(
+            ("video", content_digest(video_path), mode, max_frames, sampling), None,
+            self._analyze_video, video_path, mode, max_frames, sampling, bypass_cache,
         )
-        return self._format_result(mode, result)
 
-    def analyze_video(self, video_path, mode="social", max_frames=16):
-        video_info = self.video_processor.get_video_info(video_path)
-        frames = self.video_processor.extract_frames(video_path, max_frames=max_frames)
+    def _analyze_video(self, video_path, mode, max_frames, sampling, bypass_cache):
+        started = time.perf_counter()
+        frames, timestamps, video_info = self.video_processor.extract_frame_buffers(
+            video_path, max_frames=max_frames, sampling=sampling,
+        )
+        extract_sec = time.perf_counter() - started
+        metrics.STAGE_SECONDS.observe(extract_sec, stage="extract", mode=mode, model=self.config.cosmos_model)
         if not frames:
             raise ValueError(f"No frames extracted from {video_path}")
-        system_prompt, user_prompt = self._get_prompts(mode)
-        result = self.client.reason_about_frames(
-            frame_paths=frames, prompt=user_prompt,
-            system_prompt=system_prompt, enable_reasoning=True,
-        )
-        output = self._format_result(mode, result)
+        output = self.analyze_frames(frames, mode=mode, bypass_cache=bypass_cache, timestamps=timestamps)
+        output.setdefault("timings", {})["extract_sec"] = round(extract_sec, 4)
         output["video_info"] = video_info
         output["frames_analyzed"] = len(frames)
+        output["frame_timestamps_sec"] = timestamps
+        output["sampling"] = sampling
         return output
 
-    def full_analysis(self, image_path):
-        results = {}
-        for mode in ["social", "spatial", "safety", "planning"]:
+    def analyze_motion(self, video_path, mode="thrown_object", bypass_cache=False):
+        self._get_prompts(mode)
+        start = time.perf_counter()
+        events, video_info = self.video_processor.detect_motion(video_path)
+        motion_sec = time.perf_counter() - start
+        metrics.STAGE_SECONDS.observe(motion_sec, stage="motion", mode=mode, model=self.config.cosmos_model)
+        results = []
+        for event in events:
+            # Only moments with motion reach the model; a static clip costs no calls at all.
+            output = self.analyze_frames(
+                event.pop("frames"), mode=mode, bypass_cache=bypass_cache, timestamps=event["timestamps_sec"],
+            )
+            output["motion"] = event
+            results.append(output)
+        usage = {}
+        for output in results:
+            for key, value in output.get("usage", {}).items():
+                usage[key] = usage.get(key, 0) + value
+        return {
+            "type": "motion_analysis", "video": str(video_path), "mode": mode,
+            "video_info": video_info, "events": results, "usage": usage,
+            "timings": {"motion_sec": round(motion_sec, 4)},
+            "elapsed_sec": round(time.perf_counter() - start, 3),
+        }
+
+    def _coalesce(self, key, timeout, fn, *args):
+        if self.single_flight is None:
+            return fn(*args)
+        result, shared = self.single_flight.do(key, lambda: fn(*args), timeout=timeout)
+        metrics.SINGLE_FLIGHT_CALLS.inc(outcome="coalesced" if shared else "leader", mode=key[2])
+        result["single_flight"] = {"coalesced": shared}
+        return result
+
+    def policy_for(self, mode):
+        return self.reasoning_policy.get(mode, self.default_policy)
+
+    def run_tiered(self, mode, call, timeout=None):
+        policy = self.policy_for(mode)
+
+        def invoke(enable_reasoning, timeout, fast=False):
+            options = self._output_options(mode, fast=fast)
+            return self._format_result(mode, self._scheduled(
+                mode, timeout, lambda remaining: call(enable_reasoning, remaining, **options),
+            ))
+
+        if policy == "on":
+            return self._tag_tier(invoke(True, timeout), policy, "full")
+        deadline = time.monotonic() + timeout if timeout else None
+        # Only a cascade can retry a truncated answer, so "off" keeps the whole mode budget.
+        output = invoke(False, timeout, fast=policy == "cascade")
+        reason = self.escalation_reason(output) if policy == "cascade" else None
+        if reason is None:
+            return self._tag_tier(output, policy, "fast")
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            output["escalation"] = {"reason": reason, "skipped": "deadline"}
+            return self._tag_tier(output, policy, "fast")
+        escalated = invoke(True, remaining)
+        escalated["escalation"] = {"reason": reason, "fast_usage": output["usage"]}
+        return self._tag_tier(escalated, policy, "full")
+
+    async def run_tiered_async(self, mode, call):
+        policy = self.policy_for(mode)
+
+        async def invoke(enable_reasoning, fast=False):
+            options = self._output_options(mode, fast=fast)
+            return self._format_result(mode, await self._scheduled_async(
+                mode, None, lambda remaining: call(enable_reasoning, **options),
+            ))
+
+        if policy == "on":
+            return self._tag_tier(await invoke(True), policy, "full")
+        output = await invoke(False, fast=policy == "cascade")
+        reason = self.escalation_reason(output) if policy == "cascade" else None
+        if reason is None:
+            return self._tag_tier(output, policy, "fast")
+        escalated = await invoke(True)
+        escalated["escalation"] = {"reason": reason, "fast_usage": output["usage"]}
+        return self._tag_tier(escalated, policy, "full")
+
+    def _scheduled(self, mode, timeout, fn):
+        if self.scheduler is None:
+            return fn(timeout)
+        with self.scheduler.slot(mode, timeout) as ticket:
+            return self._charge(ticket, fn(ticket.remaining(timeout)))
+
+    async def _scheduled_async(self, mode, timeout, fn):
+        if self.scheduler is None:
+            return await fn(timeout)
+        async with self.scheduler.slot_async(mode, timeout) as ticket:
+            return self._charge(ticket, await fn(ticket.remaining(timeout)))
+
+    @staticmethod
+    def _charge(ticket, result):
+        # Cache hits never reached the model, so they don't count against the token budget.
+        if not (result.get("cache") or {}).get("hit"):
+            ticket.tokens = result.get("usage", {}).get("total_tokens", 0)
+        result.setdefault("timings", {})["scheduler_wait_sec"] = round(ticket.waited, 4)
+        return result
+
+    @staticmethod
+    def escalation_reason(output):
+        parsed = output["parsed"]
+        if not isinstance(parsed, dict):
+            return "unparsed"
+        if output.get("validation_errors"):
+            return "invalid"
+        if parsed.get("confidence") == "low" or parsed.get("clarity") == "ambiguous":
+            return "low_confidence"
+        hazards = [h for h in parsed.get("hazards") or [] if isinstance(h, dict)]
+        for item in (parsed, *hazards):
+            for key, values in ESCALATION_VALUES.items():
+                if item.get(key) in values:
+                    return "high_severity"
+        return None
+
+    @staticmethod
+    def _tag_tier(output, policy, tier):
+        metrics.REASONING_TIERS.inc(tier=tier, mode=output["mode"])
+        output["reasoning_policy"] = policy
+        output["reasoning_tier"] = tier
+        return output
+
+    def analyze_long_video(self, video_path, mode="safety", window_sec=None, overlap_sec=None,
+                           frames_per_window=None, bypass_cache=False):
+        return run_coroutine(self.analyze_long_video_async(
+            video_path, mode=mode, window_sec=window_sec,
+            overlap_sec=overlap_sec, frames_per_window=frames_per_window, bypass_cache=bypass_cache,
+        ))
+
+    async def analyze_long_video_async(self, video_path, mode="safety", window_sec=None, overlap_sec=None,
+                                       frames_per_window=None, client=None, max_concurrency=None,
+                                       bypass_cache=False):
+        client = client or self.async_client
+        window_sec = window_sec or self.config.long_video_window_sec
+        overlap_sec = self.config.long_video_overlap_sec if overlap_sec is None else overlap_sec
+        frames_per_window = frames_per_window or self.config.long_video_frames_per_window
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.config.max_concurrency))
+        system_prompt, user_prompt = self._get_prompts(mode)
+        window_schema = with_events(MODE_SCHEMAS[mode])
+        window_max_tokens = MODE_MAX_TOKENS[mode] + TIMELINE_EXTRA_TOKENS
+
+        start = time.perf_counter()
+        windows, video_info = await asyncio.to_thread(
+            self.video_processor.extract_windows, video_path, window_sec, overlap_sec, frames_per_window,
+        )
+        extract_sec = time.perf_counter() - start
+        metrics.STAGE_SECONDS.observe(extract_sec, stage="extract", mode=mode, model=self.config.cosmos_model)
+        if not windows:
+            raise ValueError(f"No frames extracted from {video_path}")
+
+        async def run_window(window):
+            prompt = video_timeline.WINDOW_CONTEXT_PROMPT.format(
+                prompt=user_prompt, frame_count=len(window["frames"]),
+                start_sec=window["start_sec"], end_sec=window["end_sec"],
+                timestamps=", ".join(f"{t:.1f}" for t in window["timestamps_sec"]),
+            )
+            summary = {key: window[key] for key in ("index", "start_sec", "end_sec", "timestamps_sec")}
+            async with semaphore:
+                window_start = time.perf_counter()
+                try:
+                    result = await self._scheduled_async(mode, None, lambda timeout: client.reason_about_frames(
+                        frame_paths=window["frames"], prompt=prompt, system_prompt=system_prompt,
+                        enable_reasoning=True, bypass_cache=bypass_cache, timeout=timeout,
+                        response_schema=window_schema, max_tokens=window_max_tokens,
+                        timestamps=window["timestamps_sec"],
+                    ))
+                    summary.update(self._format_result(mode, result, schema=window_schema))
+                except Exception as e:
+                    summary["error"] = str(e)
+                summary["latency_sec"] = round(time.perf_counter() - window_start, 3)
+            return summary
+
+        window_results = await asyncio.gather(*(run_window(w) for w in windows))
+        usage = {}
+        for window in window_results:
+            for key, value in window.get("usage", {}).items():
+                usage[key] = usage.get(key, 0) + value
+        return {
+            "type": "long_video_analysis", "video": str(video_path), "mode": mode,
+            "video_info": video_info, "windows": window_results,
+            "timeline": self._merge_timeline(window_results, tolerance_sec=max(overlap_sec, 0.5)),
+            "usage": usage, "timings": {"extract_sec": round(extract_sec, 4)},
+            "elapsed_sec": round(time.perf_counter() - start, 3),
+        }
+
+    @staticmethod
+    def _merge_timeline(window_results, tolerance_sec=1.0):
+        events = []
+        for window in window_results:
+            parsed = window.get("parsed")
+            raw_events = parsed.get("events") if isinstance(parsed, dict) else None
+            for event in raw_events or []:
+                if not isinstance(event, dict):
+                    continue
+                try:
+                    t = float(event.get("t", window["start_sec"]))
+                except (TypeError, ValueError):
+                    t = window["start_sec"]
+                # Models sometimes count from the start of the clip instead of the recording.
+                if t < window["start_sec"] - tolerance_sec:
+                    t += window["start_sec"]
+                events.append({**event, "t": round(t, 3), "windows": [window["index"]]})
+
+        events.sort(key=lambda e: e["t"])
+        merged = []
+        for event in events:
+            duplicate = next(
+                (m for m in reversed(merged)
+                 if m.get("type") == event.get("type") and abs(m["t"] - event["t"]) <= tolerance_sec
+                 and event["windows"][0] not in m["windows"]),
+                None,
+            )
+            if duplicate is None:
+                merged.append(event)
+                continue
+            duplicate["windows"].append(event["windows"][0])
+            if SEVERITY_ORDER.get(event.get("severity"), -1) > SEVERITY_ORDER.get(duplicate.get("severity"), -1):
+                duplicate["severity"] = event.get("severity")
+                duplicate["description"] = event.get("description", duplicate.get("description"))
+        return merged
+
+    def full_analysis(self, image_path, fused=None, bypass_cache=False, timeout=None):
+        if fused is None:
+            fused = self.config.full_analysis_strategy == "fused"
+        if fused:
+            return self.fused_analysis(image_path, bypass_cache=bypass_cache, timeout=timeout)
+        return run_coroutine(self.full_analysis_async(image_path, timeout=timeout, bypass_cache=bypass_cache))
+
+    def fused_analysis(self, image_path, bypass_cache=False, timeout=None):
+        system_prompt, user_prompt = self._build_fused_prompts()
+        result = self._scheduled("full", timeout, lambda remaining: self.client.reason_about_image(
+            image_path=image_path, prompt=user_prompt,
+            system_prompt=system_prompt, enable_reasoning=True, bypass_cache=bypass_cache, timeout=remaining,
+            response_schema=fused_schema(FULL_ANALYSIS_MODES), max_tokens=MODE_MAX_TOKENS["full"],
+        ))
+        return self._split_fused_result(image_path, result)
+
+    async def full_analysis_async(self, image_path, client=None, max_concurrency=None, timeout=None, bypass_cache=False):
+        client = client or self.async_client
+        max_concurrency = max_concurrency or self.config.max_concurrency
+        timeout = timeout if timeout is not None else self.config.mode_timeout_sec
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_mode(mode):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        self.analyze_image_async(image_path, mode=mode, client=client, bypass_cache=bypass_cache),
+                        timeout=timeout or None,
+                    )
+                except asyncio.TimeoutError:
+                    return {"error": f"Mode '{mode}' timed out after {timeout}s"}
+                except Exception as e:
+                    return {"error": str(e)}
+
+        outputs = await asyncio.gather(*(run_mode(mode) for mode in FULL_ANALYSIS_MODES))
+        results = dict(zip(FULL_ANALYSIS_MODES, outputs))
+        return {"type": "full_analysis", "image": self._source_label(image_path), "results": results}
+
+    def stream_analysis(self, image_path, modes=FULL_ANALYSIS_MODES, reasoning_tokens=False, bypass_cache=False,
+                        timeout=None):
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout if timeout else None
+        events = queue.Queue()
+        abandoned = threading.Event()
+
+        def run_mode(mode):
             try:
-                results[mode] = self.analyze_image(image_path, mode=mode)
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if reasoning_tokens:
+                    with closing(self.stream_image(image_path, mode=mode, bypass_cache=bypass_cache, timeout=remaining)) as stream:
+                        for event in stream:
+                            if abandoned.is_set():
+                                # Nobody is reading any more; stop so the slot and lease go back now.
+                                break
+                            if event["type"] == "done":
+                                event = {"type": "result", "mode": mode, "result": event["result"]}
+                            events.put(event)
+                else:
+                    result = self.analyze_image(image_path, mode=mode, bypass_cache=bypass_cache, timeout=remaining)
+                    events.put({"type": "result", "mode": mode, "result": result})
             except Exception as e:
-                results[mode] = {"error": str(e)}
-        return {"type": "full_analysis", "image": image_path, "results": results}
+                events.put({"type": "error", "mode": mode, "error": str(e)})
+            finally:
+                events.put({"type": "finished", "mode": mode})
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(len(modes), self.config.max_concurrency)),
+                                  thread_name_prefix="egobot-stream")
+        for mode in modes:
+            pool.submit(run_mode, mode)
+        pending = set(modes)
+        try:
+            while pending:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                try:
+                    event = events.get(timeout=max(0.0, remaining) if remaining is not None else None)
+                except queue.Empty:
+                    for mode in sorted(pending):
+                        yield {"type": "error", "mode": mode, "error": f"Mode '{mode}' timed out after {timeout}s"}
+                    break
+                if event["type"] == "finished":
+                    pending.discard(event["mode"])
+                    continue
+                if event["type"] in ("result", "error"):
+                    # Lets a client tell how early each mode landed compared with the slowest.
+                    event["elapsed_sec"] = round(time.perf_counter() - started, 3)
+                yield event
+        finally:
+            abandoned.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        yield {"type": "done", "modes": list(modes), "elapsed_sec": round(time.perf_counter() - started, 3)}
+
+    @staticmethod
+    def _build_fused_prompts(modes=FULL_ANALYSIS_MODES):
+        sections = "\n\n".join(
+            fused_analysis.SECTION_TEMPLATE.format(name=mode, prompt=REASONING_MODES[mode][1])
+            for mode in modes
+        )
+        keys = ", ".join(f'"{mode}"' for mode in modes)
+        user_prompt = fused_analysis.FUSED_ANALYSIS_PROMPT.format(sections=sections, keys=keys)
+        return fused_analysis.SYSTEM_PROMPT, user_prompt
+
+    @classmethod
+    def _split_fused_result(cls, image_path, result, modes=FULL_ANALYSIS_MODES):
+        combined = cls._format_result("full", result, schema=fused_schema(modes))
+        parsed = combined["parsed"] if isinstance(combined["parsed"], dict) else {}
+        results = {}
+        for mode in modes:
+            section = parsed.get(mode)
+            if not isinstance(section, dict):
+                results[mode] = {"error": f"Fused response has no '{mode}' section"}
+                continue
+            results[mode] = cls._format_result(mode, {
+                "reasoning": combined["reasoning"],
+                "answer": json.dumps(section),
+                "usage": {},
+            })
+        return {
+            "type": "full_analysis", "image": cls._source_label(image_path), "fused": True,
+            "reasoning": combined["reasoning"], "answer": combined["answer"],
+            "usage": combined["usage"], "cache": combined.get("cache"), "transport": combined.get("transport"),
+            "model": combined.get("model"), "timings": combined.get("timings"),
+            "results": results,
+        }
+
+    @staticmethod
+    def _source_label(source):
+        return None if isinstance(source, (bytes, bytearray, memoryview)) else str(source)
 
     @staticmethod
     def _get_prompts(mode):
@@ -72,24 +563,31 @@ class ReasoningEngine:
         return REASONING_MODES[mode]
 
     @staticmethod
-    def _format_result(mode, result):
-        parsed = None
+    def _output_options(mode, fast=False):
+        max_tokens = fast_max_tokens(mode) if fast else MODE_MAX_TOKENS.get(mode)
+        return {"response_schema": MODE_SCHEMAS.get(mode), "max_tokens": max_tokens}
+
+    @staticmethod
+    def _format_result(mode, result, schema=None):
         answer = result.get("answer", "")
-        try:
-            clean = answer.strip()
-            if clean.startswith("```"):
-                clean = clean.split("\n", 1)[1] if "\n" in clean else clean[3:]
-                clean = clean.rsplit("```", 1)[0]
-            parsed = json.loads(clean)
-        except (json.JSONDecodeError, IndexError):
-            pass
-        return {
+        parsed = extract_json(answer)
+        output = {
             "mode": mode,
             "reasoning": result.get("reasoning", ""),
             "answer": answer,
             "parsed": parsed,
             "usage": result.get("usage", {}),
         }
+        schema = schema or MODE_SCHEMAS.get(mode)
+        if schema is not None:
+            output["validation_errors"] = validate(parsed, schema) if parsed is not None else ["no JSON object in answer"]
+        for key in RESULT_METADATA_KEYS:
+            if key in result:
+                output[key] = result[key]
+        # Only results straight from the client carry timings; fused sub-results are not separate calls.
+        if "timings" in result:
+            metrics.observe_result(mode, output)
+        return output
 
     @staticmethod
     def available_modes():
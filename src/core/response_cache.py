@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ("model", "messages", "max_tokens", "temperature", "top_p", "response_format", "extra_body")
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_response_cache(config):
+    tier = config.response_cache.lower()
+    if tier in ("", "0", "off", "false", "none"):
+        return None
+    path = config.response_cache_path if tier == "disk" else None
+    key = (tier, str(path))
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = ResponseCache(
+                path=path,
+                max_entries=config.response_cache_max_entries,
+                max_bytes=config.response_cache_max_mb * 1024 * 1024,
+                ttl_sec=config.response_cache_ttl_sec,
+            )
+        return _registry[key]
+
+
+class ResponseCache:
+    def __init__(self, path=None, max_entries=512, max_bytes=512 * 1024 * 1024, ttl_sec=86400):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(request_params):
+        material = {name: request_params[name] for name in KEY_FIELDS if name in request_params}
+        encoded = json.dumps(material, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+            if value is None and self._db is not None:
+                value = self._get_disk(key, now)
+                if value is not None:
+                    self._put_memory(key, value, now)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def put(self, key, result):
+        value = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + self.ttl_sec, now),
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _get_memory(self, key, now):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _put_memory(self, key, value, now):
+        self._memory[key] = (now + self.ttl_sec, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get_disk(self, key, now):
+        row = self._db.execute(
+            "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return value
+
+    def _evict_disk(self, now):
+        self._db.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+        logger.debug("Evicted response cache entries down to %d bytes", total)
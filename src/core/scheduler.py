@@ -0,0 +1,266 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from src.utils import metrics
+from src.utils.helpers import percentile
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ("critical", "interactive", "background")
+MODE_PRIORITY = {
+    "safety": "critical",
+    "thrown_object": "critical",
+    "trajectory": "critical",
+    "handover": "interactive",
+    "spatial": "interactive",
+    "gripper_trajectory": "interactive",
+    "social": "background",
+    "planning": "background",
+    "multi_step_plan": "background",
+    "full": "background",
+}
+
+WAIT_SAMPLES = 1024
+
+
+def priority_of(mode):
+    return MODE_PRIORITY.get(mode, "background")
+
+
+class SchedulerRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, mode, deadline):
+        self.mode = mode
+        self.priority = priority_of(mode)
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.waited = 0.0
+        self.tokens = 0
+        self.granted = False
+        self.waiter = None
+
+    def wake(self):
+        # Called with the scheduler lock held, possibly from another thread than the waiter's loop.
+        if self.waiter is None:
+            return
+        future, loop = self.waiter
+        try:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+        except RuntimeError:
+            pass  # the waiter's loop has already closed
+
+    def remaining(self, timeout):
+        return None if timeout is None else max(0.0, timeout - self.waited)
+
+
+class PriorityScheduler:
+    def __init__(self, slots, reserved_slots=1, max_wait_sec=30.0, requests_per_window=0, tokens_per_window=0,
+                 window_sec=60.0):
+        self.slots = max(1, slots)
+        # Slots only critical work may take, so a burst of social or planning calls can't starve safety.
+        self.reserved_slots = min(max(0, reserved_slots), self.slots - 1)
+        self.max_wait_sec = max_wait_sec
+        self.requests_per_window = requests_per_window
+        self.tokens_per_window = tokens_per_window
+        self.window_sec = window_sec
+        self.active = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._window = deque()
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in PRIORITY_CLASSES}
+        self._granted = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._dropped = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            slots=config.scheduler_slots, reserved_slots=config.scheduler_reserved_slots,
+            max_wait_sec=config.scheduler_max_wait_sec, requests_per_window=config.scheduler_requests_per_window,
+            tokens_per_window=config.scheduler_tokens_per_window, window_sec=config.scheduler_window_sec,
+        )
+
+    def acquire(self, mode, timeout=None):
+        now = time.monotonic()
+        ticket = Ticket(mode, self._deadline(mode, now, timeout))
+        with self._cond:
+            heapq.heappush(self._heap, (PRIORITY_CLASSES.index(ticket.priority), ticket.deadline, next(self._seq), ticket))
+            while True:
+                now = time.monotonic()
+                self._drop_expired(now)
+                if ticket.granted:
+                    break
+                if ticket.deadline <= now:
+                    raise SchedulerRejected(
+                        f"{ticket.priority} request for '{mode}' waited {now - ticket.enqueued_at:.2f}s without a slot",
+                        self._retry_after(now),
+                    )
+                self._dispatch(now)
+                if ticket.granted:
+                    break
+                self._cond.wait(min(ticket.deadline - now, self._budget_wait(now) or math.inf, 1.0))
+        return self._granted_ticket(ticket)
+
+    async def acquire_async(self, mode, timeout=None):
+        # Waits on the loop itself: parking in an executor thread would starve the slot holders that need one.
+        now = time.monotonic()
+        ticket = Ticket(mode, self._deadline(mode, now, timeout))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        ticket.waiter = (future, loop)
+        try:
+            with self._cond:
+                heapq.heappush(self._heap, (PRIORITY_CLASSES.index(ticket.priority), ticket.deadline, next(self._seq), ticket))
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._drop_expired(now)
+                    if not ticket.granted:
+                        if ticket.deadline <= now:
+                            raise SchedulerRejected(
+                                f"{ticket.priority} request for '{mode}' waited {now - ticket.enqueued_at:.2f}s without a slot",
+                                self._retry_after(now),
+                            )
+                        self._dispatch(now)
+                    if ticket.granted:
+                        break
+                    wait = min(ticket.deadline - now, self._budget_wait(now) or math.inf, 1.0)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                if ticket.granted:
+                    # Granted just as we gave up; hand the slot straight back.
+                    self._release_locked(ticket)
+                else:
+                    self._heap = [entry for entry in self._heap if entry[3] is not ticket]
+                    heapq.heapify(self._heap)
+            raise
+        return self._granted_ticket(ticket)
+
+    def release(self, ticket):
+        with self._cond:
+            self._release_locked(ticket)
+
+    def _release_locked(self, ticket):
+        self.active -= 1
+        if ticket.tokens and self._window:
+            self._record_tokens(ticket)
+        # Async waiters don't poll the condition, so the freed slot is handed out here.
+        self._dispatch(time.monotonic())
+        self._cond.notify_all()
+
+    def _granted_ticket(self, ticket):
+        ticket.waited = time.monotonic() - ticket.enqueued_at
+        metrics.SCHEDULER_WAIT_SECONDS.observe(ticket.waited, priority=ticket.priority)
+        return ticket
+
+    @contextmanager
+    def slot(self, mode, timeout=None):
+        ticket = self.acquire(mode, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def slot_async(self, mode, timeout=None):
+        ticket = await self.acquire_async(mode, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_CLASSES}
+            for _, _, _, ticket in self._heap:
+                queued[ticket.priority] += 1
+            classes = {}
+            for name in PRIORITY_CLASSES:
+                waits = list(self._waits[name])
+                classes[name] = {
+                    "queued": queued[name], "granted": self._granted[name], "dropped": self._dropped[name],
+                    "avg_wait_sec": round(sum(waits) / len(waits), 4) if waits else 0,
+                    "p95_wait_sec": round(percentile(waits, 95), 4),
+                    "max_wait_sec": round(max(waits), 4) if waits else 0,
+                }
+            return {
+                "slots": self.slots, "reserved_slots": self.reserved_slots, "active": self.active,
+                "window": self._window_usage(time.monotonic()), "classes": classes,
+            }
+
+    def _deadline(self, mode, now, timeout):
+        limits = [timeout]
+        if priority_of(mode) != "critical" and self.max_wait_sec:
+            limits.append(self.max_wait_sec)
+        limits = [limit for limit in limits if limit is not None]
+        return now + min(limits) if limits else math.inf
+
+    def _dispatch(self, now):
+        while self._heap and self._budget_wait(now) is None:
+            _, _, _, ticket = self._heap[0]
+            limit = self.slots if ticket.priority == "critical" else self.slots - self.reserved_slots
+            if self.active >= limit:
+                return
+            heapq.heappop(self._heap)
+            ticket.granted = True
+            ticket.wake()
+            self.active += 1
+            self._granted[ticket.priority] += 1
+            self._waits[ticket.priority].append(now - ticket.enqueued_at)
+            if self.requests_per_window or self.tokens_per_window:
+                self._window.append([now, 0, ticket])
+            self._cond.notify_all()
+
+    def _drop_expired(self, now):
+        # Stale work leaves the queue as soon as anyone looks, not when it reaches the head.
+        expired = [entry for entry in self._heap if entry[3].deadline <= now]
+        if not expired:
+            return
+        self._heap = [entry for entry in self._heap if entry[3].deadline > now]
+        heapq.heapify(self._heap)
+        for _, _, _, ticket in expired:
+            self._dropped[ticket.priority] += 1
+        self._cond.notify_all()
+
+    def _budget_wait(self, now):
+        while self._window and self._window[0][0] <= now - self.window_sec:
+            self._window.popleft()
+        if not self._window:
+            return None
+        over_requests = self.requests_per_window and len(self._window) >= self.requests_per_window
+        over_tokens = self.tokens_per_window and sum(e[1] for e in self._window) >= self.tokens_per_window
+        if not (over_requests or over_tokens):
+            return None
+        return max(0.01, self._window[0][0] + self.window_sec - now)
+
+    def _record_tokens(self, ticket):
+        for entry in self._window:
+            if entry[2] is ticket:
+                entry[1] = ticket.tokens
+                return
+
+    def _window_usage(self, now):
+        self._budget_wait(now)
+        return {
+            "requests": len(self._window), "tokens": sum(e[1] for e in self._window),
+            "requests_limit": self.requests_per_window, "tokens_limit": self.tokens_per_window,
+            "window_sec": self.window_sec,
+        }
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self._budget_wait(now) or 1))
@@ -0,0 +1,92 @@
+import copy
+import io
+import threading
+import time
+import numpy as np
+from PIL import Image
+from src.utils.image_preprocessing import read_image_bytes
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Set bits per byte value; a table lookup keeps the popcount vectorised on any NumPy version.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Keys that describe one call rather than the stored answer.
+CALL_KEYS = ("cache", "timings", "single_flight", "transport")
+
+
+def image_dhash(source):
+    img = Image.open(io.BytesIO(read_image_bytes(source)))
+    # JPEGs decode straight at 1/8 scale or smaller, which is most of the saving.
+    img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+    small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), "big")
+
+
+def hamming_distances(hashes, image_hash):
+    xor = hashes ^ np.uint64(image_hash)
+    return POPCOUNT[xor.view(np.uint8)].reshape(len(hashes), 8).sum(axis=1)
+
+
+class SimilarityCache:
+    def __init__(self, max_distance=4, max_entries=256, ttl_sec=10.0):
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._modes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_distance=config.similarity_cache_max_distance,
+            max_entries=config.similarity_cache_max_entries, ttl_sec=config.similarity_cache_ttl_sec,
+        )
+
+    def get(self, mode, image_hash):
+        with self._lock:
+            index = self._modes.get(mode)
+            if index is not None and index["size"]:
+                size = index["size"]
+                distances = hamming_distances(index["hashes"][:size], image_hash)
+                if self.ttl_sec:
+                    distances[index["stored_at"][:size] <= time.monotonic() - self.ttl_sec] = HASH_BITS + 1
+                slot = int(distances.argmin())
+                if distances[slot] <= self.max_distance:
+                    self.hits += 1
+                    return copy.deepcopy(index["results"][slot]), int(distances[slot])
+            self.misses += 1
+            return None, None
+
+    def put(self, mode, image_hash, result):
+        stored = copy.deepcopy({k: v for k, v in result.items() if k not in CALL_KEYS})
+        with self._lock:
+            index = self._modes.get(mode)
+            if index is None:
+                index = self._modes[mode] = {
+                    "hashes": np.zeros(self.max_entries, dtype=np.uint64),
+                    "stored_at": np.zeros(self.max_entries), "results": [None] * self.max_entries,
+                    "size": 0, "next": 0,
+                }
+            # Ring buffer: once full, the oldest entry for the mode makes room.
+            slot = index["next"]
+            if index["size"] == self.max_entries:
+                self.evictions += 1
+            index["hashes"][slot] = image_hash
+            index["stored_at"][slot] = time.monotonic()
+            index["results"][slot] = stored
+            index["next"] = (slot + 1) % self.max_entries
+            index["size"] = min(index["size"] + 1, self.max_entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": sum(index["size"] for index in self._modes.values()),
+                "max_distance": self.max_distance,
+            }
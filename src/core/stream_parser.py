@@ -0,0 +1,113 @@
+import json
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def find_json_object(text, start=0):
+    begin = text.find("{", start)
+    if begin < 0:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(begin, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return begin, i + 1
+    return None
+
+
+class StreamParser:
+    def __init__(self):
+        self.state = "start"
+        self.reasoning = ""
+        self.answer = ""
+        self.parsed = None
+        self._pending = ""
+        self._scan_from = 0
+
+    @property
+    def answer_ready(self):
+        return self.parsed is not None
+
+    def feed(self, delta):
+        events = []
+        self._pending += delta
+        while self._pending:
+            if self.state == "start":
+                stripped = self._pending.lstrip()
+                if stripped.startswith(THINK_OPEN):
+                    self._pending = stripped[len(THINK_OPEN):]
+                    self.state = "think"
+                elif stripped and not THINK_OPEN.startswith(stripped[:len(THINK_OPEN)]):
+                    self.state = "answer"
+                else:
+                    break
+            elif self.state == "think":
+                end = self._pending.find(THINK_CLOSE)
+                if end >= 0:
+                    text, self._pending = self._pending[:end], self._pending[end + len(THINK_CLOSE):]
+                    self.state = "answer"
+                else:
+                    # Hold back anything that could be the start of a split closing tag.
+                    keep = self._partial_tag_length(self._pending, THINK_CLOSE)
+                    text = self._pending[:len(self._pending) - keep]
+                    self._pending = self._pending[len(text):]
+                if text:
+                    self.reasoning += text
+                    events.append({"type": "reasoning", "delta": text})
+                if self.state == "think":
+                    break
+            else:
+                text, self._pending = self._pending, ""
+                self.answer += text
+                events.append({"type": "answer_delta", "delta": text})
+                events.extend(self._check_answer())
+        return events
+
+    def close(self):
+        events = []
+        if self._pending:
+            if self.state == "think":
+                self.reasoning += self._pending
+                events.append({"type": "reasoning", "delta": self._pending})
+            else:
+                self.answer += self._pending
+                events.append({"type": "answer_delta", "delta": self._pending})
+                events.extend(self._check_answer())
+            self._pending = ""
+        return events
+
+    def _check_answer(self):
+        if self.parsed is not None:
+            return []
+        span = find_json_object(self.answer, self._scan_from)
+        while span is not None:
+            try:
+                self.parsed = json.loads(self.answer[span[0]:span[1]])
+                return [{"type": "answer", "parsed": self.parsed}]
+            except json.JSONDecodeError:
+                self._scan_from = span[0] + 1
+                span = find_json_object(self.answer, self._scan_from)
+        return []
+
+    @staticmethod
+    def _partial_tag_length(text, tag):
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
@@ -0,0 +1,79 @@
+import json
+from src.core.stream_parser import find_json_object
+
+GUIDED_DECODING_MODES = ("off", "response_format", "guided_json", "nvext")
+
+JSON_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+def extract_json(text):
+    clean = (text or "").strip()
+    if clean.startswith("```"):
+        clean = clean.split("\n", 1)[1] if "\n" in clean else clean[3:]
+        clean = clean.rsplit("```", 1)[0]
+    try:
+        return json.loads(clean)
+    except json.JSONDecodeError:
+        pass
+    # Prose around the answer: take the first balanced object that parses.
+    span = find_json_object(clean)
+    while span is not None:
+        try:
+            return json.loads(clean[span[0]:span[1]])
+        except json.JSONDecodeError:
+            span = find_json_object(clean, span[0] + 1)
+    return None
+
+
+def validate(instance, schema, path="$"):
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(instance, name) for name in types):
+            return [f"{path}: expected {' or '.join(types)}, got {_type_name(instance)}"]
+    errors = []
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {instance!r} is not one of {schema['enum']}")
+    if isinstance(instance, dict):
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}: missing required key '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in instance:
+                errors.extend(validate(instance[key], subschema, f"{path}.{key}"))
+    if isinstance(instance, list):
+        if "minItems" in schema and len(instance) < schema["minItems"]:
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "maxItems" in schema and len(instance) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(instance):
+                errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def guided_decoding_params(strategy, schema, name="answer"):
+    if not schema or strategy == "off":
+        return {}
+    if strategy == "response_format":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}}
+    if strategy == "guided_json":
+        return {"extra_body": {"guided_json": schema}}
+    return {"extra_body": {"nvext": {"guided_json": schema}}}
+
+
+def _is_type(instance, name):
+    # bool is an int subclass in Python but not a JSON number.
+    if name in ("integer", "number") and isinstance(instance, bool):
+        return False
+    return isinstance(instance, JSON_TYPES[name])
+
+
+def _type_name(instance):
+    for name, py_type in JSON_TYPES.items():
+        if _is_type(instance, name):
+            return name
+    return type(instance).__name__
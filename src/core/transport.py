@@ -0,0 +1,251 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+import weakref
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Circuit open for {endpoint}; failing fast for {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_sec=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self, endpoint):
+        if not self.failure_threshold:
+            return False
+        with self._lock:
+            if self.state == "closed":
+                return False
+            remaining = self._opened_at + self.reset_sec - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            # Half-open lets exactly one probe through; everyone else keeps failing fast.
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            raise CircuitOpenError(endpoint, max(remaining, 0.0))
+
+    def release_probe(self, probe):
+        # A probe that never reached the endpoint (deadline, cancellation) proves nothing; let the next call try.
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    logger.warning("Circuit breaker opened after %d failures", self.failures)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "trips": self.trips, "failures": self.failures}
+
+
+class Transport:
+    def __init__(self, config, base_url=None):
+        self.base_url = base_url or config.cosmos_base_url
+        self.max_retries = config.cosmos_max_retries
+        self.backoff_base_sec = config.cosmos_backoff_base_sec
+        self.backoff_max_sec = config.cosmos_backoff_max_sec
+        self.breaker = CircuitBreaker(config.breaker_failure_threshold, config.breaker_reset_sec)
+        self.retries = 0
+        self._api_key = config.nvidia_api_key
+        self._timeout = openai.Timeout(config.cosmos_read_timeout_sec, connect=config.cosmos_connect_timeout_sec)
+        self._limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=config.cosmos_max_connections,
+            max_keepalive_connections=config.cosmos_max_keepalive,
+            keepalive_expiry=30.0,
+        )
+        # The SDK's own retries are off; call() below owns backoff and breaker accounting.
+        self.client = OpenAI(
+            base_url=self.base_url, api_key=self._api_key, timeout=self._timeout, max_retries=0,
+            http_client=openai.DefaultHttpxClient(limits=self._limits, timeout=self._timeout),
+        )
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def async_client(self):
+        # httpx async pools are bound to the event loop that opened them.
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = AsyncOpenAI(
+                    base_url=self.base_url, api_key=self._api_key, timeout=self._timeout, max_retries=0,
+                    http_client=openai.DefaultAsyncHttpxClient(limits=self._limits, timeout=self._timeout),
+                )
+            return client
+
+    def call(self, fn, timeout=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self.breaker.before_call(self.base_url)
+            options = None
+            try:
+                options = self._attempt_options(deadline)
+                response = fn(**options)
+            except Exception as e:
+                if options is None:
+                    self.breaker.release_probe(probe)
+                    raise
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe(probe)
+                raise
+            self.breaker.record_success()
+            return response, self._metadata(attempt)
+
+    async def call_async(self, fn, timeout=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self.breaker.before_call(self.base_url)
+            options = None
+            try:
+                options = self._attempt_options(deadline)
+                response = await fn(**options)
+            except Exception as e:
+                if options is None:
+                    self.breaker.release_probe(probe)
+                    raise
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe(probe)
+                raise
+            self.breaker.record_success()
+            return response, self._metadata(attempt)
+
+    def stats(self):
+        return {"endpoint": self.base_url, "retries": self.retries, "breaker": self.breaker.snapshot()}
+
+    @staticmethod
+    def _attempt_options(deadline):
+        if deadline is None:
+            return {}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Request deadline exceeded before the upstream call")
+        return {"timeout": remaining}
+
+    def _retry_delay(self, error, attempt, deadline):
+        status = getattr(error, "status_code", None)
+        retryable = status in RETRYABLE_STATUS or isinstance(error, openai.APIConnectionError)
+        # A 429 or a 4xx still proves the endpoint is up; only real failures count toward the breaker.
+        if retryable and status != 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if not retryable or attempt > self.max_retries:
+            return None
+        delay = self._backoff(attempt, error)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        logger.warning("Upstream %s failed (%s); retry %d in %.2fs", self.base_url, status or type(error).__name__, attempt, delay)
+        return delay
+
+    def _backoff(self, attempt, error):
+        retry_after = parse_retry_after(getattr(getattr(error, "response", None), "headers", None))
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_sec)
+        # Full jitter keeps a fleet of retrying clients from synchronising.
+        return random.uniform(0, min(self.backoff_max_sec, self.backoff_base_sec * 2 ** (attempt - 1)))
+
+    def _metadata(self, attempt):
+        return {
+            "endpoint": self.base_url, "attempts": attempt, "retries": attempt - 1,
+            "breaker": self.breaker.state, "breaker_trips": self.breaker.trips,
+        }
+
+
+def parse_retry_after(headers):
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_transport(config, base_url):
+    key = (base_url, config.nvidia_api_key)
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = Transport(config, base_url)
+        return _registry[key]
+
+
+def run_coroutine(coro):
+    # Blocking entry points share one long-lived loop, so pooled async
+    # connections survive between calls instead of dying with asyncio.run().
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="egobot-transport", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
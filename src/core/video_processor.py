@@ -1,51 +1,343 @@
-
 import logging
 import tempfile
 from pathlib import Path
 import cv2
+import numpy as np
 from src.utils.helpers import Config
 
 logger = logging.getLogger(__name__)
 
+ENCODE_FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", None),
+}
+
+SAMPLING_STRATEGIES = ("uniform", "keyframe")
+THUMBNAIL_SIZE = 32
+HISTOGRAM_BINS = 32
+HASH_SIZE = 8
+MOTION_WIDTH = 64
+# Region growth between consecutive moving frames that reads as "coming towards the camera".
+APPROACH_GROWTH = 1.2
+
+
+class MotionGate:
+    def __init__(self, threshold=0.02, pixel_delta=25):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self._prev = None
+        self._prev_area = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(threshold=config.motion_threshold, pixel_delta=config.motion_pixel_delta)
+
+    def update(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height = max(1, round(gray.shape[0] * MOTION_WIDTH / gray.shape[1]))
+        small = cv2.GaussianBlur(cv2.resize(gray, (MOTION_WIDTH, height), interpolation=cv2.INTER_AREA), (5, 5), 0)
+        prev, self._prev = self._prev, small
+        if prev is None:
+            return {"score": 0.0, "region": None, "approaching": False}
+        mask = cv2.absdiff(small, prev) > self.pixel_delta
+        score = float(mask.mean())
+        if score < self.threshold:
+            self._prev_area = 0.0
+            return {"score": round(score, 4), "region": None, "approaching": False}
+        ys, xs = np.nonzero(mask)
+        # Normalised [x0, y0, x1, y1] of everything that changed.
+        region = [round(xs.min() / MOTION_WIDTH, 3), round(ys.min() / height, 3),
+                  round((xs.max() + 1) / MOTION_WIDTH, 3), round((ys.max() + 1) / height, 3)]
+        area = (region[2] - region[0]) * (region[3] - region[1])
+        approaching = bool(self._prev_area) and area >= self._prev_area * APPROACH_GROWTH
+        self._prev_area = area
+        return {"score": round(score, 4), "region": region, "approaching": approaching}
+
 
 class VideoProcessor:
     def __init__(self, config=None):
         self.config = config or Config()
 
     def extract_frames(self, video_path, output_dir=None, max_frames=16):
-        cap = cv2.VideoCapture(str(video_path))
-        if not cap.isOpened():
-            raise FileNotFoundError(f"Cannot open video: {video_path}")
-
-        native_fps = cap.get(cv2.CAP_PROP_FPS)
-        target_fps = min(self.config.video_fps, native_fps)
-        frame_interval = max(1, int(native_fps / target_fps))
-
+        frames, timestamps, _ = self.extract_frame_buffers(video_path, max_frames=max_frames)
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="egobot_frames_")
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+        ext = self._encode_params()[0]
         extracted = []
+        for i, data in enumerate(frames):
+            out_path = Path(output_dir) / f"frame_{i:06d}{ext}"
+            out_path.write_bytes(data)
+            extracted.append(str(out_path))
+        return extracted
+
+    def extract_frame_buffers(self, video_path, max_frames=16, sampling="uniform"):
+        if sampling not in SAMPLING_STRATEGIES:
+            raise ValueError(f"Unknown sampling '{sampling}'. Available: {', '.join(SAMPLING_STRATEGIES)}")
+        cap = self._open(video_path)
+        try:
+            info = self._read_info(cap)
+            native_fps = info["fps"] or self.config.video_fps
+            if sampling == "keyframe":
+                indices = self._score_keyframes(cap, native_fps, max_frames)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                encoded = self._read_frames(cap, indices)
+                frames = [encoded[idx] for idx in indices if idx in encoded]
+                timestamps = [round(idx / native_fps, 3) for idx in indices if idx in encoded]
+            else:
+                frames, timestamps = self._sample_uniform(cap, native_fps, max_frames)
+        finally:
+            cap.release()
+        logger.info("Extracted %d frames from %s (%s sampling)", len(frames), video_path, sampling)
+        return frames, timestamps, info
+
+    def _sample_uniform(self, cap, native_fps, max_frames):
+        target_fps = min(self.config.video_fps, native_fps)
+        frame_interval = max(1, int(native_fps / target_fps))
+        frames, timestamps = [], []
         frame_idx = 0
-        while cap.isOpened() and len(extracted) < max_frames:
+        while len(frames) < max_frames:
+            if frame_idx % frame_interval == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(self.encode_frame(frame))
+                timestamps.append(round(frame_idx / native_fps, 3))
+            # grab() advances the stream without the colour conversion and
+            # copy that retrieve() does for frames we are going to skip.
+            elif not cap.grab():
+                break
+            frame_idx += 1
+        return frames, timestamps
+
+    def _read_frames(self, cap, indices):
+        encoded = {}
+        frame_idx = 0
+        for target in sorted(set(indices)):
+            while frame_idx < target:
+                if not cap.grab():
+                    return encoded
+                frame_idx += 1
             ret, frame = cap.read()
             if not ret:
                 break
-            if frame_idx % frame_interval == 0:
-                out_path = str(Path(output_dir) / f"frame_{frame_idx:06d}.jpg")
-                cv2.imwrite(out_path, frame)
-                extracted.append(out_path)
+            encoded[target] = self.encode_frame(frame)
             frame_idx += 1
+        return encoded
 
-        cap.release()
-        logger.info("Extracted %d frames from %s", len(extracted), video_path)
-        return extracted
+    def _score_keyframes(self, cap, native_fps, max_frames):
+        candidate_fps = min(self.config.keyframe_candidate_fps, native_fps)
+        stride = max(1, int(native_fps / candidate_fps))
+        thumbs, indices = [], []
+        frame_idx = 0
+        while True:
+            if frame_idx % stride == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                thumbs.append(self.thumbnail(frame))
+                indices.append(frame_idx)
+            elif not cap.grab():
+                break
+            frame_idx += 1
+        if not thumbs:
+            return []
+        chosen = self.select_keyframes(np.stack(thumbs), max_frames, self.config.keyframe_dedup_threshold)
+        return [indices[i] for i in chosen]
+
+    def detect_motion(self, video_path, context_frames=None, max_events=None):
+        context_frames = max(1, context_frames or self.config.motion_context_frames)
+        max_events = max_events or self.config.motion_max_events
+        gate = MotionGate.from_config(self.config)
+        cap = self._open(video_path)
+        try:
+            info = self._read_info(cap)
+            native_fps = info["fps"] or self.config.video_fps
+            stride = max(1, int(native_fps / min(self.config.motion_sample_fps, native_fps)))
+            samples = []
+            frame_idx = 0
+            while True:
+                if frame_idx % stride == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    samples.append((frame_idx, gate.update(frame)))
+                elif not cap.grab():
+                    break
+                frame_idx += 1
+            events = self._motion_events(samples, gate.threshold, context_frames, max_events)
+            if events:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                encoded = self._read_frames(cap, {idx for event in events for idx in event["frame_indices"]})
+        finally:
+            cap.release()
+
+        for event in events:
+            indices = [idx for idx in event.pop("frame_indices") if idx in encoded]
+            event["frames"] = [encoded[idx] for idx in indices]
+            event["timestamps_sec"] = [round(idx / native_fps, 3) for idx in indices]
+            for name in ("start", "end", "peak"):
+                event[f"{name}_sec"] = round(event.pop(f"{name}_index") / native_fps, 3)
+        logger.info("Found %d motion events in %d sampled frames of %s", len(events), len(samples), video_path)
+        return events, info
+
+    @staticmethod
+    def _motion_events(samples, threshold, context_frames, max_events):
+        runs, current = [], []
+        for position, (_, motion) in enumerate(samples):
+            if motion["score"] >= threshold:
+                current.append(position)
+            elif current:
+                runs.append(current)
+                current = []
+        if current:
+            runs.append(current)
+
+        events = []
+        for run in runs:
+            peak = max(run, key=lambda position: samples[position][1]["score"])
+            # Frames straddling the peak, so the model sees the object both approach and pass.
+            first = min(max(0, peak - context_frames // 2), max(0, len(samples) - context_frames))
+            context = [samples[p][0] for p in range(first, min(len(samples), first + context_frames))]
+            motion = samples[peak][1]
+            events.append({
+                "start_index": samples[run[0]][0], "end_index": samples[run[-1]][0], "peak_index": samples[peak][0],
+                "score": motion["score"], "region": motion["region"],
+                "approaching": any(samples[p][1]["approaching"] for p in run),
+                "frame_indices": context,
+            })
+        events = sorted(events, key=lambda e: e["score"], reverse=True)[:max_events]
+        return sorted(events, key=lambda e: e["peak_index"])
+
+    @staticmethod
+    def thumbnail(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def dhash(frame):
+        # Difference hash: 64 bits of "is this pixel brighter than its left neighbour" on a 9x8 thumbnail.
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
 
     @staticmethod
-    def get_video_info(video_path):
+    def hash_distance(a, b):
+        return (a ^ b).bit_count()
+
+    @staticmethod
+    def select_keyframes(thumbs, max_frames, dedup_threshold=0.0):
+        n = len(thumbs)
+        pixels = thumbs.reshape(n, -1).astype(np.float32) / 255.0
+        bins = (thumbs.reshape(n, -1).astype(np.int64) * HISTOGRAM_BINS) // 256
+        offsets = np.arange(n)[:, None] * HISTOGRAM_BINS
+        hists = np.bincount((bins + offsets).ravel(), minlength=n * HISTOGRAM_BINS)
+        hists = hists.reshape(n, HISTOGRAM_BINS) / pixels.shape[1]
+
+        scores = np.empty(n, dtype=np.float32)
+        scores[0] = np.inf
+        pixel_change = np.abs(np.diff(pixels, axis=0)).mean(axis=1)
+        hist_change = np.abs(np.diff(hists, axis=0)).sum(axis=1) / 2
+        scores[1:] = 0.5 * pixel_change + 0.5 * hist_change
+
+        selected = []
+        for i in np.argsort(-scores, kind="stable"):
+            if len(selected) >= max_frames:
+                break
+            if dedup_threshold > 0 and selected:
+                distance = np.abs(pixels[selected] - pixels[i]).mean(axis=1)
+                if distance.min() < dedup_threshold:
+                    continue
+            selected.append(int(i))
+        return sorted(selected)
+
+    def extract_windows(self, video_path, window_sec, overlap_sec=0.0, frames_per_window=8):
+        if overlap_sec >= window_sec:
+            raise ValueError("overlap_sec must be smaller than window_sec")
+        cap = self._open(video_path)
+        try:
+            info = self._read_info(cap)
+            fps = info["fps"] or self.config.video_fps
+            windows = self._plan_windows(info["frame_count"], fps, window_sec, overlap_sec, frames_per_window)
+            wanted = {idx for window in windows for idx in window["frame_indices"]}
+
+            # One sequential pass; overlapping windows share the encoded buffers.
+            encoded = self._read_frames(cap, wanted)
+        finally:
+            cap.release()
+
+        for window in windows:
+            indices = [idx for idx in window.pop("frame_indices") if idx in encoded]
+            window["frames"] = [encoded[idx] for idx in indices]
+            window["timestamps_sec"] = [round(idx / fps, 3) for idx in indices]
+        windows = [w for w in windows if w["frames"]]
+        logger.info("Extracted %d windows (%d frames) from %s", len(windows), len(encoded), video_path)
+        return windows, info
+
+    @staticmethod
+    def _plan_windows(frame_count, fps, window_sec, overlap_sec, frames_per_window):
+        duration = frame_count / fps if fps > 0 else 0
+        step = window_sec - overlap_sec
+        windows = []
+        start = 0.0
+        while start < duration or not windows:
+            end = min(start + window_sec, duration)
+            first = int(start * fps)
+            last = max(first, int(end * fps) - 1)
+            count = min(frames_per_window, last - first + 1)
+            if count <= 1:
+                indices = [first]
+            else:
+                indices = sorted({first + round(i * (last - first) / (count - 1)) for i in range(count)})
+            windows.append({
+                "index": len(windows), "start_sec": round(start, 3), "end_sec": round(end, 3),
+                "frame_indices": indices,
+            })
+            if end >= duration:
+                break
+            start += step
+        return windows
+
+    def encode_frame(self, frame):
+        max_side = self.config.image_max_side
+        height, width = frame.shape[:2]
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        if self.config.image_color.lower() == "grayscale" and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        ext, quality_flag = self._encode_params()
+        params = [quality_flag, self.config.image_quality] if quality_flag is not None else []
+        ok, buf = cv2.imencode(ext, frame, params)
+        if not ok:
+            raise ValueError("Failed to encode video frame")
+        return buf.tobytes()
+
+    def _encode_params(self):
+        # Decoded frames have no source encoding, so "original" falls back to JPEG.
+        return ENCODE_FORMATS.get(self.config.image_format, ENCODE_FORMATS["jpeg"])
+
+    @staticmethod
+    def _open(video_path):
         cap = cv2.VideoCapture(str(video_path))
         if not cap.isOpened():
             raise FileNotFoundError(f"Cannot open video: {video_path}")
+        return cap
+
+    @staticmethod
+    def open_stream(source):
+        # "0", "1", ... name a local camera; anything else is a file, URL or RTSP feed.
+        target = int(source) if isinstance(source, int) or str(source).isdigit() else str(source)
+        cap = cv2.VideoCapture(target)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video source: {source}")
+        return cap
+
+    @staticmethod
+    def _read_info(cap):
         info = {
             "fps": cap.get(cv2.CAP_PROP_FPS),
             "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
@@ -53,5 +345,12 @@ class VideoProcessor:
             "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
         }
         info["duration_sec"] = info["frame_count"] / info["fps"] if info["fps"] > 0 else 0
-        cap.release()
         return info
+
+    @classmethod
+    def get_video_info(cls, video_path):
+        cap = cls._open(video_path)
+        try:
+            return cls._read_info(cap)
+        finally:
+            cap.release()
@@ -1,13 +1,32 @@
-
+import dataclasses
 import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from src.core.reasoning_engine import ReasoningEngine
-from src.utils.helpers import Config
+from src.utils.helpers import Config, RateLimiter, percentile
 
 logger = logging.getLogger(__name__)
 
+RESULTS_JSONL = "benchmark_results.jsonl"
+RESULTS_JSON = "benchmark_results.json"
+
+PACKING_REPORT_KEYS = (
+    "total", "accuracy", "errors", "avg_latency_sec", "p95_latency_sec", "avg_prompt_tokens", "avg_images_sent",
+)
+
+
+def compare_frame_packing(test_cases, grids=("off", "2x2"), config=None, output_dir="results", **run_options):
+    config = config or Config()
+    report = {}
+    for grid in grids:
+        runner = BenchmarkRunner(dataclasses.replace(config, frame_packing=grid))
+        summary = runner.run(test_cases, output_dir=str(Path(output_dir) / f"packing_{grid}"), **run_options)
+        report[grid] = {key: summary[key] for key in PACKING_REPORT_KEYS}
+    return report
+
 
 class BenchmarkRunner:
     def __init__(self, config=None):
@@ -21,33 +40,87 @@ class BenchmarkRunner:
         with open(path) as f:
             return json.load(f)
 
-    def run(self, test_cases, output_dir="results"):
+    def run(self, test_cases, output_dir="results", bypass_cache=False, concurrency=None, rps=None, resume=False):
         Path(output_dir).mkdir(parents=True, exist_ok=True)
-        results = []
-        for i, case in enumerate(test_cases):
-            test_id = case.get("test_id", f"test_{i}")
-            mode = case.get("mode", "social")
-            image = case.get("image", "")
-            expected = case.get("expected", {})
-            try:
-                start = time.time()
-                result = self.engine.analyze_image(image, mode=mode)
-                elapsed = time.time() - start
-                matches = self._compare(result.get("parsed"), expected)
-                results.append({
-                    "test_id": test_id, "mode": mode,
-                    "status": "pass" if matches["all_match"] else "fail",
-                    "matches": matches, "elapsed_sec": round(elapsed, 2),
-                    "parsed": result.get("parsed"), "expected": expected,
-                })
-            except Exception as e:
-                results.append({"test_id": test_id, "mode": mode, "status": "error", "error": str(e)})
-
-        summary = self._summarize(results)
-        with open(Path(output_dir) / "benchmark_results.json", "w") as f:
+        jsonl_path = Path(output_dir) / RESULTS_JSONL
+        cases = [(case.get("test_id", f"test_{i}"), case) for i, case in enumerate(test_cases)]
+
+        done = self._load_completed(jsonl_path) if resume else {}
+        if not resume:
+            jsonl_path.write_text("")
+        pending = [(test_id, case) for test_id, case in cases if test_id not in done]
+        if done:
+            logger.info("Resuming: %d cases already completed, %d to run", len(done), len(pending))
+
+        limiter = RateLimiter(rps if rps is not None else self.config.benchmark_rps)
+        write_lock = threading.Lock()
+
+        def run_case(item):
+            test_id, case = item
+            limiter.wait()
+            record = self._run_case(test_id, case, bypass_cache)
+            with write_lock, open(jsonl_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            return record
+
+        start = time.perf_counter()
+        workers = max(1, concurrency or self.config.benchmark_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for record in pool.map(run_case, pending):
+                done[record["test_id"]] = record
+        wall_time = time.perf_counter() - start
+
+        results = [done[test_id] for test_id, _ in cases if test_id in done]
+        summary = self._summarize(results, wall_time_sec=wall_time if pending else None, executed=len(pending))
+        with open(Path(output_dir) / RESULTS_JSON, "w") as f:
             json.dump({"summary": summary, "results": results}, f, indent=2)
         return summary
 
+    def _run_case(self, test_id, case, bypass_cache):
+        mode = case.get("mode", "social")
+        image = case.get("image", "")
+        expected = case.get("expected", {})
+        try:
+            start = time.perf_counter()
+            if case.get("video"):
+                result = self.engine.analyze_video(
+                    case["video"], mode=mode, max_frames=case.get("max_frames", 16), bypass_cache=bypass_cache,
+                )
+            else:
+                result = self.engine.analyze_image(image, mode=mode, bypass_cache=bypass_cache)
+            elapsed = time.perf_counter() - start
+            matches = self._compare(result.get("parsed"), expected)
+            usage = result.get("usage", {})
+            return {
+                "test_id": test_id, "mode": mode,
+                "status": "pass" if matches["all_match"] else "fail",
+                "matches": matches, "elapsed_sec": round(elapsed, 3),
+                "parsed": result.get("parsed"), "expected": expected,
+                "cache_hit": bool((result.get("cache") or {}).get("hit")),
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+                "images_sent": usage.get("images", 0),
+            }
+        except Exception as e:
+            return {"test_id": test_id, "mode": mode, "status": "error", "error": str(e)}
+
+    @staticmethod
+    def _load_completed(jsonl_path):
+        done = {}
+        if not jsonl_path.exists():
+            return done
+        with open(jsonl_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from an interrupted run
+                # Errored cases are retried on resume.
+                if record.get("status") in ("pass", "fail"):
+                    done[record["test_id"]] = record
+        return done
+
     @staticmethod
     def _compare(parsed, expected):
         if not parsed or not expected:
@@ -67,16 +140,39 @@ class BenchmarkRunner:
                 all_match = False
         return {"all_match": all_match, "details": details}
 
+    @classmethod
+    def _summarize(cls, results, wall_time_sec=None, executed=None):
+        summary = cls._summarize_group(results)
+        if wall_time_sec:
+            # Cases carried over by --resume did not run inside this wall time.
+            executed = len(results) if executed is None else executed
+            summary["wall_time_sec"] = round(wall_time_sec, 2)
+            summary["cases_executed"] = executed
+            summary["throughput_cases_per_sec"] = round(executed / wall_time_sec, 3)
+        modes = sorted({r.get("mode") for r in results if r.get("mode")})
+        summary["per_mode"] = {
+            mode: cls._summarize_group([r for r in results if r.get("mode") == mode]) for mode in modes
+        }
+        return summary
+
     @staticmethod
-    def _summarize(results):
+    def _summarize_group(results):
         total = len(results)
         passed = sum(1 for r in results if r.get("status") == "pass")
         failed = sum(1 for r in results if r.get("status") == "fail")
         errors = sum(1 for r in results if r.get("status") == "error")
         elapsed_list = [r["elapsed_sec"] for r in results if "elapsed_sec" in r]
         avg_time = sum(elapsed_list) / len(elapsed_list) if elapsed_list else 0
+        completion_tokens = sum(r.get("completion_tokens", 0) for r in results)
+        answered = [r for r in results if r.get("status") in ("pass", "fail")]
         return {
             "total": total, "passed": passed, "failed": failed, "errors": errors,
             "accuracy": round(passed / total, 4) if total > 0 else 0,
             "avg_latency_sec": round(avg_time, 2),
+            "p50_latency_sec": round(percentile(elapsed_list, 50), 3),
+            "p95_latency_sec": round(percentile(elapsed_list, 95), 3),
+            "p99_latency_sec": round(percentile(elapsed_list, 99), 3),
+            "tokens_per_sec": round(completion_tokens / sum(elapsed_list), 2) if elapsed_list and sum(elapsed_list) else 0,
+            "avg_prompt_tokens": round(sum(r.get("prompt_tokens", 0) for r in answered) / len(answered), 1) if answered else 0,
+            "avg_images_sent": round(sum(r.get("images_sent", 0) for r in answered) / len(answered), 2) if answered else 0,
         }
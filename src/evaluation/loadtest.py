@@ -0,0 +1,113 @@
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from src.utils.helpers import RateLimiter, percentile
+
+logger = logging.getLogger(__name__)
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class LoadTester:
+    def __init__(self, request_fn, concurrency=4, rate=None, total_requests=None, duration_sec=None):
+        if not total_requests and not duration_sec:
+            raise ValueError("Set total_requests or duration_sec")
+        self.request_fn = request_fn
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(rate)
+        self.total_requests = total_requests
+        self.duration_sec = duration_sec
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def run(self):
+        latencies, errors = [], Counter()
+        record_lock = threading.Lock()
+        deadline = time.monotonic() + self.duration_sec if self.duration_sec else None
+
+        def worker():
+            while self._claim(deadline):
+                self.limiter.wait()
+                start = time.perf_counter()
+                try:
+                    self.request_fn()
+                    ok, kind = True, None
+                except RequestFailed as e:
+                    ok, kind = False, str(e)
+                except Exception as e:
+                    ok, kind = False, type(e).__name__
+                elapsed = time.perf_counter() - start
+                with record_lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors[kind] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in range(self.concurrency):
+                pool.submit(worker)
+        return self.summarize(latencies, errors, time.perf_counter() - start, self.concurrency)
+
+    def _claim(self, deadline):
+        with self._lock:
+            if self.total_requests and self._issued >= self.total_requests:
+                return False
+            if deadline and time.monotonic() >= deadline:
+                return False
+            self._issued += 1
+            return True
+
+    @staticmethod
+    def summarize(latencies, errors, wall_time_sec, concurrency):
+        total = len(latencies) + sum(errors.values())
+        return {
+            "requests": total, "ok": len(latencies), "errors": sum(errors.values()),
+            "errors_by_type": dict(errors), "concurrency": concurrency,
+            "wall_time_sec": round(wall_time_sec, 3),
+            "throughput_rps": round(total / wall_time_sec, 3) if wall_time_sec else 0,
+            "mean_latency_sec": round(sum(latencies) / len(latencies), 4) if latencies else 0,
+            "p50_latency_sec": round(percentile(latencies, 50), 4),
+            "p95_latency_sec": round(percentile(latencies, 95), 4),
+            "p99_latency_sec": round(percentile(latencies, 99), 4),
+            "max_latency_sec": round(max(latencies), 4) if latencies else 0,
+        }
+
+
+def engine_request_fn(engine, image_path, mode):
+    def call():
+        result = engine.analyze_image(image_path, mode=mode, bypass_cache=True)
+        if result.get("error"):
+            raise RequestFailed("analysis error")
+    return call
+
+
+def http_request_fn(url, image_path, mode, timeout=120):
+    image = Path(image_path).read_bytes()
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"mode\"\r\n\r\n{mode}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{Path(image_path).name}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8") + image + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+    def call():
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                payload = json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            raise RequestFailed(f"HTTP {e.code}") from e
+        if payload.get("error"):
+            raise RequestFailed("analysis error")
+    return call
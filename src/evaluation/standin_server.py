@@ -0,0 +1,226 @@
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.reasoning_engine import REASONING_MODES, FULL_ANALYSIS_MODES
+from src.prompts import fused_analysis
+
+logger = logging.getLogger(__name__)
+
+CANNED_ANSWERS = {
+    "social": {
+        "people_count": 1, "engaged_with_robot": True, "gestures": ["handing object"],
+        "intent": "handover", "intent_description": "Person is holding out a cup toward the robot.",
+        "confidence": "high",
+    },
+    "handover": {"handover_detected": True, "object": "cup", "distance": "near", "clarity": "clear"},
+    "spatial": {
+        "obstacles": [{"name": "chair", "position": "left", "distance": "near"}],
+        "free_paths": ["center"], "key_objects": [{"name": "table", "position": "right"}],
+        "people": [{"position": "center", "activity": "standing"}],
+    },
+    "trajectory": {
+        "object": "ball", "direction": "toward", "approaching": True,
+        "estimated_landing": "in front of the robot", "collision_risk": "medium",
+    },
+    "safety": {
+        "hazards": [{"type": "obstacle", "severity": "high", "location": "center"}],
+        "collision_risk": "high", "human_safety_concern": False, "environmental_hazards": [],
+        "recommended_action": "stop", "explanation": "Box directly in the path.",
+    },
+    "thrown_object": {
+        "object": "ball", "moving_toward_robot": True, "hit_risk": "medium",
+        "evasive_action_needed": True, "recommended_action": "move_left",
+    },
+    "planning": {
+        "scene_summary": "Person offering a cup.", "human_interaction_needed": True, "safety_ok": True,
+        "next_action": "accept_object", "action_description": "Extend gripper toward the cup.",
+        "priority": "medium",
+    },
+}
+CANNED_REASONING = "The robot sees the scene, weighs what matters for this task and answers in JSON."
+
+
+@dataclass
+class StandinSettings:
+    latency_dist: str = "lognormal"
+    latency_ms: float = 400.0
+    latency_jitter: float = 0.3
+    error_rate: float = 0.0
+    error_status: int = 503
+    prompt_tokens_per_image: int = 1200
+    completion_tokens: int = 180
+    seed: int = None
+    stats: dict = field(default_factory=lambda: {"requests": 0, "errors": 0, "streams": 0})
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        with self._lock:
+            if self.latency_dist == "fixed":
+                ms = self.latency_ms
+            elif self.latency_dist == "uniform":
+                spread = self.latency_ms * self.latency_jitter
+                ms = self._rng.uniform(self.latency_ms - spread, self.latency_ms + spread)
+            else:
+                ms = self.latency_ms * self._rng.lognormvariate(0, self.latency_jitter)
+        return max(0.0, ms) / 1000.0
+
+    def should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def detect_mode(messages):
+    system_prompt, text, images = "", "", 0
+    for message in messages:
+        content = message.get("content")
+        if message.get("role") == "system":
+            system_prompt = content if isinstance(content, str) else ""
+            continue
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                images += 1
+            elif part.get("type") == "text":
+                text += part.get("text", "")
+    if system_prompt == fused_analysis.SYSTEM_PROMPT:
+        return "full", text, images
+    for mode, (mode_system, mode_prompt) in REASONING_MODES.items():
+        if system_prompt == mode_system and text.startswith(mode_prompt):
+            return mode, text, images
+    return None, text, images
+
+
+def canned_answer(mode, text):
+    if mode == "full":
+        answer = {name: CANNED_ANSWERS[name] for name in FULL_ANALYSIS_MODES}
+    else:
+        answer = dict(CANNED_ANSWERS.get(mode, {}))
+    if '"events"' in text:
+        answer["events"] = [{"t": 0.0, "type": "hazard", "description": "object in path", "severity": "high"}]
+    return answer
+
+
+def build_completion_text(mode, text):
+    answer = json.dumps(canned_answer(mode, text))
+    if "<think>" in text:
+        return f"<think>\n{CANNED_REASONING}\n</think>\n\n{answer}"
+    return answer
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    settings = StandinSettings()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("standin: " + fmt, *args)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/v1/health/ready"):
+            self._send_json(200, {"object": "list", "data": [{"id": "nvidia/cosmos-reason2-8b", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+        settings.count("requests")
+        latency = settings.sample_latency()
+
+        if settings.should_fail():
+            settings.count("errors")
+            time.sleep(latency / 4)
+            headers = {"Retry-After": "1"} if settings.error_status in (429, 503) else {}
+            self._send_json(settings.error_status, {"error": {"message": "stand-in injected failure"}}, headers)
+            return
+
+        mode, text, images = detect_mode(body.get("messages", []))
+        content = build_completion_text(mode, text)
+        usage = {
+            "prompt_tokens": settings.prompt_tokens_per_image * max(images, 1) + len(text) // 4,
+            "completion_tokens": settings.completion_tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model", "nvidia/cosmos-reason2-8b")
+
+        if body.get("stream"):
+            settings.count("streams")
+            self._stream(content, usage, model, latency)
+            return
+        time.sleep(latency)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _stream(self, content, usage, model, latency):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        time.sleep(latency * 0.3)
+        try:
+            for piece in pieces:
+                self._write_event({
+                    "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                })
+                time.sleep(latency * 0.7 / len(pieces))
+            self._write_event({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [], "usage": usage,
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("standin: client cancelled the stream")
+
+    def _write_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def create_standin_server(host="127.0.0.1", port=8000, settings=None):
+    handler = type("BoundStandinHandler", (StandinHandler,), {"settings": settings or StandinSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_standin_in_thread(host="127.0.0.1", port=0, settings=None):
+    server = create_standin_server(host, port, settings)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,49 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Modules that must stay out of a bare `import src.cli` / `--help`.
+HEAVY_MODULES = ("cv2", "numpy", "openai", "flask", "rich", "dotenv")
+
+PROBES = {
+    "import": ["-c", "import src.cli"],
+    "help": ["-m", "src.cli", "--help"],
+}
+
+
+def loaded_modules(statement, modules=HEAVY_MODULES):
+    code = f"import json, sys\n{statement}\nprint(json.dumps([m for m in {list(modules)!r} if m in sys.modules]))"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(args, runs=5):
+    samples = []
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, check=True, cwd=ROOT)
+        samples.append(time.perf_counter() - start)
+    return {
+        "runs": len(samples),
+        "min_sec": round(min(samples), 4),
+        "median_sec": round(statistics.median(samples), 4),
+        "max_sec": round(max(samples), 4),
+    }
+
+
+def run_startup_benchmark(runs=5, budget_sec=None):
+    report = {name: measure_startup(args, runs) for name, args in PROBES.items()}
+    report["heavy_modules_on_import"] = loaded_modules("import src.cli")
+    failures = [f"src.cli imports {', '.join(report['heavy_modules_on_import'])}"] if report["heavy_modules_on_import"] else []
+    if budget_sec:
+        failures += [
+            f"{name} median {report[name]['median_sec']}s exceeds {budget_sec}s"
+            for name in PROBES if report[name]["median_sec"] > budget_sec
+        ]
+    report["failures"] = failures
+    return report
@@ -0,0 +1,16 @@
+SYSTEM_PROMPT = (
+    "You are the combined perception and decision stack of an assistive mobile robot. "
+    "You observe the world from a first-person (egocentric) camera and act as its "
+    "social, spatial, safety and planning modules at once. "
+    "Preventing harm to humans and property always comes first."
+)
+
+SECTION_TEMPLATE = """## Section "{name}"
+{prompt}"""
+
+FUSED_ANALYSIS_PROMPT = """Run every analysis below on the same egocentric image.
+
+{sections}
+
+Respond with ONE JSON object and nothing else. It must have exactly the keys {keys}.
+The value of each key is the JSON object requested in the section with that name."""
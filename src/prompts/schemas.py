@@ -0,0 +1,164 @@
+def _enum(*values):
+    return {"type": "string", "enum": list(values)}
+
+
+def _object(properties, required=None):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(required if required is not None else properties),
+    }
+
+
+def _array(items):
+    return {"type": "array", "items": items}
+
+
+STRING = {"type": "string"}
+BOOLEAN = {"type": "boolean"}
+INTEGER = {"type": "integer"}
+NULLABLE_STRING = {"type": ["string", "null"]}
+
+SOCIAL_INTENT_SCHEMA = _object({
+    "people_count": INTEGER,
+    "engaged_with_robot": BOOLEAN,
+    "gestures": _array(STRING),
+    "intent": STRING,
+    "intent_description": STRING,
+    "confidence": _enum("low", "medium", "high"),
+})
+
+HANDOVER_DETECTION_SCHEMA = _object({
+    "handover_detected": BOOLEAN,
+    "object": NULLABLE_STRING,
+    "distance": _enum("near", "medium", "far"),
+    "clarity": _enum("clear", "ambiguous", "none"),
+})
+
+SCENE_LAYOUT_SCHEMA = _object({
+    "obstacles": _array(_object({
+        "name": STRING,
+        "position": _enum("left", "center", "right"),
+        "distance": _enum("near", "mid", "far"),
+    })),
+    "free_paths": _array(STRING),
+    "key_objects": _array(_object({"name": STRING, "position": STRING})),
+    "people": _array(_object({"position": STRING, "activity": STRING})),
+})
+
+TRAJECTORY_PREDICTION_SCHEMA = _object({
+    "object": STRING,
+    "direction": _enum("toward", "away", "left_to_right", "right_to_left", "upward", "downward"),
+    "approaching": BOOLEAN,
+    "estimated_landing": STRING,
+    "collision_risk": _enum("none", "low", "medium", "high"),
+})
+
+SAFETY_ASSESSMENT_SCHEMA = _object({
+    "hazards": _array(_object({
+        "type": STRING,
+        "severity": _enum("low", "medium", "high", "critical"),
+        "location": STRING,
+    })),
+    "collision_risk": _enum("none", "low", "medium", "high", "imminent"),
+    "human_safety_concern": BOOLEAN,
+    "environmental_hazards": _array(STRING),
+    "recommended_action": _enum("continue", "slow_down", "stop", "reverse", "reroute"),
+    "explanation": STRING,
+})
+
+THROWN_OBJECT_SAFETY_SCHEMA = _object({
+    "object": STRING,
+    "moving_toward_robot": BOOLEAN,
+    "hit_risk": _enum("none", "low", "medium", "high"),
+    "evasive_action_needed": BOOLEAN,
+    "recommended_action": _enum("stay", "duck", "move_left", "move_right", "back_up"),
+})
+
+NEXT_ACTION_SCHEMA = _object({
+    "scene_summary": STRING,
+    "human_interaction_needed": BOOLEAN,
+    "safety_ok": BOOLEAN,
+    "next_action": STRING,
+    "action_description": STRING,
+    "priority": _enum("low", "medium", "high", "urgent"),
+})
+
+GRIPPER_TRAJECTORY_SCHEMA = _object({
+    "trajectory": _array(_object({
+        "point_2d": {"type": "array", "items": {"type": "number"}, "minItems": 2, "maxItems": 2},
+        "label": STRING,
+    })),
+    "task": STRING,
+    "feasibility": _enum("feasible", "difficult", "infeasible"),
+    "notes": STRING,
+})
+
+MULTI_STEP_PLAN_SCHEMA = _object({
+    "task": STRING,
+    "steps": _array(_object({
+        "step_number": INTEGER,
+        "action": STRING,
+        "completion_check": STRING,
+        "safety_note": NULLABLE_STRING,
+    })),
+    "estimated_total_steps": INTEGER,
+})
+
+TIMELINE_EVENT_SCHEMA = _object({
+    "t": {"type": "number"},
+    "type": _enum("hazard", "gesture", "handover", "other"),
+    "description": STRING,
+    "severity": _enum("low", "medium", "high", "critical"),
+})
+
+MODE_SCHEMAS = {
+    "social": SOCIAL_INTENT_SCHEMA,
+    "handover": HANDOVER_DETECTION_SCHEMA,
+    "spatial": SCENE_LAYOUT_SCHEMA,
+    "trajectory": TRAJECTORY_PREDICTION_SCHEMA,
+    "safety": SAFETY_ASSESSMENT_SCHEMA,
+    "thrown_object": THROWN_OBJECT_SAFETY_SCHEMA,
+    "planning": NEXT_ACTION_SCHEMA,
+    "gripper_trajectory": GRIPPER_TRAJECTORY_SCHEMA,
+    "multi_step_plan": MULTI_STEP_PLAN_SCHEMA,
+}
+
+# Completion budgets include the <think> block; they stop a rambling answer
+# long before the global MAX_TOKENS would.
+MODE_MAX_TOKENS = {
+    "social": 1024,
+    "handover": 768,
+    "spatial": 1280,
+    "trajectory": 768,
+    "safety": 1280,
+    "thrown_object": 768,
+    "planning": 1024,
+    "gripper_trajectory": 1280,
+    "multi_step_plan": 1536,
+    "full": 3072,
+}
+TIMELINE_EXTRA_TOKENS = 512
+# No-think answers are the JSON object alone: the mode budget less what the
+# <think> block would have used, never below the floor.
+FAST_MAX_TOKENS = 512
+THINK_ALLOWANCE_TOKENS = 512
+
+
+def fast_max_tokens(mode):
+    budget = MODE_MAX_TOKENS.get(mode)
+    if budget is None:
+        return FAST_MAX_TOKENS
+    return min(budget, max(FAST_MAX_TOKENS, budget - THINK_ALLOWANCE_TOKENS))
+
+
+def with_events(schema):
+    return {
+        **schema,
+        "properties": {**schema["properties"], "events": _array(TIMELINE_EVENT_SCHEMA)},
+        "required": [*schema["required"], "events"],
+    }
+
+
+def fused_schema(modes):
+    return _object({mode: MODE_SCHEMAS[mode] for mode in modes})
@@ -0,0 +1,14 @@
+WINDOW_CONTEXT_PROMPT = """{prompt}
+
+These {frame_count} frames cover {start_sec:.1f}s to {end_sec:.1f}s of a longer recording.
+Frame timestamps in seconds, in order: {timestamps}.
+
+In addition to the fields above, add an "events" array to your JSON listing every notable event in this clip:
+"events": [{{"t": 0.0, "type": "hazard|gesture|handover|other", "description": "", "severity": "low|medium|high|critical"}}]
+"t" is the timestamp in seconds of the frame where the event is visible. Use an empty array if nothing happens."""
+
+PACKED_FRAMES_PROMPT = """{prompt}
+
+The {frame_count} video frames are packed into {mosaic_count} grid image(s) of up to {cols}x{rows} tiles.
+Read each grid left to right, top to bottom; consecutive grids continue the sequence.
+Each tile is labelled in its top-left corner with its timestamp: {labels}."""
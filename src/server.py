@@ -0,0 +1,304 @@
+import heapq
+import io
+import itertools
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from flask import Flask, Request, Response, request, jsonify, send_from_directory
+from flask_cors import CORS
+from src.core.reasoning_engine import FULL_ANALYSIS_MODES, ReasoningEngine
+from src.core.scheduler import PRIORITY_CLASSES, SchedulerRejected, priority_of
+from src.core.transport import CircuitOpenError
+from src.utils import metrics
+from src.utils.helpers import Config
+
+logger = logging.getLogger(__name__)
+
+WEB_DIR = Path(__file__).parent.parent / "web"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class InMemoryRequest(Request):
+    # werkzeug spools uploads over 500KB to a temp file; MAX_CONTENT_LENGTH
+    # already bounds the body, so keep the whole upload in memory instead.
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+class AdmissionQueue:
+    def __init__(self, workers, max_queue):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="egobot-worker")
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.dropped = 0
+        self._inflight = 0
+        self._avg_latency = 5.0
+        self._pending = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, deadline_sec, mode=None):
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.rejected += 1
+                raise AdmissionRejected(429, "Server is saturated, retry later", self._retry_after_locked())
+            self._inflight += 1
+            self.admitted += 1
+        queued_at = time.monotonic()
+        expires_at = queued_at + deadline_sec
+
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            started = time.monotonic()
+            remaining = expires_at - started
+            if remaining <= 0:
+                # The caller has already been answered; don't spend a worker or an upstream call on it.
+                with self._lock:
+                    self.dropped += 1
+                future.set_exception(AdmissionRejected(503, "Request expired in the queue", 1))
+                return
+            try:
+                future.set_result((fn(remaining), started - queued_at))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._record(time.monotonic() - started)
+
+        future.add_done_callback(self._release)
+        # Workers take the most urgent queued job, not the oldest, so safety checks overtake social ones.
+        with self._lock:
+            heapq.heappush(self._pending, (PRIORITY_CLASSES.index(priority_of(mode)), next(self._seq), run))
+        self.executor.submit(self._run_next)
+        return future
+
+    def _run_next(self):
+        with self._lock:
+            _, _, run = heapq.heappop(self._pending)
+        run()
+
+    def wait(self, future, deadline_sec):
+        try:
+            result, queue_wait = future.result(timeout=deadline_sec)
+            return result, queue_wait
+        except FutureTimeoutError:
+            with self._lock:
+                self.expired += 1
+            if future.cancel():
+                raise AdmissionRejected(503, "Request expired in the queue", self.retry_after())
+            raise AdmissionRejected(504, f"Analysis exceeded the {deadline_sec}s deadline", self.retry_after())
+
+    def retry_after(self):
+        with self._lock:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        backlog = max(0, self._inflight - self.workers + 1)
+        return max(1, math.ceil(backlog * self._avg_latency / self.workers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers, "capacity": self.capacity, "inflight": self._inflight,
+                "admitted": self.admitted, "rejected": self.rejected, "expired": self.expired,
+                "dropped": self.dropped,
+                "avg_latency_sec": round(self._avg_latency, 3),
+            }
+
+    def _record(self, elapsed):
+        with self._lock:
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * elapsed
+
+    def _release(self, _future):
+        with self._lock:
+            self._inflight -= 1
+
+
+def create_app(config=None, engine=None):
+    config = config or Config()
+    engine = engine or ReasoningEngine(config)
+    admission = AdmissionQueue(config.serve_workers, config.serve_queue_size)
+
+    app = Flask(__name__, static_folder=str(WEB_DIR))
+    app.request_class = InMemoryRequest
+    app.config["MAX_CONTENT_LENGTH"] = config.max_upload_mb * 1024 * 1024
+    app.extensions["egobot_admission"] = admission
+    CORS(app)
+
+    @app.route("/")
+    def index():
+        return send_from_directory(app.static_folder, "index.html")
+
+    @app.route("/api/modes")
+    def modes():
+        return jsonify({"modes": engine.available_modes()})
+
+    @app.route("/api/stats")
+    def stats():
+        payload = {"admission": admission.stats()}
+        if getattr(engine, "single_flight", None) is not None:
+            payload["single_flight"] = engine.single_flight.stats()
+        if getattr(engine, "similarity_cache", None) is not None:
+            payload["similarity_cache"] = engine.similarity_cache.stats()
+        if getattr(engine, "scheduler", None) is not None:
+            payload["scheduler"] = engine.scheduler.stats()
+        if getattr(engine, "client", None) is not None:
+            payload["endpoints"] = engine.client.endpoints.stats()
+        return jsonify(payload)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        pool = engine.client.endpoints if getattr(engine, "client", None) is not None else None
+        single_flight = getattr(engine, "single_flight", None)
+        scheduler = getattr(engine, "scheduler", None)
+        metrics.observe_stats(
+            admission=admission.stats(),
+            scheduler=scheduler.stats() if scheduler is not None else None,
+            single_flight=single_flight.stats() if single_flight is not None else None,
+            endpoints=pool.stats() if pool is not None else None,
+            transports=[e.transport.stats() for e in pool.endpoints] if pool is not None else (),
+        )
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/api/analyze", methods=["POST"])
+    def api_analyze():
+        started = time.perf_counter()
+        mode = request.form.get("mode", "social")
+        # Keep label cardinality bounded whatever clients send.
+        label = mode if mode == "full" or mode in engine.available_modes() else "unknown"
+        response, status = analyze_request(mode, label)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route="/api/analyze", mode=label, status=status)
+        return response, status
+
+    def analyze_request(mode, label):
+        fused = request.form.get("fused")
+        fused = None if fused is None else fused.lower() in ("1", "true", "yes", "on")
+        file = request.files.get("image")
+        if not file:
+            return jsonify({"error": "No image provided"}), 400
+        image = file.read()
+        if not image:
+            return jsonify({"error": "Empty image"}), 400
+        deadline = _request_deadline(config)
+
+        # The upstream call is bounded by whatever is left of the deadline once
+        # the job leaves the queue, so a timed-out request frees its worker.
+        def analyze(remaining):
+            if mode == "full":
+                return engine.full_analysis(image, fused=fused, timeout=remaining)
+            return engine.analyze_image(image, mode=mode, timeout=remaining)
+
+        try:
+            result, queue_wait = admission.wait(admission.submit(analyze, deadline, mode), deadline)
+            metrics.QUEUE_WAIT_SECONDS.observe(queue_wait, mode=label)
+        except AdmissionRejected as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, e.status
+        except (CircuitOpenError, SchedulerRejected) as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+            return response, 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        result["queue_wait_sec"] = round(queue_wait, 4)
+        return jsonify(result), 200
+
+    @app.route("/api/analyze/stream", methods=["POST"])
+    def api_analyze_stream():
+        started = time.perf_counter()
+        mode = request.form.get("mode", "full")
+        if mode != "full" and mode not in engine.available_modes():
+            return jsonify({"error": f"Unknown mode '{mode}'"}), 400
+        file = request.files.get("image")
+        image = file.read() if file else b""
+        if not image:
+            return jsonify({"error": "No image provided"}), 400
+        reasoning = request.form.get("reasoning", "").lower() in ("1", "true", "yes", "on")
+        sse = request.form.get("format") == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+        deadline = _request_deadline(config)
+        modes = FULL_ANALYSIS_MODES if mode == "full" else [mode]
+        events = queue.Queue()
+
+        def produce(remaining):
+            for event in engine.stream_analysis(image, modes=modes, reasoning_tokens=reasoning, timeout=remaining):
+                events.put(event)
+
+        def finished(future):
+            error = future.exception()
+            if error is not None:
+                events.put({"type": "error", "error": str(error)})
+            else:
+                metrics.QUEUE_WAIT_SECONDS.observe(future.result()[1], mode=mode)
+            events.put(None)
+
+        try:
+            future = admission.submit(produce, deadline, mode)
+        except AdmissionRejected as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = str(e.retry_after)
+            metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route="/api/analyze/stream", mode=mode, status=e.status)
+            return response, e.status
+        future.add_done_callback(finished)
+
+        def generate():
+            expires_at = time.monotonic() + deadline
+            try:
+                while True:
+                    try:
+                        event = events.get(timeout=max(0.0, expires_at - time.monotonic()))
+                    except queue.Empty:
+                        event = {"type": "error", "error": f"Analysis exceeded the {deadline}s deadline"}
+                    if event is None:
+                        return
+                    payload = json.dumps(event)
+                    yield f"event: {event['type']}\ndata: {payload}\n\n" if sse else payload + "\n"
+                    if event["type"] == "error" and "mode" not in event:
+                        return
+            finally:
+                metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route="/api/analyze/stream", mode=mode, status=200)
+
+        response = Response(generate(), mimetype="text/event-stream" if sse else "application/x-ndjson")
+        # Proxies must pass each event through as it is written.
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    return app
+
+
+def _request_deadline(config):
+    requested = request.form.get("deadline_sec") or request.headers.get("X-Request-Deadline")
+    try:
+        requested = float(requested) if requested else None
+    except ValueError:
+        requested = None
+    if requested and requested > 0:
+        return min(requested, config.request_deadline_sec)
+    return config.request_deadline_sec
+
+
+def run_server(app, host, port, threads):
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.warning("waitress is not installed; falling back to the threaded werkzeug server")
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads)
@@ -1,22 +1,95 @@
 
 import os
-import base64
+import math
+import threading
+import time
 from pathlib import Path
 from dataclasses import dataclass, field
-from dotenv import load_dotenv
 
-load_dotenv(Path(__file__).resolve().parents[2] / ".env")
+ENV_FILE = Path(__file__).resolve().parents[2] / ".env"
+_env_loaded = False
+
+IMAGE_FORMATS = ("original", "jpeg", "webp", "png")
+IMAGE_FORMAT_ALIASES = {"jpg": "jpeg"}
 
 
 @dataclass
 class Config:
-    nvidia_api_key: str = field(default_factory=lambda: os.getenv("NVIDIA_API_KEY", ""))
-    cosmos_model: str = field(default_factory=lambda: os.getenv("COSMOS_MODEL", "nvidia/cosmos-reason2-8b"))
-    cosmos_base_url: str = field(default_factory=lambda: os.getenv("COSMOS_BASE_URL", "https://integrate.api.nvidia.com/v1"))
-    max_tokens: int = field(default_factory=lambda: int(os.getenv("MAX_TOKENS", "4096")))
-    temperature: float = field(default_factory=lambda: float(os.getenv("TEMPERATURE", "0.3")))
-    top_p: float = field(default_factory=lambda: float(os.getenv("TOP_P", "0.3")))
-    video_fps: int = field(default_factory=lambda: int(os.getenv("VIDEO_FPS", "2")))
+    nvidia_api_key: str = field(default_factory=lambda: getenv("NVIDIA_API_KEY", ""))
+    cosmos_model: str = field(default_factory=lambda: getenv("COSMOS_MODEL", "nvidia/cosmos-reason2-8b"))
+    cosmos_base_url: str = field(default_factory=lambda: getenv("COSMOS_BASE_URL", "https://integrate.api.nvidia.com/v1"))
+    routing_strategy: str = field(default_factory=lambda: getenv("ROUTING_STRATEGY", "least_outstanding"))
+    endpoint_affinity: bool = field(default_factory=lambda: getenv("ENDPOINT_AFFINITY", "off").lower() in ("1", "on", "true", "yes"))
+    health_check_interval_sec: float = field(default_factory=lambda: float(getenv("HEALTH_CHECK_INTERVAL_SEC", "10")))
+    endpoint_eject_after: int = field(default_factory=lambda: int(getenv("ENDPOINT_EJECT_AFTER", "3")))
+    endpoint_eject_sec: float = field(default_factory=lambda: float(getenv("ENDPOINT_EJECT_SEC", "30")))
+    cosmos_connect_timeout_sec: float = field(default_factory=lambda: float(getenv("COSMOS_CONNECT_TIMEOUT_SEC", "5")))
+    cosmos_read_timeout_sec: float = field(default_factory=lambda: float(getenv("COSMOS_READ_TIMEOUT_SEC", "120")))
+    cosmos_max_connections: int = field(default_factory=lambda: int(getenv("COSMOS_MAX_CONNECTIONS", "64")))
+    cosmos_max_keepalive: int = field(default_factory=lambda: int(getenv("COSMOS_MAX_KEEPALIVE", "16")))
+    cosmos_max_retries: int = field(default_factory=lambda: int(getenv("COSMOS_MAX_RETRIES", "3")))
+    cosmos_backoff_base_sec: float = field(default_factory=lambda: float(getenv("COSMOS_BACKOFF_BASE_SEC", "0.5")))
+    cosmos_backoff_max_sec: float = field(default_factory=lambda: float(getenv("COSMOS_BACKOFF_MAX_SEC", "8")))
+    breaker_failure_threshold: int = field(default_factory=lambda: int(getenv("BREAKER_FAILURE_THRESHOLD", "5")))
+    breaker_reset_sec: float = field(default_factory=lambda: float(getenv("BREAKER_RESET_SEC", "30")))
+    max_tokens: int = field(default_factory=lambda: int(getenv("MAX_TOKENS", "4096")))
+    reasoning_policy: str = field(default_factory=lambda: getenv("REASONING_POLICY", ""))
+    guided_decoding: str = field(default_factory=lambda: getenv("GUIDED_DECODING", "off"))
+    temperature: float = field(default_factory=lambda: float(getenv("TEMPERATURE", "0.3")))
+    top_p: float = field(default_factory=lambda: float(getenv("TOP_P", "0.3")))
+    video_fps: int = field(default_factory=lambda: int(getenv("VIDEO_FPS", "2")))
+    video_sampling: str = field(default_factory=lambda: getenv("VIDEO_SAMPLING", "uniform"))
+    keyframe_candidate_fps: float = field(default_factory=lambda: float(getenv("KEYFRAME_CANDIDATE_FPS", "8")))
+    keyframe_dedup_threshold: float = field(default_factory=lambda: float(getenv("KEYFRAME_DEDUP_THRESHOLD", "0.02")))
+    long_video_window_sec: float = field(default_factory=lambda: float(getenv("LONG_VIDEO_WINDOW_SEC", "8")))
+    long_video_overlap_sec: float = field(default_factory=lambda: float(getenv("LONG_VIDEO_OVERLAP_SEC", "2")))
+    long_video_frames_per_window: int = field(default_factory=lambda: int(getenv("LONG_VIDEO_FRAMES_PER_WINDOW", "8")))
+    motion_threshold: float = field(default_factory=lambda: float(getenv("MOTION_THRESHOLD", "0.02")))
+    motion_pixel_delta: int = field(default_factory=lambda: int(getenv("MOTION_PIXEL_DELTA", "25")))
+    motion_sample_fps: float = field(default_factory=lambda: float(getenv("MOTION_SAMPLE_FPS", "10")))
+    motion_context_frames: int = field(default_factory=lambda: int(getenv("MOTION_CONTEXT_FRAMES", "6")))
+    motion_max_events: int = field(default_factory=lambda: int(getenv("MOTION_MAX_EVENTS", "8")))
+    live_sample_fps: float = field(default_factory=lambda: float(getenv("LIVE_SAMPLE_FPS", "4")))
+    live_window_frames: int = field(default_factory=lambda: int(getenv("LIVE_WINDOW_FRAMES", "4")))
+    live_change_threshold: int = field(default_factory=lambda: int(getenv("LIVE_CHANGE_THRESHOLD", "10")))
+    live_max_staleness_sec: float = field(default_factory=lambda: float(getenv("LIVE_MAX_STALENESS_SEC", "10")))
+    live_max_inflight: int = field(default_factory=lambda: int(getenv("LIVE_MAX_INFLIGHT", "1")))
+    image_max_side: int = field(default_factory=lambda: int(getenv("IMAGE_MAX_SIDE", "1280")))
+    frame_packing: str = field(default_factory=lambda: getenv("FRAME_PACKING", "off"))
+    frame_pack_tile_side: int = field(default_factory=lambda: int(getenv("FRAME_PACK_TILE_SIDE", "448")))
+    image_format: str = field(default_factory=lambda: getenv("IMAGE_FORMAT", "jpeg"))
+    image_quality: int = field(default_factory=lambda: int(getenv("IMAGE_QUALITY", "85")))
+    image_color: str = field(default_factory=lambda: getenv("IMAGE_COLOR", "rgb"))
+    max_concurrency: int = field(default_factory=lambda: int(getenv("MAX_CONCURRENCY", "4")))
+    mode_timeout_sec: float = field(default_factory=lambda: float(getenv("MODE_TIMEOUT_SEC", "120")))
+    response_cache: str = field(default_factory=lambda: getenv("RESPONSE_CACHE", "off"))
+    response_cache_path: str = field(default_factory=lambda: getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite"))
+    response_cache_ttl_sec: float = field(default_factory=lambda: float(getenv("RESPONSE_CACHE_TTL_SEC", "86400")))
+    response_cache_max_entries: int = field(default_factory=lambda: int(getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")))
+    response_cache_max_mb: int = field(default_factory=lambda: int(getenv("RESPONSE_CACHE_MAX_MB", "512")))
+    benchmark_concurrency: int = field(default_factory=lambda: int(getenv("BENCHMARK_CONCURRENCY", "4")))
+    benchmark_rps: float = field(default_factory=lambda: float(getenv("BENCHMARK_RPS", "0")))
+    serve_workers: int = field(default_factory=lambda: int(getenv("SERVE_WORKERS", "8")))
+    serve_queue_size: int = field(default_factory=lambda: int(getenv("SERVE_QUEUE_SIZE", "32")))
+    request_deadline_sec: float = field(default_factory=lambda: float(getenv("REQUEST_DEADLINE_SEC", "60")))
+    max_upload_mb: int = field(default_factory=lambda: int(getenv("MAX_UPLOAD_MB", "20")))
+    scheduler_slots: int = field(default_factory=lambda: int(getenv("SCHEDULER_SLOTS", "16")))
+    scheduler_reserved_slots: int = field(default_factory=lambda: int(getenv("SCHEDULER_RESERVED_SLOTS", "2")))
+    scheduler_max_wait_sec: float = field(default_factory=lambda: float(getenv("SCHEDULER_MAX_WAIT_SEC", "30")))
+    scheduler_requests_per_window: int = field(default_factory=lambda: int(getenv("SCHEDULER_REQUESTS_PER_WINDOW", "0")))
+    scheduler_tokens_per_window: int = field(default_factory=lambda: int(getenv("SCHEDULER_TOKENS_PER_WINDOW", "0")))
+    scheduler_window_sec: float = field(default_factory=lambda: float(getenv("SCHEDULER_WINDOW_SEC", "60")))
+    similarity_cache: bool = field(default_factory=lambda: getenv("SIMILARITY_CACHE", "off").lower() in ("1", "on", "true", "yes"))
+    similarity_cache_max_distance: int = field(default_factory=lambda: int(getenv("SIMILARITY_CACHE_MAX_DISTANCE", "4")))
+    similarity_cache_max_entries: int = field(default_factory=lambda: int(getenv("SIMILARITY_CACHE_MAX_ENTRIES", "256")))
+    similarity_cache_ttl_sec: float = field(default_factory=lambda: float(getenv("SIMILARITY_CACHE_TTL_SEC", "10")))
+    similarity_cache_modes: str = field(default_factory=lambda: getenv("SIMILARITY_CACHE_MODES", ""))
+    single_flight: bool = field(default_factory=lambda: getenv("SINGLE_FLIGHT", "on").lower() in ("1", "on", "true", "yes"))
+    full_analysis_strategy: str = field(default_factory=lambda: getenv("FULL_ANALYSIS_STRATEGY", "parallel"))
+
+    def __post_init__(self):
+        self.image_format = normalize_image_format(self.image_format)
+        parse_frame_grid(self.frame_packing)
 
     def validate(self):
         if not self.nvidia_api_key:
@@ -26,9 +99,31 @@ class Config:
             )
 
 
-def encode_image_to_base64(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+def getenv(name, default):
+    # .env is read on the first Config, not at import, so cheap imports stay cheap.
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(ENV_FILE)
+        _env_loaded = True
+    return os.getenv(name, default)
+
+
+def normalize_image_format(value):
+    fmt = IMAGE_FORMAT_ALIASES.get(value.lower(), value.lower())
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown IMAGE_FORMAT '{value}'. Available: {', '.join(IMAGE_FORMATS)}")
+    return fmt
+
+
+def parse_frame_grid(value):
+    value = str(value or "").lower().strip()
+    if value in ("", "0", "off", "none", "false"):
+        return None
+    cols, sep, rows = value.partition("x")
+    if not (sep and cols.isdigit() and rows.isdigit() and int(cols) > 0 and int(rows) > 0):
+        raise ValueError(f"Unknown FRAME_PACKING '{value}'. Use a grid like 2x2 or 'off'")
+    return int(cols), int(rows)
 
 
 def get_media_type(file_path):
@@ -38,3 +133,29 @@ def get_media_type(file_path):
         ".png": "image/png", ".mp4": "video/mp4",
     }
     return mime_map.get(ext, "application/octet-stream")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class RateLimiter:
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,110 @@
+import io
+import logging
+from PIL import Image, ImageDraw, ImageOps
+from src.utils.helpers import get_media_type
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+PIL_MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def read_image_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def preprocess_image(source, config):
+    raw = read_image_bytes(source)
+    stats = {"image_bytes_raw": len(raw), "image_bytes_sent": len(raw)}
+    fmt = config.image_format
+    max_side = config.image_max_side
+    grayscale = config.image_color.lower() == "grayscale"
+
+    if fmt == "original" and not max_side and not grayscale:
+        return raw, _source_media_type(source, raw), stats
+
+    img = Image.open(io.BytesIO(raw))
+    source_format = img.format
+    img = ImageOps.exif_transpose(img)
+    resized = bool(max_side) and max(img.size) > max_side
+    if resized:
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    pil_format, media_type = _output_format(fmt, source_format)
+    convert_gray = grayscale and img.mode != "L"
+    # A small file already in the target format gains nothing from a lossy re-encode.
+    if not resized and not convert_gray and pil_format == source_format:
+        return raw, media_type, stats
+
+    if convert_gray:
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L") or (pil_format == "JPEG" and img.mode != "RGB"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    save_kwargs = {"optimize": True}
+    if pil_format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = config.image_quality
+    img.save(buf, format=pil_format, **save_kwargs)
+    data = buf.getvalue()
+    if not resized and not convert_gray and len(data) >= len(raw):
+        return raw, _source_media_type(source, raw), stats
+
+    stats["image_bytes_sent"] = len(data)
+    logger.debug("Preprocessed image %d -> %d bytes", len(raw), len(data))
+    return data, media_type, stats
+
+
+def pack_frames(frames, grid, tile_side, labels=None):
+    cols, rows = grid
+    per_mosaic = cols * rows
+    labels = labels or [f"#{i + 1}" for i in range(len(frames))]
+    mosaics = []
+    for start in range(0, len(frames), per_mosaic):
+        tiles = []
+        for source in frames[start:start + per_mosaic]:
+            tile = ImageOps.exif_transpose(Image.open(io.BytesIO(read_image_bytes(source)))).convert("RGB")
+            tile.thumbnail((tile_side, tile_side), Image.Resampling.LANCZOS)
+            tiles.append(tile)
+        width, height = tiles[0].size
+        # A short last mosaic only gets the rows it fills.
+        used_rows = -(-len(tiles) // cols)
+        canvas = Image.new("RGB", (cols * width, used_rows * height))
+        draw = ImageDraw.Draw(canvas)
+        for i, (tile, label) in enumerate(zip(tiles, labels[start:start + per_mosaic])):
+            x, y = (i % cols) * width, (i // cols) * height
+            canvas.paste(tile if tile.size == (width, height) else tile.resize((width, height)), (x, y))
+            box = draw.textbbox((x + 4, y + 4), label)
+            draw.rectangle((box[0] - 2, box[1] - 2, box[2] + 2, box[3] + 2), fill=(0, 0, 0))
+            draw.text((x + 4, y + 4), label, fill=(255, 255, 0))
+        buf = io.BytesIO()
+        # Near-lossless here; preprocess_image applies the configured format and quality afterwards.
+        canvas.save(buf, format="JPEG", quality=95)
+        mosaics.append(buf.getvalue())
+    return mosaics
+
+
+def _output_format(fmt, source_format):
+    if fmt != "original":
+        return OUTPUT_FORMATS[fmt]
+    if source_format in PIL_MEDIA_TYPES:
+        return source_format, PIL_MEDIA_TYPES[source_format]
+    return OUTPUT_FORMATS["png"]
+
+
+def _source_media_type(source, raw):
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        media_type = get_media_type(source)
+        if media_type != "application/octet-stream":
+            return media_type
+    try:
+        return PIL_MEDIA_TYPES.get(Image.open(io.BytesIO(raw)).format, "application/octet-stream")
+    except Exception:
+        return "application/octet-stream"
@@ -0,0 +1,212 @@
+import bisect
+import math
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, self._labels(key), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series["count"] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, {**series, "counts": list(series["counts"])}) for key, series in self._values.items())
+        samples = []
+        for key, series in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series["counts"]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": bound}, cumulative))
+            samples.append((f"{self.name}_sum", labels, series["sum"]))
+            samples.append((f"{self.name}_count", labels, series["count"]))
+        return samples
+
+
+STAGE_SECONDS = Histogram(
+    "egobot_stage_seconds", "Time spent in each pipeline stage.", ("stage", "mode", "model"),
+)
+PAYLOAD_BYTES = Histogram(
+    "egobot_payload_bytes", "Encoded image bytes sent upstream per call.", ("mode", "model"), buckets=BYTES_BUCKETS,
+)
+TOKENS = Counter("egobot_tokens_total", "Tokens reported by the model.", ("kind", "mode", "model"))
+PARSE_RESULTS = Counter("egobot_parse_total", "Answers by parse outcome (ok, invalid, unparsed).", ("outcome", "mode", "model"))
+CACHE_LOOKUPS = Counter("egobot_cache_total", "Response cache lookups by outcome.", ("outcome", "mode", "model"))
+SIMILARITY_CACHE_LOOKUPS = Counter("egobot_similarity_cache_total", "Perceptual-hash cache lookups by outcome.", ("outcome", "mode"))
+SINGLE_FLIGHT_CALLS = Counter("egobot_single_flight_total", "Coalescing outcome per analysis.", ("outcome", "mode"))
+REASONING_TIERS = Counter("egobot_reasoning_tier_total", "Which reasoning tier answered.", ("tier", "mode"))
+HTTP_SECONDS = Histogram("egobot_http_request_seconds", "HTTP request latency.", ("route", "mode", "status"))
+QUEUE_WAIT_SECONDS = Histogram("egobot_queue_wait_seconds", "Time spent waiting for a worker.", ("mode",))
+SCHEDULER_WAIT_SECONDS = Histogram("egobot_scheduler_wait_seconds", "Time waiting for an upstream slot.", ("priority",))
+SCHEDULER = Gauge("egobot_scheduler", "Scheduler queue depth and outcomes per priority class.", ("priority", "stat"))
+ADMISSION = Gauge("egobot_admission", "Admission queue counters and occupancy.", ("stat",))
+SINGLE_FLIGHT = Gauge("egobot_single_flight", "Single-flight coalescing counters.", ("stat",))
+ENDPOINTS = Gauge("egobot_endpoint", "Per-endpoint routing and transport state.", ("url", "stat"))
+
+
+def observe_result(mode, output):
+    model = output.get("model") or "unknown"
+    timings = output.get("timings", {})
+    usage = output.get("usage", {})
+    for stage in ("encode", "upstream", "ttft"):
+        value = timings.get(f"{stage}_sec")
+        if value is not None:
+            STAGE_SECONDS.observe(value, stage=stage, mode=mode, model=model)
+    if usage.get("image_bytes_sent"):
+        PAYLOAD_BYTES.observe(usage["image_bytes_sent"], mode=mode, model=model)
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens"):
+            TOKENS.inc(usage[f"{kind}_tokens"], kind=kind, mode=mode, model=model)
+    if output.get("parsed") is None:
+        outcome = "unparsed"
+    else:
+        outcome = "invalid" if output.get("validation_errors") else "ok"
+    PARSE_RESULTS.inc(outcome=outcome, mode=mode, model=model)
+    if output.get("cache"):
+        CACHE_LOOKUPS.inc(outcome="hit" if output["cache"]["hit"] else "miss", mode=mode, model=model)
+
+
+def observe_stats(admission=None, single_flight=None, endpoints=None, transports=(), scheduler=None):
+    for name, value in (admission or {}).items():
+        ADMISSION.set(value, stat=name)
+    for priority, stats in (scheduler or {}).get("classes", {}).items():
+        for name in ("queued", "granted", "dropped"):
+            SCHEDULER.set(stats[name], priority=priority, stat=name)
+    for name, value in (single_flight or {}).items():
+        SINGLE_FLIGHT.set(value, stat=name)
+    for endpoint in (endpoints or {}).get("endpoints", []):
+        for name in ("outstanding", "requests", "consecutive_failures", "ewma_latency_sec"):
+            if endpoint[name] is not None:
+                ENDPOINTS.set(endpoint[name], url=endpoint["url"], stat=name)
+        ENDPOINTS.set(int(endpoint["healthy"]), url=endpoint["url"], stat="healthy")
+        ENDPOINTS.set(int(endpoint["breaker"] == "open"), url=endpoint["url"], stat="breaker_open")
+    for transport in transports:
+        ENDPOINTS.set(transport["retries"], url=transport["endpoint"], stat="retries")
+        ENDPOINTS.set(transport["breaker"]["trips"], url=transport["endpoint"], stat="breaker_trips")
+
+
+def render():
+    return REGISTRY.render()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        if isinstance(value, float):
+            value = _format_value(value)
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(round(value, 6))
+    return str(value)
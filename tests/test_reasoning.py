@@ -1,9 +1,40 @@
 
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
 import pytest
-from src.utils.helpers import Config
+from PIL import Image
+from src.utils.helpers import Config, RateLimiter, percentile
+from src.utils.image_preprocessing import pack_frames, preprocess_image
+from types import SimpleNamespace
 from src.core.cosmos_client import CosmosClient
-from src.core.reasoning_engine import ReasoningEngine
-from src.evaluation.benchmark import BenchmarkRunner
+from src.core.response_cache import ResponseCache
+from src.core.scheduler import PriorityScheduler, SchedulerRejected
+from src.core.similarity_cache import SimilarityCache, image_dhash
+from src.core.singleflight import SingleFlight, content_digest
+from src.core.transport import CircuitBreaker, CircuitOpenError, Transport, parse_retry_after
+from src.core.action_planner import ActionPlanner
+from src.core.batch import BatchRunner, load_entries, open_sink
+from src.core.endpoint_pool import EndpointPool
+from src.core.live import LiveRunner
+from src.core.video_processor import MotionGate, VideoProcessor
+from src.core.stream_parser import StreamParser, find_json_object
+from src.core.reasoning_engine import DEFAULT_REASONING_POLICY, ReasoningEngine, parse_reasoning_policy
+from src.evaluation.benchmark import BenchmarkRunner, compare_frame_packing
+from src.evaluation.loadtest import LoadTester, engine_request_fn
+from src.evaluation.startup import loaded_modules, run_startup_benchmark
+from src.evaluation.standin_server import CANNED_ANSWERS, StandinSettings, start_standin_in_thread
+from src.core.structured_output import extract_json, validate
+from src.prompts.schemas import FAST_MAX_TOKENS, MODE_SCHEMAS
+from src.server import AdmissionQueue, create_app
+from src.utils import metrics
+from src.utils.metrics import Counter, Histogram, Registry
 
 
 class TestCosmosClient:
@@ -26,6 +57,260 @@ class TestCosmosClient:
         assert a == "plain text"
 
 
+def _png_bytes(size=(400, 300)):
+    buf = io.BytesIO()
+    Image.linear_gradient("L").resize(size).convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class TestImagePreprocessing:
+    def test_downsizes_and_reencodes(self):
+        config = Config(nvidia_api_key="test", image_max_side=100, image_format="jpeg")
+        data, media_type, stats = preprocess_image(_png_bytes(), config)
+        assert media_type == "image/jpeg"
+        assert max(Image.open(io.BytesIO(data)).size) == 100
+        assert stats["image_bytes_sent"] == len(data) < stats["image_bytes_raw"]
+
+    def test_grayscale(self):
+        config = Config(nvidia_api_key="test", image_format="jpeg", image_color="grayscale")
+        data, media_type, _ = preprocess_image(_png_bytes(), config)
+        assert media_type == "image/jpeg"
+        assert Image.open(io.BytesIO(data)).mode == "L"
+
+    def test_original_passthrough(self, tmp_path):
+        path = tmp_path / "frame.png"
+        path.write_bytes(_png_bytes())
+        config = Config(nvidia_api_key="test", image_max_side=0, image_format="original")
+        data, media_type, stats = preprocess_image(str(path), config)
+        assert data == path.read_bytes()
+        assert media_type == "image/png"
+        assert stats["image_bytes_sent"] == stats["image_bytes_raw"]
+
+    def test_image_format_is_validated(self):
+        assert Config(nvidia_api_key="test", image_format="JPG").image_format == "jpeg"
+        with pytest.raises(ValueError):
+            Config(nvidia_api_key="test", image_format="tiff")
+
+
+class _FakeCompletions:
+    def __init__(self, text='{"ok": true}'):
+        self.text = text
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+        )
+
+
+def _fake_openai(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+class _FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=3, completion_tokens=4, total_tokens=7))
+
+    def close(self):
+        self.closed = True
+
+
+class TestStreaming:
+    PIECES = ["<thi", "nk>look", "ing</th", "ink>\n", '{"recommended_action": ', '"stop", "n": {"a": "}"}}', " trailing", " prose"]
+
+    def test_parser_handles_split_tags(self):
+        parser = StreamParser()
+        events = [e for piece in self.PIECES for e in parser.feed(piece)] + parser.close()
+        reasoning = "".join(e["delta"] for e in events if e["type"] == "reasoning")
+        answers = [e for e in events if e["type"] == "answer"]
+        assert reasoning == "looking"
+        assert answers == [{"type": "answer", "parsed": {"recommended_action": "stop", "n": {"a": "}"}}}]
+
+    def test_parser_without_think(self):
+        parser = StreamParser()
+        events = parser.feed('{"a": 1}')
+        assert events[-1] == {"type": "answer", "parsed": {"a": 1}}
+        assert parser.reasoning == ""
+
+    def test_find_json_object(self):
+        text = 'Sure: {"a": "{x"} done'
+        start, end = find_json_object(text)
+        assert text[start:end] == '{"a": "{x"}'
+        assert find_json_object('{"a": 1') is None
+
+    def test_client_stream_stops_on_answer(self, tmp_path):
+        image = tmp_path / "img.png"
+        image.write_bytes(_png_bytes())
+        client = CosmosClient(Config(nvidia_api_key="test"))
+        stream = _FakeStream(self.PIECES)
+        client.client = _fake_openai(SimpleNamespace(create=lambda **params: stream))
+        events = list(client.stream_image(str(image), "prompt", stop_on_answer=True))
+        done = events[-1]["result"]
+        assert stream.closed and stream.consumed == 6
+        assert done["usage"]["cancelled"] is True
+        assert done["usage"]["ttft_sec"] <= done["usage"]["time_to_answer_sec"]
+        assert done["reasoning"] == "looking"
+
+    def test_cached_stream_replay_has_timings(self, tmp_path):
+        image = tmp_path / "img.png"
+        image.write_bytes(_png_bytes())
+        client = CosmosClient(Config(nvidia_api_key="test", response_cache="memory"))
+        client.cache = ResponseCache()
+        client.client = _fake_openai(SimpleNamespace(create=lambda **params: _FakeStream(self.PIECES)))
+        list(client.stream_image(str(image), "prompt"))
+        (_, stored), = client.cache._memory.values()
+        assert "ttft_sec" not in json.loads(stored)["usage"]
+        events = list(client.stream_image(str(image), "prompt"))
+        answer = next(e for e in events if e["type"] == "answer")
+        assert answer["time_to_answer_sec"] == 0.0
+        assert events[-1]["result"]["cache"]["hit"] is True
+
+
+class TestResponseCache:
+    def test_memory_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, {"answer": key})
+        assert cache.get("a") is None
+        assert cache.get("c") == {"answer": "c"}
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl_sec=-1)
+        cache.put("a", {"answer": "a"})
+        assert cache.get("a") is None
+
+    def test_disk_tier_persists(self, tmp_path):
+        path = tmp_path / "cache.sqlite"
+        ResponseCache(path=path).put("a", {"answer": "a"})
+        assert ResponseCache(path=path).get("a") == {"answer": "a"}
+
+    def test_disk_size_eviction(self, tmp_path):
+        cache = ResponseCache(path=tmp_path / "cache.sqlite", max_bytes=60)
+        cache.put("a", {"answer": "x" * 30})
+        cache.put("b", {"answer": "y" * 30})
+        cache._memory.clear()
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+
+    def test_key_covers_sampling_params(self):
+        params = {"model": "m", "messages": [], "max_tokens": 10, "temperature": 0.3, "top_p": 0.3}
+        assert ResponseCache.make_key(params) != ResponseCache.make_key({**params, "temperature": 0.7})
+
+    def test_client_uses_cache_and_bypass(self):
+        client = CosmosClient(Config(nvidia_api_key="test", response_cache="memory"))
+        client.cache = ResponseCache()
+        completions = _FakeCompletions()
+        client.client = _fake_openai(completions)
+        messages = [{"role": "user", "content": "hi"}]
+        assert client._call(messages)["cache"]["hit"] is False
+        assert client._call(messages)["cache"]["hit"] is True
+        client._call(messages, bypass_cache=True)
+        assert completions.calls == 2
+
+
+def _write_video(path, frames=40, fps=10, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for i in range(frames):
+        frame = np.full((size[1], size[0], 3), (i * 6) % 256, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+class TestVideoProcessor:
+    def test_in_memory_extraction(self, tmp_path, monkeypatch):
+        video = _write_video(tmp_path / "clip.avi")
+        monkeypatch.setattr("tempfile.mkdtemp", lambda *a, **k: pytest.fail("touched disk"))
+        processor = VideoProcessor(Config(nvidia_api_key="test", video_fps=2))
+        frames, timestamps, info = processor.extract_frame_buffers(video, max_frames=3)
+        assert len(frames) == 3
+        assert all(f[:2] == b"\xff\xd8" for f in frames)
+        assert timestamps == [0.0, 0.5, 1.0]
+        assert info["frame_count"] == 40
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["clip.avi"]
+
+    def test_frames_downsized_on_encode(self, tmp_path):
+        video = _write_video(tmp_path / "clip.avi")
+        processor = VideoProcessor(Config(nvidia_api_key="test", image_max_side=32))
+        frames, _, _ = processor.extract_frame_buffers(video, max_frames=1)
+        assert max(Image.open(io.BytesIO(frames[0])).size) == 32
+
+
+class _FakeWindowClient:
+    async def reason_about_frames(self, frame_paths, prompt, system_prompt, enable_reasoning=True, **kwargs):
+        first = float(prompt.split("cover ")[1].split("s to")[0])
+        answer = {"events": [{"t": first + 1.0, "type": "hazard", "description": "box", "severity": "low"}]}
+        return {"reasoning": "", "answer": json.dumps(answer), "usage": {"total_tokens": 10}}
+
+
+class TestKeyframeSampling:
+    def test_picks_scene_changes(self):
+        thumbs = np.zeros((30, 32, 32), dtype=np.uint8)
+        thumbs[10:20] = 200
+        thumbs[20:] = 90
+        assert VideoProcessor.select_keyframes(thumbs, max_frames=3) == [0, 10, 20]
+
+    def test_near_duplicates_suppressed(self):
+        thumbs = np.zeros((10, 32, 32), dtype=np.uint8)
+        thumbs[5:] = 255
+        picked = VideoProcessor.select_keyframes(thumbs, max_frames=5, dedup_threshold=0.05)
+        assert picked == [0, 5]
+
+    def test_keyframe_extraction(self, tmp_path):
+        path = tmp_path / "cuts.avi"
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+        for i in range(60):
+            writer.write(np.full((48, 64, 3), 0 if i < 45 else 255, dtype=np.uint8))
+        writer.release()
+        processor = VideoProcessor(Config(nvidia_api_key="test", keyframe_candidate_fps=10))
+        frames, timestamps, _ = processor.extract_frame_buffers(str(path), max_frames=2, sampling="keyframe")
+        assert len(frames) == 2
+        assert timestamps == [0.0, 4.5]
+
+
+class TestLongVideo:
+    def test_plan_windows_overlap_and_cover(self):
+        windows = VideoProcessor._plan_windows(100, 10, window_sec=4, overlap_sec=1, frames_per_window=4)
+        assert [w["start_sec"] for w in windows] == [0, 3, 6]
+        assert windows[-1]["end_sec"] == 10
+        assert windows[0]["frame_indices"] == [0, 13, 26, 39]
+
+    def test_merge_timeline_dedupes_overlap(self):
+        windows = [
+            {"index": 0, "start_sec": 0, "parsed": {"events": [{"t": 3.0, "type": "hazard", "severity": "low"}]}},
+            {"index": 1, "start_sec": 3, "parsed": {"events": [
+                {"t": 3.2, "type": "hazard", "severity": "high"},
+                {"t": 1.0, "type": "gesture"},
+            ]}},
+        ]
+        timeline = ReasoningEngine._merge_timeline(windows, tolerance_sec=1.0)
+        assert [(e["type"], e["t"]) for e in timeline] == [("hazard", 3.0), ("gesture", 4.0)]
+        assert timeline[0]["severity"] == "high" and timeline[0]["windows"] == [0, 1]
+
+    def test_whole_video_is_covered(self, tmp_path):
+        video = _write_video(tmp_path / "clip.avi", frames=100, fps=10)
+        engine = ReasoningEngine(Config(nvidia_api_key="test"))
+        out = asyncio.run(engine.analyze_long_video_async(
+            video, mode="safety", window_sec=4, overlap_sec=1, frames_per_window=3, client=_FakeWindowClient(),
+        ))
+        assert len(out["windows"]) == 3
+        assert out["windows"][-1]["timestamps_sec"][-1] == 9.9
+        assert all("latency_sec" in w and "frames" not in w for w in out["windows"])
+        assert out["usage"]["total_tokens"] == 30
+        assert [e["t"] for e in out["timeline"]] == [1.0, 4.0, 7.0]
+
+
 class TestReasoningEngine:
     def test_modes_exist(self):
         assert "social" in ReasoningEngine.available_modes()
@@ -47,6 +332,479 @@ class TestReasoningEngine:
             "reasoning": "x", "answer": "not json", "usage": {}
         })
         assert res["parsed"] is None
+        assert res["validation_errors"] == ["no JSON object in answer"]
+
+
+class TestStructuredOutput:
+    def test_extracts_json_wrapped_in_prose(self):
+        assert extract_json('Here you go:\n{"a": {"b": "}"}}\nHope that helps.') == {"a": {"b": "}"}}
+        assert extract_json('```json\n{"a": 1}\n```') == {"a": 1}
+        assert extract_json("no json here") is None
+
+    def test_canned_answers_match_mode_schemas(self):
+        for mode, answer in CANNED_ANSWERS.items():
+            assert validate(answer, MODE_SCHEMAS[mode]) == [], mode
+
+    def test_validation_errors_are_reported(self):
+        res = ReasoningEngine._format_result("safety", {
+            "answer": 'Sure. {"collision_risk": "very high", "human_safety_concern": "no"}', "usage": {},
+        })
+        assert res["parsed"]["collision_risk"] == "very high"
+        errors = res["validation_errors"]
+        assert any("collision_risk" in e for e in errors)
+        assert any("human_safety_concern: expected boolean" in e for e in errors)
+        assert any("missing required key 'hazards'" in e for e in errors)
+
+    def test_schema_and_token_cap_reach_the_request(self):
+        completions = _FakeCompletions('{"ok": true}')
+        seen = []
+        engine = ReasoningEngine(Config(nvidia_api_key="test", guided_decoding="nvext", single_flight=False, reasoning_policy="on"))
+        engine.client.client = _fake_openai(SimpleNamespace(create=lambda **params: seen.append(params) or completions.create()))
+        engine.analyze_image(_png_bytes(), mode="thrown_object")
+        assert seen[0]["extra_body"]["nvext"]["guided_json"] == MODE_SCHEMAS["thrown_object"]
+        assert seen[0]["max_tokens"] == 768
+
+
+class TestReasoningPolicy:
+    def _engine(self, policy, *answers):
+        seen = []
+        engine = ReasoningEngine(Config(nvidia_api_key="test", single_flight=False, reasoning_policy=policy))
+
+        def create(**params):
+            seen.append(params)
+            return _FakeCompletions(answers[min(len(seen), len(answers)) - 1]).create()
+
+        engine.client.client = _fake_openai(SimpleNamespace(create=create))
+        return engine, seen
+
+    def test_policy_parsing(self):
+        assert parse_reasoning_policy("") == ("on", DEFAULT_REASONING_POLICY)
+        assert parse_reasoning_policy("cascade") == ("cascade", {})
+        assert parse_reasoning_policy("safety=off")[1]["safety"] == "off"
+        with pytest.raises(ValueError):
+            parse_reasoning_policy("safety=maybe")
+        with pytest.raises(ValueError):
+            parse_reasoning_policy("dance=on")
+
+    def test_confident_fast_answer_is_kept(self):
+        engine, seen = self._engine("thrown_object=cascade", json.dumps(CANNED_ANSWERS["thrown_object"]))
+        res = engine.analyze_image(_png_bytes(), mode="thrown_object")
+        assert len(seen) == 1
+        assert seen[0]["max_tokens"] == FAST_MAX_TOKENS
+        assert "<think>" not in json.dumps(seen[0]["messages"])
+        assert res["reasoning_tier"] == "fast"
+        assert "escalation" not in res
+
+    def test_fast_budget_scales_per_mode(self):
+        engine, _ = self._engine("multi_step_plan=off,spatial=cascade", "{}")
+        assert engine._output_options("spatial", fast=True)["max_tokens"] == 768
+        assert engine._output_options("handover", fast=True)["max_tokens"] == FAST_MAX_TOKENS
+        calls = []
+        engine.run_tiered("multi_step_plan", lambda enable_reasoning, timeout, **options: calls.append(
+            (enable_reasoning, options["max_tokens"])) or {"answer": "{}", "usage": {}})
+        assert calls == [(False, 1536)]
+
+    def test_high_severity_escalates_to_full_reasoning(self):
+        alarming = {**CANNED_ANSWERS["thrown_object"], "hit_risk": "high"}
+        engine, seen = self._engine("thrown_object=cascade", json.dumps(alarming), "<think>\nok\n</think>\n\n{}")
+        res = engine.analyze_image(_png_bytes(), mode="thrown_object")
+        assert len(seen) == 2
+        assert "<think>" in json.dumps(seen[1]["messages"])
+        assert res["reasoning_tier"] == "full"
+        assert res["escalation"]["reason"] == "high_severity"
+        assert res["escalation"]["fast_usage"]["total_tokens"] == 15
+
+    def test_unparsed_and_low_confidence_escalate(self):
+        assert ReasoningEngine.escalation_reason({"parsed": None}) == "unparsed"
+        low = {**CANNED_ANSWERS["social"], "confidence": "low"}
+        assert ReasoningEngine.escalation_reason({"parsed": low, "validation_errors": []}) == "low_confidence"
+        hazard = {"hazards": [{"type": "spill", "severity": "critical", "location": "floor"}]}
+        assert ReasoningEngine.escalation_reason({"parsed": hazard}) == "high_severity"
+
+    def test_off_never_escalates(self):
+        engine, seen = self._engine("off", "not json")
+        res = engine.analyze_image(_png_bytes(), mode="safety")
+        assert len(seen) == 1
+        assert res["reasoning_tier"] == "fast"
+        assert res["reasoning_policy"] == "off"
+
+
+class TestMetrics:
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = Registry()
+        latency = Histogram("t_seconds", "Test latency.", ("mode",), buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, mode='say "hi"')
+        text = registry.render()
+        assert "# TYPE t_seconds histogram" in text
+        assert 't_seconds_bucket{mode="say \\"hi\\"",le="0.1"} 1' in text
+        assert 't_seconds_bucket{mode="say \\"hi\\"",le="+Inf"} 3' in text
+        assert 't_seconds_count{mode="say \\"hi\\""} 3' in text
+        with pytest.raises(ValueError):
+            Counter("t_seconds", "Duplicate.", registry=registry)
+        with pytest.raises(ValueError):
+            latency.observe(1.0, stage="x")
+
+    def test_results_carry_timings_and_feed_metrics(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test", single_flight=False, reasoning_policy="on"))
+        engine.client.client = _fake_openai(_FakeCompletions(json.dumps(CANNED_ANSWERS["safety"])))
+        model = engine.config.cosmos_model
+        before = metrics.STAGE_SECONDS.count(stage="upstream", mode="safety", model=model)
+        parsed_ok = metrics.PARSE_RESULTS.value(outcome="ok", mode="safety", model=model)
+        res = engine.analyze_image(_png_bytes(), mode="safety")
+        assert res["model"] == model
+        assert set(res["timings"]) == {"encode_sec", "upstream_sec", "scheduler_wait_sec"}
+        assert metrics.STAGE_SECONDS.count(stage="upstream", mode="safety", model=model) == before + 1
+        assert metrics.PARSE_RESULTS.value(outcome="ok", mode="safety", model=model) == parsed_ok + 1
+
+
+class TestScheduler:
+    def _waiter(self, scheduler, mode, order, timeout=None):
+        def run():
+            with scheduler.slot(mode, timeout):
+                order.append(mode)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_critical_work_overtakes_queued_background_work(self):
+        scheduler = PriorityScheduler(slots=1, reserved_slots=0)
+        order = []
+        held = scheduler.acquire("planning")
+        threads = [self._waiter(scheduler, "social", order)]
+        time.sleep(0.05)
+        threads.append(self._waiter(scheduler, "safety", order))
+        time.sleep(0.05)
+        scheduler.release(held)
+        for thread in threads:
+            thread.join(2)
+        assert order == ["safety", "social"]
+        stats = scheduler.stats()["classes"]
+        assert stats["critical"]["granted"] == 1 and stats["background"]["granted"] == 2
+        assert stats["background"]["max_wait_sec"] >= 0.09
+
+    def test_reserved_slots_and_stale_work_is_dropped(self):
+        scheduler = PriorityScheduler(slots=2, reserved_slots=1)
+        held = scheduler.acquire("social")
+        with pytest.raises(SchedulerRejected):
+            scheduler.acquire("planning", timeout=0.05)
+        with scheduler.slot("thrown_object", timeout=0.05) as ticket:
+            assert ticket.priority == "critical" and ticket.waited < 0.05
+        scheduler.release(held)
+        stats = scheduler.stats()
+        assert stats["classes"]["background"]["dropped"] == 1
+        assert stats["active"] == 0
+
+    def test_request_and_token_budgets(self):
+        scheduler = PriorityScheduler(slots=4, requests_per_window=2, window_sec=0.2)
+        for _ in range(2):
+            scheduler.release(scheduler.acquire("safety"))
+        start = time.monotonic()
+        scheduler.release(scheduler.acquire("safety"))
+        assert time.monotonic() - start >= 0.1
+
+        scheduler = PriorityScheduler(slots=4, tokens_per_window=100, window_sec=0.2)
+        ticket = scheduler.acquire("safety")
+        ticket.tokens = 150
+        scheduler.release(ticket)
+        assert scheduler.stats()["window"]["tokens"] == 150
+        start = time.monotonic()
+        scheduler.release(scheduler.acquire("safety"))
+        assert time.monotonic() - start >= 0.1
+
+    def test_async_slot_is_returned_when_cancelled(self):
+        scheduler = PriorityScheduler(slots=1, reserved_slots=0)
+        held = scheduler.acquire("safety")
+
+        async def waiter():
+            async with scheduler.slot_async("safety"):
+                pass
+
+        async def main():
+            task = asyncio.ensure_future(waiter())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            scheduler.release(held)
+            await asyncio.sleep(0.1)
+
+        asyncio.run(main())
+        assert scheduler.stats()["active"] == 0
+
+    def test_async_waiters_do_not_starve_the_default_executor(self):
+        scheduler = PriorityScheduler(slots=2, reserved_slots=0)
+        done = []
+
+        async def caller(i):
+            async with scheduler.slot_async("safety", timeout=5):
+                await asyncio.to_thread(time.sleep, 0.01)
+                done.append(i)
+
+        async def main():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+            await asyncio.wait_for(asyncio.gather(*(caller(i) for i in range(12))), 5)
+
+        asyncio.run(main())
+        assert sorted(done) == list(range(12))
+        assert scheduler.stats()["active"] == 0
+
+    def test_admission_queue_runs_urgent_jobs_first(self):
+        admission = AdmissionQueue(workers=1, max_queue=4)
+        order = []
+        release = threading.Event()
+        blocker = admission.submit(lambda remaining: release.wait(2), 5, "planning")
+        time.sleep(0.05)
+        futures = [
+            admission.submit(lambda remaining, mode=mode: order.append(mode), 5, mode)
+            for mode in ("social", "planning", "safety")
+        ]
+        release.set()
+        for future in [blocker, *futures]:
+            future.result(2)
+        assert order == ["safety", "social", "planning"]
+
+
+class TestSingleFlight:
+    def test_concurrent_identical_requests_share_one_call(self):
+        release = threading.Event()
+        completions = _FakeCompletions('{"recommended_action": "stop"}')
+
+        def create(**params):
+            release.wait(2)
+            return _FakeCompletions.create(completions, **params)
+
+        engine = ReasoningEngine(Config(nvidia_api_key="test"))
+        engine.client.client = _fake_openai(SimpleNamespace(create=create))
+        image = _png_bytes()
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(engine.analyze_image, image, "safety") for _ in range(4)]
+            while engine.single_flight.stats()["coalesced"] < 3:
+                time.sleep(0.01)
+            release.set()
+            results = [f.result() for f in futures]
+        assert completions.calls == 1
+        assert sorted(r["single_flight"]["coalesced"] for r in results) == [False, True, True, True]
+        assert all(r["parsed"] == {"recommended_action": "stop"} for r in results)
+        assert engine.single_flight.stats() == {"leaders": 1, "coalesced": 3, "inflight": 0}
+
+    def test_file_digest_matches_bytes_digest(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("src.core.singleflight.DIGEST_CHUNK_BYTES", 7)
+        path = tmp_path / "frame.png"
+        path.write_bytes(_png_bytes())
+        assert content_digest(str(path)) == content_digest(_png_bytes())
+
+    def test_errors_reach_every_waiter_and_are_not_remembered(self):
+        flight = SingleFlight()
+        with pytest.raises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+        assert flight.do("k", lambda: {"ok": True}) == ({"ok": True}, False)
+
+
+def _scene_jpeg(seed=0, noise=0, flip=False):
+    rng = np.random.default_rng(seed)
+    scene = np.tile(np.linspace(0, 255, 320), (240, 1))
+    scene[60:180, 100:220] = 30
+    if flip:
+        scene = scene[:, ::-1]
+    scene = np.clip(scene + rng.normal(0, noise, scene.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(scene).convert("RGB").save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+class TestSimilarityCache:
+    def test_hash_tolerates_sensor_noise(self):
+        base = image_dhash(_scene_jpeg())
+        assert VideoProcessor.hash_distance(base, image_dhash(_scene_jpeg(seed=1, noise=4))) <= 4
+        assert VideoProcessor.hash_distance(base, image_dhash(_scene_jpeg(flip=True))) > 20
+
+    def test_nearest_match_eviction_and_ttl(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("src.core.similarity_cache.time.monotonic", lambda: now[0])
+        cache = SimilarityCache(max_distance=2, max_entries=2, ttl_sec=10)
+        cache.put("safety", 0b0000, {"parsed": {"n": 0}, "cache": {"hit": False}})
+        cache.put("safety", 0b1111 << 20, {"parsed": {"n": 1}})
+        assert cache.get("safety", 0b0011) == ({"parsed": {"n": 0}}, 2)
+        assert cache.get("safety", 0b0111) == (None, None)
+        assert cache.get("social", 0) == (None, None)
+        cache.put("safety", 0b111 << 40, {"parsed": {"n": 2}})
+        assert cache.get("safety", 0) == (None, None)
+        now[0] += 11
+        assert cache.get("safety", 0b111 << 40) == (None, None)
+        assert cache.stats() == {"hits": 1, "misses": 4, "evictions": 1, "entries": 2, "max_distance": 2}
+
+    def test_near_duplicate_frames_skip_the_model(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test", similarity_cache=True))
+        calls = []
+
+        def analyze(image_path, mode, bypass_cache, timeout):
+            calls.append(mode)
+            return {"mode": mode, "parsed": {"people": []}, "validation_errors": [], "cache": {"hit": False}}
+
+        engine._analyze_image = analyze
+        engine.analyze_image(_scene_jpeg(), mode="social")
+        hit = engine.analyze_image(_scene_jpeg(seed=2, noise=4), mode="social")
+        assert hit["cache"]["hit"] is True and hit["cache"]["kind"] == "similarity"
+        assert hit["cache"]["distance"] <= 4 and hit["timings"]["lookup_sec"] < 0.05
+        assert hit["parsed"] == {"people": []} and "single_flight" not in hit
+        engine.analyze_image(_scene_jpeg(flip=True), mode="social")
+        engine.analyze_image(_scene_jpeg(), mode="spatial")
+        engine.analyze_image(_scene_jpeg(), mode="social", bypass_cache=True)
+        assert calls == ["social", "social", "spatial", "social"]
+        assert engine.similarity_cache.stats()["hits"] == 1
+
+    def test_critical_modes_bypass_the_cache_unless_listed(self):
+        calls = []
+
+        def analyze(image_path, mode, bypass_cache, timeout):
+            calls.append(mode)
+            return {"mode": mode, "parsed": {"hazards": []}, "validation_errors": [], "cache": {"hit": False}}
+
+        engine = ReasoningEngine(Config(nvidia_api_key="test", similarity_cache=True))
+        assert not engine.similarity_modes & {"safety", "thrown_object", "trajectory"}
+        engine._analyze_image = analyze
+        for mode in ("safety", "safety", "trajectory", "trajectory"):
+            assert engine.analyze_image(_scene_jpeg(), mode=mode)["cache"]["hit"] is False
+        assert calls == ["safety", "safety", "trajectory", "trajectory"]
+        assert engine.similarity_cache.stats() == {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "max_distance": 4}
+
+        engine = ReasoningEngine(Config(nvidia_api_key="test", similarity_cache=True, similarity_cache_modes="safety"))
+        engine._analyze_image = analyze
+        engine.analyze_image(_scene_jpeg(), mode="safety")
+        assert engine.analyze_image(_scene_jpeg(), mode="safety")["cache"]["kind"] == "similarity"
+        with pytest.raises(ValueError):
+            ReasoningEngine(Config(nvidia_api_key="test", similarity_cache=True, similarity_cache_modes="safety,bogus"))
+
+
+class _UpstreamError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class TestTransport:
+    def test_clients_share_one_pool_per_base_url(self):
+        config = Config(nvidia_api_key="test", cosmos_base_url="http://pool.test/v1")
+        planner = ActionPlanner(config)
+        assert planner.client is planner.engine.client
+        assert CosmosClient(config).client is planner.client.client
+        assert planner.client.client.max_retries == 0
+
+    def test_retries_honour_retry_after_and_report_metadata(self):
+        transport = Transport(Config(nvidia_api_key="test", cosmos_max_retries=3, cosmos_backoff_max_sec=1))
+        failures = [_UpstreamError(503, {"retry-after": "0.05"}), _UpstreamError(429)]
+
+        def create(**options):
+            if failures:
+                raise failures.pop(0)
+            return "ok"
+
+        start = time.perf_counter()
+        response, meta = transport.call(create)
+        assert response == "ok" and time.perf_counter() - start >= 0.05
+        assert meta["attempts"] == 3 and meta["retries"] == 2 and meta["breaker"] == "closed"
+
+    def test_client_errors_are_not_retried(self):
+        transport = Transport(Config(nvidia_api_key="test"))
+        calls = []
+
+        def create(**options):
+            calls.append(options)
+            raise _UpstreamError(400)
+
+        with pytest.raises(_UpstreamError):
+            transport.call(create)
+        assert len(calls) == 1
+
+    def test_breaker_fails_fast_then_probes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_sec=0.05)
+        breaker.record_failure()
+        breaker.record_failure()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call("http://x")
+        time.sleep(0.06)
+        breaker.before_call("http://x")
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call("http://x")
+        breaker.record_success()
+        assert breaker.snapshot() == {"state": "closed", "trips": 1, "failures": 0}
+
+    def test_cancelled_or_expired_probe_frees_the_half_open_slot(self):
+        transport = Transport(Config(nvidia_api_key="test", breaker_failure_threshold=1, breaker_reset_sec=0.01))
+        transport.breaker.record_failure()
+        time.sleep(0.02)
+
+        async def hang(**options):
+            await asyncio.sleep(10)
+
+        async def cancel_probe():
+            task = asyncio.ensure_future(transport.call_async(hang))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_probe())
+        with pytest.raises(TimeoutError):
+            transport.call(lambda **options: "ok", timeout=1e-9)
+        assert transport.breaker.snapshot()["state"] == "half_open"
+        assert transport.call(lambda **options: "ok")[0] == "ok"
+        assert transport.breaker.snapshot()["state"] == "closed"
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after({"retry-after": "2"}) == 2.0
+        assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+        assert parse_retry_after({}) is None
+
+
+class _FakeAsyncClient:
+    def __init__(self, delay=0.2, fail_mode=None, slow_mode=None):
+        self.delay = delay
+        self.fail_mode = fail_mode
+        self.slow_mode = slow_mode
+
+    async def reason_about_image(self, image_path, prompt, system_prompt, enable_reasoning=True, **kwargs):
+        if self.fail_mode and system_prompt == ReasoningEngine._get_prompts(self.fail_mode)[0]:
+            raise RuntimeError("upstream failed")
+        slow = self.slow_mode and prompt == ReasoningEngine._get_prompts(self.slow_mode)[1]
+        await asyncio.sleep(self.delay * (10 if slow else 1))
+        return {"reasoning": "", "answer": '{"ok": true}', "usage": {}}
+
+
+class TestFullAnalysis:
+    def test_modes_run_concurrently(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test"))
+        start = time.perf_counter()
+        out = asyncio.run(engine.full_analysis_async("img.jpg", client=_FakeAsyncClient(), max_concurrency=4))
+        assert time.perf_counter() - start < 0.6
+        assert set(out["results"]) == {"social", "spatial", "safety", "planning"}
+        assert all(r["parsed"] == {"ok": True} for r in out["results"].values())
+
+    def test_errors_and_timeouts_captured(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test"))
+        client = _FakeAsyncClient(delay=0.05, fail_mode="safety", slow_mode="planning")
+        out = asyncio.run(engine.full_analysis_async("img.jpg", client=client, timeout=0.2))
+        assert out["results"]["safety"] == {"error": "upstream failed"}
+        assert "timed out" in out["results"]["planning"]["error"]
+        assert out["results"]["social"]["parsed"] == {"ok": True}
+
+
+class TestFusedAnalysis:
+    def test_prompt_contains_every_mode(self):
+        system_prompt, user_prompt = ReasoningEngine._build_fused_prompts()
+        for mode in ("social", "spatial", "safety", "planning"):
+            assert f'"{mode}"' in user_prompt
+            assert ReasoningEngine._get_prompts(mode)[1] in user_prompt
+
+    def test_split_into_per_mode_results(self):
+        answer = '```json\n{"social": {"intent": "handover"}, "spatial": {"free_paths": []}, "safety": {"recommended_action": "stop"}}\n```'
+        out = ReasoningEngine._split_fused_result("img.jpg", {
+            "reasoning": "r", "answer": answer, "usage": {"total_tokens": 10},
+        })
+        assert out["fused"] and out["usage"]["total_tokens"] == 10
+        assert out["results"]["social"]["parsed"] == {"intent": "handover"}
+        assert out["results"]["safety"]["mode"] == "safety"
+        assert "error" in out["results"]["planning"]
 
 
 class TestBenchmark:
@@ -65,3 +823,542 @@ class TestBenchmark:
         ])
         assert s["total"] == 2
         assert s["accuracy"] == 0.5
+
+    def test_summarize_percentiles_and_modes(self):
+        results = [
+            {"mode": "social", "status": "pass", "elapsed_sec": t, "completion_tokens": 10}
+            for t in range(1, 101)
+        ] + [{"mode": "safety", "status": "error"}]
+        s = BenchmarkRunner._summarize(results, wall_time_sec=10)
+        assert s["p50_latency_sec"] == 50.5
+        assert s["p99_latency_sec"] == pytest.approx(99.01)
+        assert s["tokens_per_sec"] == round(1000 / 5050, 2)
+        assert s["throughput_cases_per_sec"] == 10.1
+        assert s["per_mode"]["safety"]["errors"] == 1
+
+    def test_percentile_and_rate_limiter(self):
+        assert percentile([], 95) == 0
+        assert percentile([1, 2, 3], 50) == 2
+        limiter = RateLimiter(50)
+        start = time.perf_counter()
+        for _ in range(6):
+            limiter.wait()
+        assert time.perf_counter() - start >= 0.09
+
+    def test_parallel_run_streams_and_resumes(self, tmp_path):
+        class Engine:
+            calls = []
+
+            def analyze_image(self, image, mode, bypass_cache=False):
+                self.calls.append(image)
+                if image == "bad.jpg":
+                    time.sleep(0.05)
+                    raise RuntimeError("boom")
+                return {"parsed": {"a": "b"}, "usage": {"completion_tokens": 5}}
+
+        runner = BenchmarkRunner(Config(nvidia_api_key="test"))
+        runner.engine = Engine()
+        cases = [{"test_id": f"t{i}", "image": f"{i}.jpg", "expected": {"a": "b"}} for i in range(5)]
+        cases.append({"test_id": "t5", "image": "bad.jpg"})
+        summary = runner.run(cases, output_dir=tmp_path, concurrency=3)
+        lines = (tmp_path / "benchmark_results.jsonl").read_text().splitlines()
+        assert len(lines) == 6 and summary["passed"] == 5 and summary["errors"] == 1
+
+        Engine.calls.clear()
+        summary = runner.run(cases, output_dir=tmp_path, resume=True)
+        assert Engine.calls == ["bad.jpg"]
+        assert summary["total"] == 6
+        assert summary["cases_executed"] == 1
+        assert summary["throughput_cases_per_sec"] <= 1 / 0.05
+
+
+class _ImageCountingCompletions(_FakeCompletions):
+    def create(self, **params):
+        self.last = params
+        images = sum(1 for part in params["messages"][-1]["content"] if part["type"] == "image_url")
+        response = super().create(**params)
+        response.usage = SimpleNamespace(prompt_tokens=100 * images, completion_tokens=5, total_tokens=100 * images + 5)
+        return response
+
+
+class TestFramePacking:
+    def test_tiles_frames_into_labelled_grids(self):
+        frames = [_png_bytes((200, 100)) for _ in range(5)]
+        mosaics = pack_frames(frames, (2, 2), tile_side=64, labels=[f"{t}s" for t in range(5)])
+        sizes = [Image.open(io.BytesIO(m)).size for m in mosaics]
+        assert sizes == [(128, 64), (128, 32)]
+        corner = np.asarray(Image.open(io.BytesIO(mosaics[0])).convert("RGB"))[2:14, 2:14]
+        assert (corner[..., 0] > 200).any() and (corner[..., 2] < 60).any()
+
+    def test_grid_is_validated(self):
+        assert Config(nvidia_api_key="test", frame_packing="3X2").frame_packing == "3X2"
+        with pytest.raises(ValueError):
+            Config(nvidia_api_key="test", frame_packing="2by2")
+
+    def test_client_sends_one_image_per_grid(self):
+        completions = _ImageCountingCompletions()
+        client = CosmosClient(Config(nvidia_api_key="test", frame_packing="2x2", frame_pack_tile_side=64))
+        client.client = _fake_openai(completions)
+        result = client.reason_about_frames([_png_bytes()] * 6, "What happens?", timestamps=[0, 0.5, 1, 1.5, 2, 2.5])
+        content = completions.last["messages"][-1]["content"]
+        assert [part["type"] for part in content] == ["image_url", "image_url", "text"]
+        assert "6 video frames are packed into 2 grid" in content[-1]["text"] and "2.5s" in content[-1]["text"]
+        assert result["usage"]["images"] == 2 and result["usage"]["frames_packed"] == 6
+
+    def test_packing_comparison_benchmark(self, tmp_path, monkeypatch):
+        completions = _ImageCountingCompletions('{"recommended_action": "stop"}')
+        monkeypatch.setattr(CosmosClient, "_openai", lambda self, transport: _fake_openai(completions))
+        video = _write_video(tmp_path / "clip.avi")
+        cases = [{"test_id": "v1", "mode": "safety", "video": video, "max_frames": 4,
+                  "expected": {"recommended_action": "stop"}}]
+        report = compare_frame_packing(cases, grids=["off", "2x2"], config=Config(nvidia_api_key="test"),
+                                       output_dir=tmp_path / "results")
+        assert report["off"]["avg_images_sent"] == 4 and report["2x2"]["avg_images_sent"] == 1
+        assert report["2x2"]["avg_prompt_tokens"] < report["off"]["avg_prompt_tokens"]
+        assert report["off"]["accuracy"] == report["2x2"]["accuracy"] == 1.0
+        assert (tmp_path / "results" / "packing_2x2" / "benchmark_results.json").exists()
+
+
+class TestBatch:
+    def test_directory_glob_and_manifest_entries(self, tmp_path):
+        for name in ("a.jpg", "b.png", "notes.txt", "sub/c.mp4"):
+            (tmp_path / name).parent.mkdir(exist_ok=True)
+            (tmp_path / name).write_bytes(b"x")
+        entries = load_entries(str(tmp_path), mode="safety")
+        assert [Path(e["media"]).name for e in entries] == ["a.jpg", "b.png", "c.mp4"]
+        assert entries[0]["id"] == f"{tmp_path / 'a.jpg'}#safety"
+        assert len(load_entries(str(tmp_path / "*.jpg"))) == 1
+        manifest = tmp_path / "m.jsonl"
+        manifest.write_text('{"image": "a.jpg", "mode": "planning", "task": "tidy"}\n\n{"media": "b.png", "id": "x"}\n')
+        entries = load_entries(str(manifest), mode="social")
+        assert entries[0] == {"id": "a.jpg#planning#tidy", "media": "a.jpg", "mode": "planning", "task": "tidy"}
+        assert entries[1]["id"] == "x" and entries[1]["mode"] == "social"
+
+    def test_streams_results_and_skips_completed_on_rerun(self, tmp_path):
+        class Engine:
+            calls = []
+
+            def analyze_image(self, image, mode, bypass_cache=False):
+                self.calls.append(image)
+                if image == "bad.jpg":
+                    raise RuntimeError("boom")
+                return {"mode": mode, "parsed": {"ok": True}}
+
+        runner = BatchRunner(Config(nvidia_api_key="test"), engine=Engine())
+        entries = [
+            {"id": name, "media": name, "mode": "safety", "task": None} for name in ("1.jpg", "2.jpg", "bad.jpg")
+        ]
+        output = tmp_path / "out.jsonl"
+        with open_sink(output, resume=False) as sink:
+            summary = runner.run(entries, sink, workers=2)
+        assert summary["executed"] == 3 and summary["ok"] == 2 and summary["errors"] == 1
+        assert summary["throughput_per_sec"] > 0
+
+        with open(output, "a") as f:
+            f.write('{"id": "torn')
+        Engine.calls.clear()
+        with open_sink(output) as sink:
+            summary = runner.run(entries, sink, completed=runner.load_completed(output))
+        assert Engine.calls == ["bad.jpg"]
+        assert summary["skipped"] == 2
+        records = [json.loads(line) for line in output.read_text().splitlines() if line.startswith('{"id": "bad')]
+        assert len(records) == 2 and records[-1]["error"] == "boom"
+
+
+class TestLiveRunner:
+    @staticmethod
+    def _scene_cut_video(path, frames=40, cut=20, fps=10):
+        ramp = np.tile(np.linspace(0, 255, 64, dtype=np.uint8), (48, 1))
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+        for i in range(frames):
+            writer.write(cv2.cvtColor(ramp if i < cut else ramp[:, ::-1].copy(), cv2.COLOR_GRAY2BGR))
+        writer.release()
+        return str(path)
+
+    def test_dhash_distance(self):
+        ramp = np.tile(np.linspace(0, 255, 64, dtype=np.uint8), (48, 1))
+        frame = cv2.cvtColor(ramp, cv2.COLOR_GRAY2BGR)
+        brighter = cv2.convertScaleAbs(frame, alpha=0.8, beta=30)
+        assert VideoProcessor.hash_distance(VideoProcessor.dhash(frame), VideoProcessor.dhash(brighter)) == 0
+        assert VideoProcessor.hash_distance(VideoProcessor.dhash(frame), VideoProcessor.dhash(frame[:, ::-1])) == 64
+
+    def test_calls_only_on_change_or_staleness(self, tmp_path):
+        video = self._scene_cut_video(tmp_path / "cut.avi")
+        config = Config(nvidia_api_key="test")
+
+        class Engine:
+            video_processor = VideoProcessor(config)
+            calls = []
+
+            def _get_prompts(self, mode):
+                return "", ""
+
+            def analyze_frames(self, frames, mode="safety", bypass_cache=False, timeout=None, timestamps=None):
+                self.calls.append(len(frames))
+                return {"mode": mode, "parsed": {"ok": True}}
+
+        runner = LiveRunner(config, engine=Engine(), sample_fps=10, window_frames=3, change_threshold=10,
+                            max_staleness_sec=1.5, max_inflight=4)
+        results = list(runner.stream(video))
+        assert [(r["live"]["frame_index"], r["live"]["trigger"]) for r in results] == [
+            (0, "first"), (15, "staleness"), (20, "change"), (35, "staleness"),
+        ]
+        assert results[2]["live"]["hash_distance"] >= 10
+        assert results[2]["live"]["frame_timestamps_sec"] == [1.8, 1.9, 2.0]
+        assert Engine.calls == [1, 3, 3, 3]
+        assert runner.stats()["frames_read"] == 40 and runner.stats()["calls"] == 4
+
+        runner = LiveRunner(config, engine=Engine(), sample_fps=10, max_staleness_sec=0, max_inflight=4)
+        assert [r["live"]["trigger"] for r in runner.stream(video, max_results=5)] == ["first", "change"]
+
+
+def _write_motion_video(path, frames=40, moving=range(20, 28), fps=10):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (128, 96))
+    for i in range(frames):
+        frame = np.full((96, 128, 3), 40, dtype=np.uint8)
+        if i in moving:
+            step = i - moving.start
+            # A square that moves right and grows, like something thrown at the camera.
+            cv2.rectangle(frame, (10 + step * 10, 30), (20 + step * 12, 40 + step * 4), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+class TestMotionGate:
+    def test_scores_changed_region(self):
+        gate = MotionGate(threshold=0.02)
+        still = np.full((96, 128, 3), 40, dtype=np.uint8)
+        assert gate.update(still)["score"] == 0.0
+        assert gate.update(still) == {"score": 0.0, "region": None, "approaching": False}
+        moved = still.copy()
+        moved[48:, 64:] = 255
+        motion = gate.update(moved)
+        assert motion["score"] > 0.2
+        x0, y0, x1, y1 = motion["region"]
+        assert 0.4 < x0 < 0.5 and 0.4 < y0 < 0.5 and x1 == y1 == 1.0
+
+    def test_detects_event_around_peak(self, tmp_path):
+        video = _write_motion_video(tmp_path / "throw.avi")
+        processor = VideoProcessor(Config(nvidia_api_key="test", motion_context_frames=4))
+        events, info = processor.detect_motion(video)
+        assert len(events) == 1
+        event = events[0]
+        assert 2.0 <= event["start_sec"] <= event["peak_sec"] <= event["end_sec"] <= 2.8
+        assert len(event["frames"]) == 4
+        assert event["timestamps_sec"][0] <= event["peak_sec"] <= event["timestamps_sec"][-1]
+        assert event["approaching"] is True and event["region"] is not None
+
+    def test_static_video_makes_no_calls(self, tmp_path):
+        engine = ReasoningEngine(Config(nvidia_api_key="test", reasoning_policy="on"))
+        calls = []
+        engine.analyze_frames = lambda frames, mode, bypass_cache=False, timestamps=None: calls.append(len(frames)) or {"usage": {"total_tokens": 5}}
+        out = engine.analyze_motion(_write_video(tmp_path / "still.avi", frames=30), mode="thrown_object")
+        assert out["events"] == [] and calls == []
+        out = engine.analyze_motion(_write_motion_video(tmp_path / "throw.avi"), mode="trajectory")
+        assert calls == [6] and out["usage"]["total_tokens"] == 5
+        assert out["events"][0]["motion"]["score"] > 0 and "frames" not in out["events"][0]["motion"]
+
+    def test_live_motion_modes_skip_static_scenes(self, tmp_path):
+        config = Config(nvidia_api_key="test")
+
+        class Engine:
+            video_processor = VideoProcessor(config)
+
+            def _get_prompts(self, mode):
+                return "", ""
+
+            def analyze_frames(self, frames, mode="safety", bypass_cache=False, timeout=None, timestamps=None):
+                return {"mode": mode}
+
+        runner = LiveRunner(config, engine=Engine(), mode="thrown_object", sample_fps=10, max_staleness_sec=0,
+                            max_inflight=4)
+        results = list(runner.stream(_write_motion_video(tmp_path / "throw.avi")))
+        assert [r["live"]["trigger"] for r in results] == ["motion"]
+        assert 20 <= results[0]["live"]["frame_index"] <= 22 and results[0]["live"]["motion"]["region"]
+
+
+class TestStartup:
+    def test_cli_import_stays_light(self):
+        assert loaded_modules("import src.cli") == []
+
+    def test_image_path_does_not_load_opencv_or_flask(self):
+        statement = (
+            "from src.core.reasoning_engine import ReasoningEngine\n"
+            "from src.utils.helpers import Config\n"
+            "ReasoningEngine(Config(nvidia_api_key='x'))"
+        )
+        assert loaded_modules(statement, ("cv2", "flask", "rich")) == []
+
+    def test_startup_benchmark_reports_budget_failures(self):
+        report = run_startup_benchmark(runs=1, budget_sec=1e-6)
+        assert report["help"]["runs"] == 1
+        assert report["heavy_modules_on_import"] == []
+        assert any("exceeds" in failure for failure in report["failures"])
+
+
+@pytest.fixture
+def standin():
+    settings = StandinSettings(latency_dist="fixed", latency_ms=20, seed=1)
+    server = start_standin_in_thread(settings=settings)
+    host, port = server.server_address
+    yield f"http://{host}:{port}/v1", settings
+    server.shutdown()
+    server.server_close()
+
+
+class TestStandinAndLoadtest:
+    def test_engine_against_standin(self, standin, tmp_path):
+        base_url, settings = standin
+        image = tmp_path / "img.png"
+        image.write_bytes(_png_bytes())
+        engine = ReasoningEngine(Config(nvidia_api_key="test", cosmos_base_url=base_url))
+        result = engine.analyze_image(str(image), mode="safety")
+        assert result["parsed"]["recommended_action"] == "stop"
+        assert result["reasoning"] and result["usage"]["total_tokens"] > 0
+        assert result["transport"]["attempts"] == 1
+        fused = engine.full_analysis(str(image), fused=True)
+        assert fused["results"]["social"]["parsed"]["intent"] == "handover"
+
+    def test_streaming_against_standin(self, standin, tmp_path):
+        base_url, _ = standin
+        image = tmp_path / "img.png"
+        image.write_bytes(_png_bytes())
+        engine = ReasoningEngine(Config(nvidia_api_key="test", cosmos_base_url=base_url))
+        events = list(engine.stream_image(str(image), mode="thrown_object"))
+        assert any(e["type"] == "answer" for e in events)
+        assert events[-1]["result"]["usage"]["completion_tokens"] == 180
+
+    def test_loadtest_reports_percentiles(self, standin, tmp_path):
+        base_url, settings = standin
+        image = tmp_path / "img.png"
+        image.write_bytes(_png_bytes())
+        engine = ReasoningEngine(Config(nvidia_api_key="test", cosmos_base_url=base_url, single_flight=False))
+        summary = LoadTester(engine_request_fn(engine, str(image), "social"), concurrency=4, total_requests=12).run()
+        assert summary["requests"] == summary["ok"] == 12
+        assert settings.stats["requests"] == 12
+        assert 0.02 <= summary["p50_latency_sec"] <= summary["p99_latency_sec"]
+
+
+class TestEndpointPool:
+    def _servers(self, count):
+        servers = [start_standin_in_thread(settings=StandinSettings(latency_dist="fixed", latency_ms=30, seed=i))
+                   for i in range(count)]
+        urls = [f"http://{host}:{port}/v1" for host, port in (s.server_address for s in servers)]
+        return servers, urls
+
+    def test_spreads_load_across_replicas(self, tmp_path):
+        servers, urls = self._servers(2)
+        try:
+            config = Config(nvidia_api_key="test", cosmos_base_url=",".join(urls), single_flight=False,
+                            health_check_interval_sec=0)
+            engine = ReasoningEngine(config)
+            images = [_png_bytes((300 + i, 200)) for i in range(8)]
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(lambda image: engine.analyze_image(image, "safety"), images))
+            assert {r["transport"]["endpoint"] for r in results} == set(urls)
+            assert all(s.RequestHandlerClass.settings.stats["requests"] >= 2 for s in servers)
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+
+    def test_affinity_pins_image_to_one_replica(self):
+        urls = ["http://a.test/v1", "http://b.test/v1", "http://c.test/v1"]
+        pool = EndpointPool(Config(nvidia_api_key="test", cosmos_base_url=",".join(urls), endpoint_affinity=True))
+        picks = {pool.pick("same-image").url for _ in range(5)}
+        assert len(picks) == 1
+        assert len({pool.pick(f"image-{i}").url for i in range(30)}) == 3
+
+    def test_cancelled_and_abandoned_leases_are_returned(self):
+        pool = EndpointPool(Config(nvidia_api_key="test", cosmos_base_url="http://a.test/v1,http://b.test/v1",
+                                   health_check_interval_sec=0))
+
+        async def hold():
+            with pool.lease():
+                await asyncio.sleep(10)
+
+        async def cancel():
+            task = asyncio.ensure_future(hold())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel())
+
+        def stream():
+            with pool.lease():
+                yield 1
+                yield 2
+
+        events = stream()
+        next(events)
+        events.close()
+        assert [e["outstanding"] for e in pool.stats()["endpoints"]] == [0, 0]
+        assert all(e["consecutive_failures"] == 0 for e in pool.stats()["endpoints"])
+
+    def test_ejects_dead_replica_and_readmits(self):
+        servers, urls = self._servers(1)
+        dead = "http://127.0.0.1:9/v1"
+        try:
+            pool = EndpointPool(Config(nvidia_api_key="test", cosmos_base_url=f"{urls[0]},{dead}",
+                                       health_check_interval_sec=0))
+            pool.check_health()
+            assert [e["healthy"] for e in pool.stats()["endpoints"]] == [True, False]
+            assert {pool.pick().url for _ in range(4)} == {urls[0]}
+            pool.endpoints[1].url = urls[0]
+            pool.check_health()
+            assert all(e["healthy"] for e in pool.stats()["endpoints"])
+        finally:
+            servers[0].shutdown()
+            servers[0].server_close()
+
+
+class _SlowEngine:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.seen = []
+
+    def available_modes(self):
+        return ["social"]
+
+    def analyze_image(self, image, mode="social", timeout=None):
+        self.seen.append(image)
+        if timeout is not None and timeout < self.delay:
+            time.sleep(timeout)
+            raise TimeoutError("upstream timed out")
+        time.sleep(self.delay)
+        return {"mode": mode, "parsed": {"ok": True}}
+
+
+class TestStreamingAnalysis:
+    @staticmethod
+    def _engine(delays):
+        engine = ReasoningEngine(Config(nvidia_api_key="test", max_concurrency=4))
+
+        def analyze_image(image_path, mode, bypass_cache=False, timeout=None):
+            time.sleep(delays[mode])
+            return {"mode": mode, "parsed": {"mode": mode}, "usage": {"total_tokens": 1}}
+
+        engine.analyze_image = analyze_image
+        return engine
+
+    def test_modes_arrive_as_they_finish(self):
+        engine = self._engine({"social": 0.3, "spatial": 0.2, "safety": 0.0, "planning": 0.1})
+        events = list(engine.stream_analysis(b"img"))
+        assert [e.get("mode") for e in events if e["type"] == "result"] == ["safety", "planning", "spatial", "social"]
+        assert events[0]["elapsed_sec"] < 0.15 and events[-1]["type"] == "done"
+
+    def test_slow_modes_time_out_without_holding_the_rest(self):
+        engine = self._engine({"social": 0.0, "spatial": 0.0, "safety": 0.0, "planning": 1.0})
+        start = time.perf_counter()
+        events = list(engine.stream_analysis(b"img", timeout=0.2))
+        assert time.perf_counter() - start < 0.6
+        assert sum(e["type"] == "result" for e in events) == 3
+        assert [e["mode"] for e in events if e["type"] == "error"] == ["planning"]
+
+    def test_reasoning_tokens_are_forwarded(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test"))
+
+        def stream_image(image_path, mode, bypass_cache=False, timeout=None):
+            yield {"type": "reasoning", "delta": "hmm", "mode": mode}
+            yield {"type": "done", "result": {"parsed": {}}, "mode": mode}
+
+        engine.stream_image = stream_image
+        events = list(engine.stream_analysis(b"img", modes=["safety"], reasoning_tokens=True))
+        assert [e["type"] for e in events] == ["reasoning", "result", "done"]
+
+    def test_abandoned_reasoning_streams_release_their_slot(self):
+        engine = ReasoningEngine(Config(nvidia_api_key="test", scheduler_slots=2, scheduler_reserved_slots=0))
+        timeouts, closed = [], threading.Event()
+
+        def stream_image(image_path, prompt, system_prompt, enable_reasoning, stop_on_answer, bypass_cache,
+                         timeout=None, **options):
+            timeouts.append(timeout)
+            try:
+                while True:
+                    time.sleep(0.02)
+                    yield {"type": "reasoning", "delta": "hmm"}
+            finally:
+                closed.set()
+
+        engine.client.stream_image = stream_image
+        events = list(engine.stream_analysis(_scene_jpeg(), modes=["safety"], reasoning_tokens=True, timeout=0.2))
+        assert events[-2]["type"] == "error" and events[-1]["type"] == "done"
+        assert closed.wait(1)
+        time.sleep(0.05)
+        assert engine.scheduler.stats()["active"] == 0
+        assert 0 < timeouts[0] <= 0.2
+
+    def test_stream_endpoint_ndjson_and_sse(self):
+        engine = self._engine({"social": 0.0, "spatial": 0.0, "safety": 0.0, "planning": 0.0})
+        client = create_app(Config(nvidia_api_key="test"), engine=engine).test_client()
+        response = client.post("/api/analyze/stream", data={"image": (io.BytesIO(b"abc"), "x.jpg")})
+        assert response.mimetype == "application/x-ndjson"
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert sorted(e["mode"] for e in events if e["type"] == "result") == sorted(["social", "spatial", "safety", "planning"])
+        assert events[-1]["type"] == "done"
+
+        response = client.post("/api/analyze/stream", data={"mode": "safety", "format": "sse", "image": (io.BytesIO(b"abc"), "x.jpg")})
+        assert response.mimetype == "text/event-stream"
+        body = response.get_data(as_text=True)
+        assert body.startswith("event: result\ndata: {") and body.endswith("\n\n")
+        assert client.post("/api/analyze/stream", data={"mode": "nope", "image": (io.BytesIO(b"abc"), "x.jpg")}).status_code == 400
+
+
+class TestServer:
+    def _client(self, engine, **overrides):
+        config = Config(nvidia_api_key="test", **overrides)
+        return create_app(config, engine=engine).test_client()
+
+    def test_upload_is_analyzed_in_memory(self, monkeypatch):
+        monkeypatch.setattr("werkzeug.formparser.SpooledTemporaryFile", lambda *a, **k: pytest.fail("touched disk"))
+        engine = _SlowEngine()
+        image = b"x" * (2 * 1024 * 1024)
+        response = self._client(engine).post("/api/analyze", data={"mode": "social", "image": (io.BytesIO(image), "x.jpg")})
+        assert response.status_code == 200
+        assert response.get_json()["parsed"] == {"ok": True}
+        assert engine.seen == [image]
+
+    def test_saturation_returns_429(self):
+        client = self._client(_SlowEngine(delay=0.3), serve_workers=1, serve_queue_size=0)
+
+        def post(_):
+            return client.post("/api/analyze", data={"image": (io.BytesIO(b"abc"), "x.jpg")})
+
+        with ThreadPoolExecutor(3) as pool:
+            responses = list(pool.map(post, range(3)))
+        statuses = sorted(r.status_code for r in responses)
+        assert statuses[0] == 200 and 429 in statuses
+        rejected = next(r for r in responses if r.status_code == 429)
+        assert int(rejected.headers["Retry-After"]) >= 1
+
+    def test_deadline_returns_504(self):
+        client = self._client(_SlowEngine(delay=0.5), request_deadline_sec=5)
+        response = client.post("/api/analyze", data={"image": (io.BytesIO(b"abc"), "x.jpg"), "deadline_sec": "0.05"})
+        assert response.status_code == 504
+        assert "Retry-After" in response.headers
+
+    def test_timed_out_request_frees_its_worker(self):
+        engine = _SlowEngine(delay=2.0)
+        client = self._client(engine, serve_workers=1, serve_queue_size=0)
+        response = client.post("/api/analyze", data={"image": (io.BytesIO(b"abc"), "x.jpg"), "deadline_sec": "0.1"})
+        assert response.status_code == 504
+        engine.delay = 0
+        time.sleep(0.2)
+        response = client.post("/api/analyze", data={"image": (io.BytesIO(b"abc"), "x.jpg")})
+        assert response.status_code == 200
+
+    def test_metrics_endpoint_exports_prometheus_text(self):
+        client = self._client(_SlowEngine())
+        client.post("/api/analyze", data={"mode": "social", "image": (io.BytesIO(b"abc"), "x.jpg")})
+        client.post("/api/analyze", data={"mode": "<script>", "image": (io.BytesIO(b"abc"), "x.jpg")})
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        body = response.get_data(as_text=True)
+        assert "# TYPE egobot_http_request_seconds histogram" in body
+        assert 'egobot_http_request_seconds_count{route="/api/analyze",mode="social",status="200"}' in body
+        assert 'mode="unknown"' in body and "<script>" not in body
+        assert 'egobot_admission{stat="admitted"}' in body